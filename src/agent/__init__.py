@@ -3,6 +3,19 @@
 This module defines a custom graph.
 """
 
-from agent.rent_cars_agent import graph
+from dotenv import load_dotenv
+
+# Load .env once, before any agent module reads its configuration
+load_dotenv()
+
+
+def __getattr__(name: str) -> object:
+    # Import the graph lazily so loading one submodule does not build every graph
+    if name == "graph":
+        from agent.rent_cars_agent import graph
+
+        return graph
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __all__ = ["graph"]
@@ -0,0 +1,147 @@
+"""Rental availability search, its short-TTL cache and speculative prefetch.
+
+Searches are cached for ``SHLOMO_AVAILABILITY_TTL`` seconds keyed on the
+normalized request (dates, times, branches, agreement and product), and
+concurrent identical searches from different sessions share one upstream
+call. Counters are available from ``availability_cache.info()``. Upstream
+requests are limited to ``SHLOMO_AVAILABILITY_RATE`` per second, so a sweep
+over many branches and dates cannot flood the backend.
+
+Once the user has given dates, times and both branches, the next model turn
+almost always calls ``search_available_cars`` with exactly those values. With
+``SHLOMO_PREFETCH=true`` the rental assistant starts that ``/rent/all-groups``
+request in the background while the model is still thinking. The prefetch
+only warms the availability cache: a matching search joins the in-flight
+request or hits the cached response, and like any cache waiter it gives up
+at the turn deadline. At most ``SHLOMO_PREFETCH_SIZE`` prefetches run at once.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Set, Tuple
+
+from agent.cache import KeyedCache
+from agent.http_client import RENT_BASE_URL
+from agent.resilience import RateLimiter, request
+
+logger = logging.getLogger(__name__)
+
+# Availability changes quickly; keep results just long enough for peak-hour repeats
+AVAILABILITY_TTL = float(os.getenv("SHLOMO_AVAILABILITY_TTL", "60"))
+AVAILABILITY_CACHE_SIZE = int(os.getenv("SHLOMO_AVAILABILITY_CACHE_SIZE", "256"))
+
+# Upstream /rent/all-groups requests per second (0 disables the limit); cache hits are free
+AVAILABILITY_RATE = float(os.getenv("SHLOMO_AVAILABILITY_RATE", "10"))
+AVAILABILITY_BURST = int(os.getenv("SHLOMO_AVAILABILITY_BURST", "10"))
+
+PREFETCH_ENABLED = os.getenv("SHLOMO_PREFETCH", "false").lower() == "true"
+PREFETCH_SIZE = int(os.getenv("SHLOMO_PREFETCH_SIZE", "32"))
+
+SearchKey = Tuple[str, int, str, str, str, str, int, int]
+
+
+def search_payload(
+    fromDate: str,
+    fromTime: str,
+    toDate: str,
+    toTime: str,
+    pickupBranch: int,
+    returnBranch: int,
+) -> Dict[str, Any]:
+    """Build the /rent/all-groups request body."""
+    return {
+        "agreement": "121845",        # Fixed value
+        "fromDate": fromDate,
+        "fromTime": fromTime,
+        "toDate": toDate,
+        "toTime": toTime,
+        "pickupBranch": pickupBranch,
+        "returnBranch": returnBranch,
+        "isTourist": False,           # Fixed value
+        "product": 9807               # Fixed value
+    }
+
+
+def search_key(payload: Dict[str, Any]) -> SearchKey:
+    """Return the normalized search parameters of a request body."""
+    return (
+        str(payload["agreement"]).strip(),
+        int(payload["product"]),
+        str(payload["fromDate"]).strip(),
+        str(payload["fromTime"]).strip(),
+        str(payload["toDate"]).strip(),
+        str(payload["toTime"]).strip(),
+        int(payload["pickupBranch"]),
+        int(payload["returnBranch"]),
+    )
+
+
+availability_limiter = RateLimiter(AVAILABILITY_RATE, AVAILABILITY_BURST)
+
+
+def fetch_availability(payload: Dict[str, Any]) -> Any:
+    """Fetch the available car groups from the rental backend."""
+    # Read-only search, so it is safe to retry and hedge; every attempt takes a rate-limit token
+    response = request(
+        RENT_BASE_URL, "POST", "/api/v1/rent/all-groups",
+        endpoint="availability", idempotent=True, limiter=availability_limiter, json=payload,
+    )
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+    return response.json()
+
+
+def _load(key: SearchKey) -> Any:
+    agreement, product, from_date, from_time, to_date, to_time, pickup, return_ = key
+    payload = search_payload(from_date, from_time, to_date, to_time, pickup, return_)
+    payload.update(agreement=agreement, product=product)
+    return fetch_availability(payload)
+
+
+availability_cache = KeyedCache("availability", _load, ttl=AVAILABILITY_TTL, max_entries=AVAILABILITY_CACHE_SIZE)
+
+
+def get_availability(payload: Dict[str, Any]) -> Any:
+    """Return the available car groups, served from the short-TTL cache."""
+    return availability_cache.get(search_key(payload))
+
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="shlomo-prefetch")
+_prefetching: Set[SearchKey] = set()
+_prefetch_lock = threading.Lock()
+
+
+def prefetch_availability(slots: Dict[str, Any]) -> bool:
+    """Start warming the cache for complete rental slots; return whether a prefetch was started."""
+    if not PREFETCH_ENABLED:
+        return False
+    try:
+        payload = search_payload(**{name: slots[name] for name in (
+            "fromDate", "fromTime", "toDate", "toTime", "pickupBranch", "returnBranch"
+        )})
+        key = search_key(payload)
+    except (KeyError, TypeError, ValueError):
+        return False
+
+    with _prefetch_lock:
+        if key in _prefetching or len(_prefetching) >= PREFETCH_SIZE:
+            return False
+        _prefetching.add(key)
+    _executor.submit(_prefetch, key)
+    logger.debug("Prefetching availability for %s", key)
+    return True
+
+
+def _prefetch(key: SearchKey) -> None:
+    try:
+        availability_cache.get(key)
+    except Exception:
+        # The search itself reports the error when the model asks for it
+        logger.debug("Availability prefetch for %s failed", key, exc_info=True)
+    finally:
+        with _prefetch_lock:
+            _prefetching.discard(key)
@@ -0,0 +1,139 @@
+"""Availability sweep across several branches and shifted dates.
+
+A flexible request ("anywhere in the center, give or take a day") expands
+into a grid of ``/rent/all-groups`` searches: every pickup branch times every
+day shift of the rental window, nearest shifts first. The grid runs
+concurrently with at most ``SHLOMO_SWEEP_FANOUT`` searches submitted at a time, each one
+going through the availability cache and its upstream rate limit, and only
+the cheapest option of each car group is returned. One tool call replaces a
+search per branch and date.
+
+The grid is bounded before anything is sent: more than
+``SHLOMO_SWEEP_MAX_BRANCHES`` pickup branches is rejected, day shifts are
+clamped to ``SHLOMO_SWEEP_MAX_FLEX_DAYS`` and at most
+``SHLOMO_SWEEP_MAX_SEARCHES`` searches run, nearest shifts first.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agent.availability import get_availability, search_payload
+from agent.rental_results import PROJECTED_FIELDS, find_car_groups, price_of
+from agent.resilience import fan_out
+
+# Max searches of one sweep that run at the same time
+SWEEP_FANOUT = int(os.getenv("SHLOMO_SWEEP_FANOUT", "4"))
+# Max searches in one sweep; the farthest day shifts are dropped first
+SWEEP_MAX_SEARCHES = int(os.getenv("SHLOMO_SWEEP_MAX_SEARCHES", "24"))
+SWEEP_MAX_FLEX_DAYS = int(os.getenv("SHLOMO_SWEEP_MAX_FLEX_DAYS", "3"))
+SWEEP_MAX_BRANCHES = int(os.getenv("SHLOMO_SWEEP_MAX_BRANCHES", "8"))
+
+DATE_FORMAT = "%d/%m/%Y"
+
+_executor = ThreadPoolExecutor(max_workers=4 * SWEEP_FANOUT, thread_name_prefix="shlomo-sweep")
+
+GridPoint = Tuple[int, int, str, str]
+
+
+def _shift(day: str, days: int) -> str:
+    return (datetime.strptime(day.strip(), DATE_FORMAT) + timedelta(days=days)).strftime(DATE_FORMAT)
+
+
+def sweep_grid(
+    fromDate: str,
+    toDate: str,
+    pickupBranches: Iterable[Any],
+    returnBranch: int = 0,
+    flexDays: int = 0,
+    today: Optional[date] = None,
+) -> List[GridPoint]:
+    """Return the (pickup, return, fromDate, toDate) searches of a sweep, nearest shifts first.
+
+    A ``returnBranch`` of 0 returns the car to its pickup branch. Shifts keep
+    the rental length and never start before ``today``. Raises ``ValueError``
+    for more than ``SWEEP_MAX_BRANCHES`` distinct pickup branches.
+    """
+    today = today or date.today()
+    flex = max(0, min(int(flexDays), SWEEP_MAX_FLEX_DAYS))
+    branches: List[int] = []
+    for branch in pickupBranches:
+        branch = int(branch)
+        if branch in branches:
+            continue
+        if len(branches) == SWEEP_MAX_BRANCHES:
+            raise ValueError(
+                f"A sweep covers at most {SWEEP_MAX_BRANCHES} pickup branches; "
+                "pick the closest ones with find_branch"
+            )
+        branches.append(branch)
+
+    shifts = sorted(range(-flex, flex + 1), key=lambda days: (abs(days), days))
+    grid: List[GridPoint] = []
+    for days in shifts:
+        start = _shift(fromDate, days)
+        if datetime.strptime(start, DATE_FORMAT).date() < today:
+            continue
+        end = _shift(toDate, days)
+        grid.extend((branch, int(returnBranch) or branch, start, end) for branch in branches)
+    return grid
+
+
+def sweep_availability(
+    fromDate: str,
+    fromTime: str,
+    toDate: str,
+    toTime: str,
+    pickupBranches: Iterable[Any],
+    returnBranch: int = 0,
+    flexDays: int = 0,
+    limit: int = 10,
+) -> Dict[str, Any]:
+    """Search every branch and day shift concurrently and keep the cheapest offer per car group."""
+    # Size the grid before anything is submitted
+    grid = sweep_grid(fromDate, toDate, pickupBranches, returnBranch, flexDays)
+    skipped = len(grid) - SWEEP_MAX_SEARCHES
+    grid = grid[:max(1, SWEEP_MAX_SEARCHES)]
+
+    def search(point: GridPoint) -> Any:
+        pickup, return_, start, end = point
+        return get_availability(search_payload(start, fromTime, end, toTime, pickup, return_))
+
+    cheapest: Dict[Any, Dict[str, Any]] = {}
+    errors: Dict[str, str] = {}
+    for (pickup, return_, start, end), future in zip(grid, fan_out(_executor, search, grid, SWEEP_FANOUT)):
+        try:
+            payload = future.result()
+        except Exception as e:
+            errors[f"{pickup}->{return_} {start}-{end}"] = str(e)
+            continue
+        for group in find_car_groups(payload):
+            price = price_of(group)
+            if price is None:
+                continue
+            code = group.get("groupCode", group.get("groupTypeHe"))
+            best = cheapest.get(code)
+            if best is None or price < best["amountIncDiscountIncVat"]:
+                cheapest[code] = {
+                    **{field: group[field] for field in PROJECTED_FIELDS if field in group},
+                    "amountIncDiscountIncVat": price,
+                    "pickupBranch": pickup,
+                    "returnBranch": return_,
+                    "fromDate": start,
+                    "toDate": end,
+                }
+
+    offers = sorted(cheapest.values(), key=lambda offer: offer["amountIncDiscountIncVat"])
+    result: Dict[str, Any] = {
+        "searches": len(grid),
+        "car_groups": len(offers),
+        "cheapest": offers[:max(1, limit)],
+    }
+    if errors:
+        result["errors"] = errors
+    if skipped > 0:
+        result["skipped_searches"] = skipped
+    return result
@@ -0,0 +1,342 @@
+"""Offline benchmark suite for the rental, sales and master graphs.
+
+Each scenario is a scripted conversation that runs end to end through a
+graph against ``StandInBackends`` and a ``ScriptedChatModel``, so it needs no
+network and no API key. Conversations are padded with small-talk turns to
+each requested length and every turn records its latency, LLM calls, prompt
+and completion tokens and HTTP calls. A second pass under ``tracemalloc``
+records the peak memory of the whole conversation. Backend caches are
+emptied before every conversation so runs are comparable.
+
+Results are written as JSON; pass ``--baseline`` with an earlier results file
+to list the metrics that regressed beyond ``--tolerance``.
+
+Run ``python -m agent.benchmark`` (or ``make benchmark``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import registry
+from agent.message_utils import message_text
+from agent.rental_results import SEARCH_PAGE_SIZE
+from agent.stand_ins import ScriptedCall, ScriptedChatModel, StandInBackends
+
+RESULTS_VERSION = 1
+DEFAULT_LENGTHS = (6, 12, 24)
+
+# Summary metrics compared against a baseline; lower is better for all of them
+SUMMARY_METRICS = (
+    "turn_latency_ms_p50",
+    "turn_latency_ms_p95",
+    "llm_calls_per_turn",
+    "prompt_tokens_per_turn",
+    "completion_tokens_per_turn",
+    "http_calls_per_turn",
+    "peak_memory_kb",
+)
+
+
+class Turn(NamedTuple):
+    text: str
+    tool_calls: List[ScriptedCall] = []
+
+
+class Scenario(NamedTuple):
+    graph: str
+    turns: List[Turn]
+    filler: List[Turn]
+
+
+def _tool_texts(messages: Sequence[BaseMessage]) -> str:
+    return "\n".join(message_text(m) for m in messages if isinstance(m, ToolMessage))
+
+
+def _next_page(messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    text = _tool_texts(messages)
+    result_ids = re.findall(r"result_id['\"]?: ['\"]([\w-]+)", text)
+    cursors = re.findall(r"next_cursor['\"]?: (\d+)", text)
+    return {"result_id": result_ids[-1] if result_ids else "", "cursor": int(cursors[-1]) if cursors else SEARCH_PAGE_SIZE}
+
+
+def _first_hand_ids(messages: Sequence[BaseMessage]) -> Dict[str, Any]:
+    ids = list(dict.fromkeys(re.findall(r"FH\d+", _tool_texts(messages))))
+    return {"importer_models": ids[:3] or ["FH1"]}
+
+
+RENTAL_DATES = {"fromDate": "28/08/2030", "fromTime": "10:00", "toDate": "30/08/2030", "toTime": "10:00"}
+
+RENTAL_TURNS = [
+    Turn("אני רוצה לשכור רכב"),
+    Turn("מאיזה סניפים אפשר לאסוף?", [{"name": "get_branches", "args": {}}]),
+    Turn("איסוף ב-28/08/2030 בשעה 10:00 מסניף 49"),
+    Turn(
+        "החזרה ב-30/08/2030 בשעה 10:00 לאותו סניף",
+        [{"name": "search_available_cars", "args": {**RENTAL_DATES, "pickupBranch": 49, "returnBranch": 49}}],
+    ),
+    Turn("יש עוד אפשרויות?", [{"name": "get_more_cars", "args": _next_page}]),
+    Turn(
+        "אני רוצה את קבוצה 7",
+        [{
+            "name": "generate_purchase_link",
+            "args": {
+                **RENTAL_DATES,
+                "pickupBranch": 49,
+                "returnBranch": 49,
+                "carGroup": 7,
+                "pickupBranchName": "סניף 49",
+                "returnBranchName": "סניף 49",
+                "pickupBranchNameEn": "Branch 49",
+                "returnBranchNameEn": "Branch 49",
+            },
+        }],
+    ),
+]
+
+SALES_TURNS = [
+    Turn("אני מחפש רכב לקנות"),
+    Turn(
+        "התקציב שלי עד 150 אלף, רכב משפחתי",
+        [{"name": "search_sales_catalog", "args": {"max_price": 150000, "category": "משפחתי"}}],
+    ),
+    Turn("תראה לי פרטים על הראשונים", [{"name": "get_first_hand_cars_details", "args": _first_hand_ids}]),
+    Turn(
+        "מה הכי משתלם לי?",
+        [{"name": "compare_and_recommend", "args": {"user_budget": 150000, "preferred_category": "משפחתי"}}],
+    ),
+]
+
+FILLER_TURNS = [
+    Turn("תודה, ומה לגבי ביטוח?"),
+    Turn("אפשר להוסיף כיסא לתינוק?"),
+    Turn("מה שעות הפתיחה?"),
+]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "rental": Scenario("rental", RENTAL_TURNS, FILLER_TURNS),
+    "sales": Scenario("sales", SALES_TURNS, FILLER_TURNS),
+    # The greeting is answered by the router's clarification menu, without the LLM
+    "master": Scenario("master", [Turn("שלום")] + RENTAL_TURNS, FILLER_TURNS),
+}
+
+
+def build_graph(name: str) -> Any:
+    """Compile a graph with an in-memory checkpointer so turns share state."""
+    if name == "rental":
+        from agent.rent_cars_agent import graph_builder
+    elif name == "sales":
+        from agent.sales_cars_agent import graph_builder
+    else:
+        from agent.master_agent import master_graph_builder as graph_builder
+    return graph_builder.compile(checkpointer=InMemorySaver())
+
+
+def conversation(scenario: Scenario, length: int) -> List[Turn]:
+    """Return the scenario's turns, padded with filler turns to ``length``."""
+    turns = list(scenario.turns[:length])
+    while len(turns) < length:
+        turns.append(scenario.filler[(len(turns) - len(scenario.turns)) % len(scenario.filler)])
+    return turns
+
+
+def run_conversation(
+    scenario: Scenario,
+    length: int,
+    backends: StandInBackends,
+    llm_latency: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """Run one conversation and return the metrics of every turn."""
+    turns = conversation(scenario, length)
+    model = ScriptedChatModel(
+        script={turn.text: turn.tool_calls for turn in turns if turn.tool_calls},
+        latency=llm_latency,
+    )
+    registry.set_llm(model)
+    backends.install()
+    graph = build_graph(scenario.graph)
+    config = {"configurable": {"thread_id": f"bench-{scenario.graph}-{length}"}}
+
+    results = []
+    try:
+        for index, turn in enumerate(turns):
+            llm_before, http_before = model.snapshot(), backends.total_calls
+            start = time.perf_counter()
+            graph.invoke({"messages": [HumanMessage(content=turn.text)]}, config)
+            latency = time.perf_counter() - start
+            llm_after = model.snapshot()
+            results.append({
+                "turn": index + 1,
+                "latency_ms": round(latency * 1000, 3),
+                "llm_calls": llm_after["calls"] - llm_before["calls"],
+                "prompt_tokens": llm_after["prompt_tokens"] - llm_before["prompt_tokens"],
+                "completion_tokens": llm_after["completion_tokens"] - llm_before["completion_tokens"],
+                "http_calls": backends.total_calls - http_before,
+            })
+    finally:
+        registry.set_llm(None)
+        backends.uninstall()
+    return results
+
+
+def peak_memory_kb(scenario: Scenario, length: int, backends: StandInBackends) -> float:
+    """Return the peak traced memory of one conversation in KiB."""
+    tracemalloc.start()
+    try:
+        run_conversation(scenario, length, backends)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round(peak / 1024, 1)
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(turns: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Aggregate per-turn metrics into the summary compared between versions."""
+    latencies = [t["latency_ms"] for t in turns]
+    count = len(turns)
+    return {
+        "turn_latency_ms_p50": round(statistics.median(latencies), 3),
+        "turn_latency_ms_p95": round(_percentile(latencies, 0.95), 3),
+        "turn_latency_ms_mean": round(statistics.fmean(latencies), 3),
+        "llm_calls_per_turn": round(sum(t["llm_calls"] for t in turns) / count, 3),
+        "prompt_tokens_per_turn": round(sum(t["prompt_tokens"] for t in turns) / count, 1),
+        "completion_tokens_per_turn": round(sum(t["completion_tokens"] for t in turns) / count, 1),
+        "http_calls_per_turn": round(sum(t["http_calls"] for t in turns) / count, 3),
+        "last_turn_prompt_tokens": turns[-1]["prompt_tokens"],
+    }
+
+
+def run_benchmark(
+    scenarios: Sequence[str] = tuple(SCENARIOS),
+    lengths: Sequence[int] = DEFAULT_LENGTHS,
+    repeats: int = 3,
+    llm_latency: float = 0.0,
+    http_latency: float = 0.0,
+    measure_memory: bool = True,
+) -> Dict[str, Any]:
+    """Run every scenario at every length and return the results document."""
+    backends = StandInBackends(latency=http_latency)
+    results: Dict[str, Any] = {}
+    for name in scenarios:
+        scenario = SCENARIOS[name]
+        for length in lengths:
+            runs = [run_conversation(scenario, length, backends, llm_latency) for _ in range(max(1, repeats))]
+            # Per turn, keep the median latency over the repeats; counts are deterministic
+            turns = [
+                {**run_turns[0], "latency_ms": round(statistics.median(t["latency_ms"] for t in run_turns), 3)}
+                for run_turns in zip(*runs)
+            ]
+            summary = summarize(turns)
+            if measure_memory:
+                summary["peak_memory_kb"] = peak_memory_kb(scenario, length, backends)
+            results[f"{name}/{length}"] = {"scenario": name, "length": length, "summary": summary, "turns": turns}
+    return {
+        "version": RESULTS_VERSION,
+        "meta": {
+            "revision": _revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeats": repeats,
+            "llm_latency": llm_latency,
+            "http_latency": http_latency,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """Return a line for every summary metric that got worse than ``tolerance`` allows.
+
+    Differences of less than one unit (ms, call, token or KiB) are ignored as noise.
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if previous is None:
+            continue
+        for metric in SUMMARY_METRICS:
+            old, new = previous["summary"].get(metric), result["summary"].get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old >= 1:
+                change = f"+{(new - old) / old:.0%}" if old else "new"
+                regressions.append(f"{key} {metric}: {old} -> {new} ({change})")
+    return regressions
+
+
+def _revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+
+
+def format_table(document: Dict[str, Any]) -> str:
+    """Render the summaries as a plain-text table."""
+    columns = ("p50 ms", "p95 ms", "llm/turn", "prompt tok", "compl tok", "http/turn", "peak KiB")
+    lines = [f"{'run':<12}" + "".join(f"{c:>12}" for c in columns)]
+    for key, result in document["results"].items():
+        summary = result["summary"]
+        values = [summary.get(metric, "-") for metric in SUMMARY_METRICS]
+        lines.append(f"{key:<12}" + "".join(f"{v:>12}" for v in values))
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the benchmark from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenario names")
+    parser.add_argument("--lengths", default=",".join(map(str, DEFAULT_LENGTHS)), help="comma-separated turn counts")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per scripted LLM call")
+    parser.add_argument("--http-latency", type=float, default=0.0, help="seconds per stand-in backend request")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    document = run_benchmark(
+        scenarios=[s for s in args.scenarios.split(",") if s],
+        lengths=[int(n) for n in args.lengths.split(",") if n],
+        repeats=args.repeats,
+        llm_latency=args.llm_latency,
+        http_latency=args.http_latency,
+        measure_memory=not args.no_memory,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False, indent=2)
+    print(format_table(document))  # noqa: T201
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), document, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")  # noqa: T201
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
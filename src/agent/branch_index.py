@@ -0,0 +1,193 @@
+"""Fuzzy lookup index over the rental branch list.
+
+The branch list is indexed once per snapshot so ``find_branch`` can resolve a
+place the user named ("נתב"ג", "Haifa", "הרצליא") to branch IDs without the
+model reading the whole list. Names are matched on several keys per word:
+
+- the normalized spelling, with Hebrew prefix letters (ב, ל, מ, ה, ו) dropped,
+- a consonant skeleton shared by Hebrew and Latin spellings, so "חיפה" and
+  "Haifa" meet on the same key,
+- alias groups for airports and common city nicknames,
+
+and near misses are scored with ``difflib`` so typos still match.
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from agent.branches import branch_cache, branch_id, branch_name, branch_name_en, get_branches, iter_branch_records
+
+CITY_FIELDS = ("city", "cityName", "cityHe", "cityNameHe")
+CITY_EN_FIELDS = ("cityEn", "cityNameEn")
+
+# Spellings that name the same place; a branch whose names contain any of them gets all of them
+BRANCH_ALIASES = [
+    ["נתבג", "בן גוריון", "ben gurion", "natbag"],
+    ["נמל תעופה", "נמל התעופה", "שדה תעופה", "שדה התעופה", "airport"],
+    ["רמון", "ramon"],
+    ["תל אביב", "תא", "tel aviv", "tlv"],
+    ["ירושלים", "jerusalem"],
+    ["באר שבע", "בש", "beer sheva", "beersheba"],
+    ["פתח תקווה", "פתח תקוה", "petah tikva", "petach tikva"],
+    ["ראשון לציון", "ראשלצ", "rishon lezion", "rishon"],
+]
+
+# Words that do not tell branches apart
+STOP_WORDS = {"סניף", "סניפים", "branch", "branches", "השכרה", "rent", "רכב", "car", "the", "של", "ליד", "near", "in"}
+
+# Hebrew letters and Latin spellings mapped to shared consonant classes; vowels are dropped
+_HEBREW_SOUNDS = {
+    "ב": "b", "ג": "g", "ד": "d", "ה": "h", "ח": "h", "ז": "z", "ט": "t", "ת": "t",
+    "כ": "k", "ך": "k", "ק": "k", "ל": "l", "מ": "m", "ם": "m", "נ": "n", "ן": "n",
+    "ס": "s", "ש": "s", "פ": "p", "ף": "p", "צ": "z", "ץ": "z", "ר": "r",
+}
+_LATIN_DIGRAPHS = (("sh", "s"), ("ch", "h"), ("kh", "h"), ("tz", "z"), ("ts", "z"), ("ph", "p"))
+_LATIN_SOUNDS = {
+    "b": "b", "v": "b", "w": "b", "g": "g", "d": "d", "h": "h", "z": "z", "t": "t",
+    "k": "k", "c": "k", "q": "k", "x": "k", "l": "l", "m": "m", "n": "n", "s": "s",
+    "p": "p", "f": "p", "r": "r",
+}
+
+_HEBREW_PREFIXES = "בלמהו"
+MATCH_THRESHOLD = 0.75
+
+
+def normalize_place(text: Any) -> str:
+    """Lowercase and drop punctuation, quotes and extra spaces from a place name."""
+    # Quotes inside acronyms are dropped ("נתב"ג" -> "נתבג"), other punctuation separates words
+    text = re.sub(r"[\"'`׳״]", "", str(text).lower())
+    return " ".join(re.sub(r"[.\-_/&,()]", " ", text).split())
+
+
+def skeleton(word: str) -> str:
+    """Return the consonant skeleton of a Hebrew or Latin word."""
+    for digraph, sound in _LATIN_DIGRAPHS:
+        word = word.replace(digraph, sound)
+    # A final ה is a vowel: "חיפה" sounds like "Haifa"
+    if len(word) > 2 and word.endswith("ה"):
+        word = word[:-1]
+    sounds = [_HEBREW_SOUNDS.get(ch) or _LATIN_SOUNDS.get(ch) or "" for ch in word]
+    # Collapse doubled letters such as "Herzliyya" or "Yaffo"
+    return "".join(s for i, s in enumerate(sounds) if s and (i == 0 or s != sounds[i - 1]))
+
+
+def _variants(word: str) -> List[str]:
+    # "בחיפה" -> "חיפה", "מהרצליה" -> "הרצליה"
+    variants = [word]
+    while len(word) > 3 and word[0] in _HEBREW_PREFIXES:
+        word = word[1:]
+        variants.append(word)
+    return variants
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in normalize_place(text).split() if word not in STOP_WORDS]
+
+
+def _first(record: Dict[str, Any], fields: Sequence[str]) -> str:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return str(value)
+    return ""
+
+
+def _word_score(word: str, keys: Sequence[Tuple[str, str]]) -> float:
+    best = 0.0
+    for variant in _variants(word):
+        sound = skeleton(variant)
+        for key, key_sound in keys:
+            if variant == key:
+                return 1.0
+            if len(variant) >= 3 and key.startswith(variant):
+                best = max(best, 0.9)
+            elif sound and sound == key_sound and len(sound) >= 2:
+                best = max(best, 0.85)
+            else:
+                ratio = max(
+                    difflib.SequenceMatcher(None, variant, key).ratio(),
+                    difflib.SequenceMatcher(None, sound, key_sound).ratio() - 0.1 if len(sound) >= 3 else 0.0,
+                )
+                if ratio >= MATCH_THRESHOLD:
+                    best = max(best, ratio * 0.9)
+    return best
+
+
+class BranchIndex:
+    """Searchable name keys for every branch in the branch list."""
+
+    def __init__(self, payload: Any) -> None:
+        self.branches: List[Dict[str, Any]] = []
+        self.keys: List[List[Tuple[str, str]]] = []
+        for record in iter_branch_records(payload):
+            record_id = branch_id(record)
+            if record_id is None:
+                continue
+            name, name_en = branch_name(record), branch_name_en(record)
+            city, city_en = _first(record, CITY_FIELDS), _first(record, CITY_EN_FIELDS)
+            text = normalize_place(" ".join((name, name_en, city, city_en)))
+            # Whole-phrase aliases, matched against the full names
+            aliases = [
+                alias
+                for group in BRANCH_ALIASES
+                if any(re.search(rf"(?<!\w){re.escape(normalize_place(term))}(?!\w)", text) for term in group)
+                for alias in group
+            ]
+            words = set(_words(text))
+            for alias in aliases:
+                words.update(_words(alias))
+            self.branches.append({
+                "id": record_id,
+                "pickupBranchName": name,
+                "pickupBranchNameEn": name_en,
+                **({"city": city} if city else {}),
+            })
+            self.keys.append([(word, skeleton(word)) for word in sorted(words)])
+
+    def __len__(self) -> int:
+        return len(self.branches)
+
+    def search(self, query: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Return the best matching branches for ``query``, best first."""
+        if query.strip().isdigit():
+            return [dict(b, score=1.0) for b in self.branches if b["id"] == int(query)][:limit]
+        words = _words(query)
+        if not words:
+            return []
+        scored = []
+        for position, (branch, keys) in enumerate(zip(self.branches, self.keys)):
+            scores = [_word_score(word, keys) for word in words]
+            # Every word counts, but one strong word is enough for a short place name
+            score = (sum(scores) / len(scores) + max(scores)) / 2
+            if score >= MATCH_THRESHOLD * 0.8:
+                scored.append((-score, position, branch))
+        scored.sort(key=lambda item: item[:2])
+        return [dict(branch, score=round(-score, 2)) for score, _, branch in scored[:limit]]
+
+
+_index_lock = threading.Lock()
+_index: Optional[BranchIndex] = None
+_index_version: Optional[int] = None
+
+
+def get_branch_index() -> BranchIndex:
+    """Return the index, rebuilding it when the branch list snapshot changed."""
+    global _index, _index_version
+    payload = get_branches()
+    version = branch_cache.version
+    with _index_lock:
+        if _index is None or version != _index_version:
+            _index = BranchIndex(payload)
+            _index_version = version
+        return _index
+
+
+def find_branches(query: str, limit: int = 5) -> Dict[str, Any]:
+    """Resolve a place name to the few branches it most likely means."""
+    index = get_branch_index()
+    matches = index.search(query, limit=max(1, min(limit, 10)))
+    return {"query": query, "matches": matches, "total_branches": len(index)}
@@ -0,0 +1,81 @@
+"""Cached Shlomo SIXT rental branch list."""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from agent.cache import RefreshingCache
+from agent.http_client import RENT_BASE_URL
+from agent.resilience import request
+
+# The branch list changes a few times a year
+BRANCHES_TTL = float(os.getenv("SHLOMO_BRANCHES_TTL", str(6 * 60 * 60)))
+BRANCHES_SNAPSHOT = os.getenv("SHLOMO_BRANCHES_SNAPSHOT") or None
+
+
+def fetch_branches() -> Any:
+    """Fetch the branch list from the rental backend."""
+    # Read-only search, so it is safe to retry and hedge
+    response = request(RENT_BASE_URL, "POST", "/api/v1/rent/branches", endpoint="branches", idempotent=True, json={})
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+    return response.json()
+
+
+branch_cache = RefreshingCache(
+    "branches",
+    fetch_branches,
+    ttl=BRANCHES_TTL,
+    snapshot_path=BRANCHES_SNAPSHOT,
+)
+
+
+def get_branches() -> Any:
+    """Return the branch list, served from the process-wide cache."""
+    return branch_cache.get()
+
+
+# Field names seen on branch records, in order of preference
+BRANCH_ID_FIELDS = ("branchCode", "branchId", "code", "id")
+BRANCH_NAME_FIELDS = ("branchName", "branchNameHe", "nameHe", "name", "pickupBranchName")
+BRANCH_NAME_EN_FIELDS = ("branchNameEn", "nameEn", "englishName", "pickupBranchNameEn")
+
+
+def iter_branch_records(payload: Any) -> List[Dict[str, Any]]:
+    """Return the branch records from a branch list payload of any known shape."""
+    if isinstance(payload, dict):
+        for key in ("data", "branches", "items", "result"):
+            if key in payload:
+                return iter_branch_records(payload[key])
+        return []
+    if isinstance(payload, list):
+        return [record for record in payload if isinstance(record, dict)]
+    return []
+
+
+def _first_field(record: Dict[str, Any], fields: Tuple[str, ...]) -> Any:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def branch_id(record: Dict[str, Any]) -> Optional[int]:
+    """Return the numeric branch ID of a branch record."""
+    value = _first_field(record, BRANCH_ID_FIELDS)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def branch_name(record: Dict[str, Any]) -> str:
+    """Return the Hebrew name of a branch record."""
+    return str(_first_field(record, BRANCH_NAME_FIELDS) or "")
+
+
+def branch_name_en(record: Dict[str, Any]) -> str:
+    """Return the English name of a branch record."""
+    return str(_first_field(record, BRANCH_NAME_EN_FIELDS) or "")
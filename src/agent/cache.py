@@ -0,0 +1,290 @@
+"""Process-wide caches for backend payloads.
+
+``RefreshingCache`` holds one slow-changing payload (branches, catalogs);
+``KeyedCache`` holds many short-lived ones keyed by their request.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from agent import deadline
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One in-progress fetch that concurrent callers wait on."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+        self.value: Any = None
+
+
+class RefreshingCache:
+    """Cache one backend payload with a TTL and stale-while-revalidate refresh.
+
+    A fresh value is returned directly. Once the TTL has passed the stale value
+    is still returned immediately while a background thread fetches a new one.
+    The cache only blocks on the network when it has nothing to serve at all,
+    and concurrent callers during a fetch share that single request. A failed
+    fetch never discards the value already held. When ``snapshot_path`` is
+    set, every successful fetch is also written to disk so a restarted worker
+    can answer before its first fetch.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[], Any],
+        ttl: float,
+        snapshot_path: Optional[str] = None,
+    ) -> None:
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+
+        self.version = 0
+        self._value: Any = None
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._flight: Optional[_Flight] = None
+        self._schedule_stop: Optional[threading.Event] = None
+
+    def get(self) -> Any:
+        """Return the cached value, fetching or refreshing it as needed."""
+        if self._fetched_at is None:
+            self._load_snapshot()
+
+        if self._fetched_at is None:
+            # Nothing to serve yet - block on a (shared) fetch
+            return self.refresh()
+
+        if self.is_stale():
+            self._refresh_in_background()
+        return self._value
+
+    def peek(self) -> Any:
+        """Return the held value (or None) without ever touching the network."""
+        if self._fetched_at is None:
+            self._load_snapshot()
+        return self._value
+
+    def is_stale(self) -> bool:
+        """Return True if the value is missing or older than the TTL."""
+        if self._fetched_at is None:
+            return True
+        return time.time() - self._fetched_at > self.ttl
+
+    def age(self) -> Optional[float]:
+        """Return the age of the held value in seconds, or None if empty."""
+        if self._fetched_at is None:
+            return None
+        return time.time() - self._fetched_at
+
+    def info(self) -> Dict[str, Any]:
+        """Describe the held snapshot (version, age and staleness)."""
+        age = self.age()
+        return {
+            "version": self.version,
+            "age_seconds": round(age, 1) if age is not None else None,
+            "stale": self.is_stale(),
+        }
+
+    def refresh(self) -> Any:
+        """Fetch a new value now and store it.
+
+        If a fetch is already running, wait for it instead of starting another.
+        """
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if flight is None:
+                flight = self._flight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return self._value
+        return self._fetch(flight)
+
+    def _fetch(self, flight: _Flight) -> Any:
+        # Runs the loader for a flight the caller has claimed under the lock
+        try:
+            value = self.loader()
+            with self._lock:
+                self._store(value)
+            return value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flight = None
+            flight.done.set()
+
+    def invalidate(self) -> None:
+        """Drop the in-memory value (the on-disk snapshot is kept)."""
+        with self._lock:
+            self._value = None
+            self._fetched_at = None
+
+    def start_schedule(self, interval: float) -> None:
+        """Refresh the value every ``interval`` seconds on a daemon thread."""
+        with self._lock:
+            if self._schedule_stop is not None:
+                return
+            stop = self._schedule_stop = threading.Event()
+
+        def run() -> None:
+            while not stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.warning("Scheduled refresh of %s failed", self.name, exc_info=True)
+
+        threading.Thread(target=run, name=f"schedule-{self.name}", daemon=True).start()
+
+    def stop_schedule(self) -> None:
+        """Stop the periodic refresh started by start_schedule."""
+        with self._lock:
+            stop, self._schedule_stop = self._schedule_stop, None
+        if stop is not None:
+            stop.set()
+
+    def _store(self, value: Any, fetched_at: Optional[float] = None) -> None:
+        self._value = value
+        self._fetched_at = fetched_at if fetched_at is not None else time.time()
+        self.version += 1
+        if fetched_at is None:
+            self._write_snapshot()
+
+    def _refresh_in_background(self) -> None:
+        # Claim the flight before starting the thread, so concurrent stale reads start one refresh
+        with self._lock:
+            if self._flight is not None:
+                return
+            flight = self._flight = _Flight()
+
+        def run() -> None:
+            try:
+                self._fetch(flight)
+            except Exception:
+                # Keep serving the stale value, the next read retries
+                logger.warning("Background refresh of %s failed", self.name, exc_info=True)
+
+        threading.Thread(target=run, name=f"refresh-{self.name}", daemon=True).start()
+
+    def _load_snapshot(self) -> None:
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            with self._lock:
+                if self._fetched_at is None:
+                    self._store(snapshot["value"], fetched_at=float(snapshot["fetched_at"]))
+        except Exception:
+            logger.warning("Ignoring unreadable %s snapshot %s", self.name, self.snapshot_path, exc_info=True)
+
+    def _write_snapshot(self) -> None:
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"fetched_at": self._fetched_at, "value": self._value}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+        except OSError:
+            logger.warning("Could not write %s snapshot %s", self.name, self.snapshot_path, exc_info=True)
+
+
+class KeyedCache:
+    """Bounded LRU cache of loader results per key, with a TTL and request coalescing.
+
+    Concurrent misses for the same key share a single ``loader(key)`` call;
+    waiters give up with ``DeadlineExceeded`` when their turn deadline passes.
+    Failures are never cached; every waiter on a failed load gets the error.
+    """
+
+    def __init__(self, name: str, loader: Callable[[Any], Any], ttl: float, max_entries: int = 256) -> None:
+        self.name = name
+        self.loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats: Dict[str, int] = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "evictions": 0}
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value for ``key``, loading it on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            left = deadline.remaining()
+            if not flight.done.wait(None if left is None else max(0.0, left)):
+                raise deadline.DeadlineExceeded(f"turn time budget exhausted waiting for {self.name}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = self.loader(key)
+            with self._lock:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats["evictions"] += 1
+            flight.value = value
+            return value
+        except BaseException as e:
+            flight.error = e
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or every entry when no key is given."""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def info(self) -> Dict[str, Any]:
+        """Return the counters, hit rate and current size."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+            served = self.stats["hits"] + self.stats["coalesced"]
+            return {
+                **self.stats,
+                "entries": len(self._entries),
+                "hit_rate": round(served / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,92 @@
+"""Cached, batched car detail lookups for the sales services.
+
+Details are cached per (service, ID) for ``SHLOMO_DETAILS_TTL`` seconds, and
+a batch of IDs is fetched concurrently with at most
+``SHLOMO_DETAILS_FANOUT`` requests submitted at a time, so presenting a shortlist of
+cars costs one tool call instead of one per car.
+"""
+
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+from agent.cache import KeyedCache
+from agent.catalogs import FIRST_HAND, LEASING, ZERO_KM
+from agent.http_client import LEASING_BASE_URL, SALES_BASE_URL
+from agent.resilience import fan_out, request
+
+DETAILS_TTL = float(os.getenv("SHLOMO_DETAILS_TTL", str(15 * 60)))
+DETAILS_CACHE_SIZE = int(os.getenv("SHLOMO_DETAILS_CACHE_SIZE", "512"))
+# Max detail requests of one batch that run at the same time
+DETAILS_FANOUT = int(os.getenv("SHLOMO_DETAILS_FANOUT", "4"))
+# Max IDs fetched by one batch call
+DETAILS_BATCH_MAX = int(os.getenv("SHLOMO_DETAILS_BATCH_MAX", "8"))
+
+DETAIL_ENDPOINTS: Dict[str, Tuple[str, str]] = {
+    FIRST_HAND: (SALES_BASE_URL, "/api/shlomo/first-hand-cars/{}"),
+    ZERO_KM: (SALES_BASE_URL, "/api/shlomo/zero-km-cars/{}"),
+    LEASING: (LEASING_BASE_URL, "/api/shlomo/leasing-cars/{}"),
+}
+
+_executor = ThreadPoolExecutor(max_workers=4 * DETAILS_FANOUT, thread_name_prefix="shlomo-details")
+
+
+def fetch_car_details(service_type: str, car_id: str) -> Any:
+    """Fetch the details of one car from its service backend."""
+    base_url, path = DETAIL_ENDPOINTS[service_type]
+    response = request(base_url, "GET", path.format(car_id), endpoint="details")
+    if response.status_code != 200:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+    return response.json()
+
+
+details_cache = KeyedCache(
+    "car_details",
+    lambda key: fetch_car_details(*key),
+    ttl=DETAILS_TTL,
+    max_entries=DETAILS_CACHE_SIZE,
+)
+
+
+def get_car_details(service_type: str, car_id: str) -> Any:
+    """Return the details of one car, served from the per-ID cache."""
+    return details_cache.get((service_type, str(car_id).strip()))
+
+
+def compact(value: Any) -> Any:
+    """Drop empty fields (None, "", [], {}) at every level of a payload."""
+    if isinstance(value, dict):
+        items = ((k, compact(v)) for k, v in value.items())
+        return {k: v for k, v in items if v not in (None, "", [], {})}
+    if isinstance(value, list):
+        return [v for v in (compact(item) for item in value) if v not in (None, "", [], {})]
+    return value
+
+
+def get_car_details_batch(service_type: str, car_ids: Iterable[Any]) -> Dict[str, Any]:
+    """Fetch the details of several cars concurrently and combine them into one payload."""
+    ids: List[str] = []
+    for car_id in car_ids:
+        car_id = str(car_id).strip()
+        if car_id and car_id not in ids:
+            ids.append(car_id)
+    skipped = ids[DETAILS_BATCH_MAX:]
+    ids = ids[:DETAILS_BATCH_MAX]
+
+    futures = fan_out(_executor, lambda car_id: get_car_details(service_type, car_id), ids, DETAILS_FANOUT)
+    cars: Dict[str, Any] = {}
+    errors: Dict[str, str] = {}
+    for car_id, future in zip(ids, futures):
+        try:
+            cars[car_id] = compact(future.result())
+        except Exception as e:
+            errors[car_id] = str(e)
+
+    result: Dict[str, Any] = {"service_type": f"{service_type}_details", "cars": cars}
+    if errors:
+        result["errors"] = errors
+    if skipped:
+        result["skipped"] = skipped
+    return result
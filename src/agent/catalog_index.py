@@ -0,0 +1,304 @@
+"""Columnar in-memory index over the sales catalogs.
+
+The three catalog snapshots are flattened into NumPy columns (price, monthly
+payment, category, manufacturer and service type) so range and equality
+filters run vectorized over every car at once and only matching rows are
+handed to the model.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from agent.catalogs import CATALOG_CACHES, FIRST_HAND, LEASING, ZERO_KM, start_catalog_refresh
+
+# Car categories mapping
+CAR_CATEGORIES = {
+    "מיני-משפחתיות": ["מיני", "קטן", "עירוני"],
+    "היברידי": ["היברידי", "הייברידי", "חשמלי חלקי"],
+    "קטנות": ["קטן", "קומפקטי", "חסכוני"],
+    "משפחתיות": ["משפחתי", "סדאן", "האצ'בק"],
+    "ג'יפונים/SUV": ["SUV", "ג'יפ", "גיפון", "קרוסאובר"],
+    "מנהלים / יוקרה": ["יוקרה", "מנהלים", "פרימיום"],
+    "7 מקומות ומיני וואן": ["7 מקומות", "מיני וואן", "ואן", "רב מקומות"],
+    "מסחריות": ["מסחרי", "נותן שירות", "עבודה"],
+    "חשמלי": ["חשמלי", "EV", "אלקטרי"]
+}
+
+# Manufacturers list
+MANUFACTURERS = [
+    "ב.מ.וו", "AIWAYS", "BMW", "BYD", "CHERY", "Geely", "Jaecoo", "KGM", "LEAP",
+    "LYNK&CO", "MG", "ORA", "ZEEKR", "אאודי", "אופל", "אינפיניטי", "איסוזו",
+    "אלפא רומיאו", "ב.מ.וו.", "ג'נסיס", "גנסיס", "דאצ'ה", "דאצה", "דונגפנג",
+    "די אס", "די.אס", "הונדה", "וולוו", "טויוטה", "יונדאי", "לנד רובר", "לקסוס",
+    "מאזדה", "מיצובישי", "מרצדס", "ניסאן", "סאנגיונג", "סובארו", "סוזוקי",
+    "סיאט", "סיטרואן", "סקודה", "פולסטאר", "פולקסווגן", "פורד", "פורשה",
+    "פיאט", "פיג'ו", "קאדילק", "קופרה", "קיה", "קרייזלר", "רנו", "שברולט"
+]
+
+# Spelling variants -> canonical manufacturer name
+MANUFACTURER_ALIASES = {
+    "ב.מ.וו": "BMW", "ב.מ.וו.": "BMW", "במוו": "BMW", "bmw": "BMW",
+    "גנסיס": "ג'נסיס", "genesis": "ג'נסיס",
+    "דאצה": "דאצ'ה", "dacia": "דאצ'ה",
+    "די אס": "די.אס", "ds": "די.אס",
+    "audi": "אאודי", "opel": "אופל", "infiniti": "אינפיניטי", "isuzu": "איסוזו",
+    "alfa romeo": "אלפא רומיאו", "dongfeng": "דונגפנג", "honda": "הונדה", "volvo": "וולוו",
+    "toyota": "טויוטה", "hyundai": "יונדאי", "land rover": "לנד רובר", "lexus": "לקסוס",
+    "mazda": "מאזדה", "mitsubishi": "מיצובישי", "mercedes": "מרצדס", "nissan": "ניסאן",
+    "ssangyong": "סאנגיונג", "subaru": "סובארו", "suzuki": "סוזוקי", "seat": "סיאט",
+    "citroen": "סיטרואן", "skoda": "סקודה", "polestar": "פולסטאר", "volkswagen": "פולקסווגן",
+    "vw": "פולקסווגן", "ford": "פורד", "porsche": "פורשה", "fiat": "פיאט", "peugeot": "פיג'ו",
+    "cadillac": "קאדילק", "cupra": "קופרה", "kia": "קיה", "chrysler": "קרייזלר",
+    "renault": "רנו", "chevrolet": "שברולט",
+}
+
+SERVICE_TYPES = (FIRST_HAND, ZERO_KM, LEASING)
+
+# Field names seen on catalog records, in order of preference
+ID_FIELDS = ("id", "carId", "car_id", "importerModel", "importer_model", "modelCode", "code")
+NAME_FIELDS = ("modelName", "model", "name", "title", "description")
+MANUFACTURER_FIELDS = ("manufacturer", "manufacturerName", "manufacturerHe", "brand", "make")
+CATEGORY_FIELDS = ("category", "categoryName", "segment", "bodyType", "type")
+PRICE_FIELDS = ("price", "finalPrice", "priceAfterDiscount", "salePrice", "totalPrice", "listPrice")
+MONTHLY_FIELDS = ("monthlyPayment", "monthlyPrice", "pricePerMonth", "monthly", "leasingPrice")
+
+
+def normalize_name(text: str) -> str:
+    """Lowercase and drop punctuation, quotes and extra spaces from a name."""
+    text = re.sub(r"[\"'`׳״.\-_/&]", "", str(text).lower())
+    return " ".join(text.split())
+
+
+def _build_manufacturer_table() -> Dict[str, str]:
+    table: Dict[str, str] = {}
+    for name in MANUFACTURERS:
+        canonical = MANUFACTURER_ALIASES.get(name, MANUFACTURER_ALIASES.get(name.lower(), name))
+        table[normalize_name(name)] = canonical
+    for alias, canonical in MANUFACTURER_ALIASES.items():
+        table[normalize_name(alias)] = canonical
+    return table
+
+
+_MANUFACTURER_TABLE = _build_manufacturer_table()
+CANONICAL_MANUFACTURERS = sorted(set(_MANUFACTURER_TABLE.values()))
+CATEGORY_NAMES = list(CAR_CATEGORIES)
+_HEBREW_PREFIXES = "ובלהמשכ"
+
+
+def canonical_manufacturer(text: Any) -> Optional[str]:
+    """Map a manufacturer spelling (or a model name starting with one) to its canonical name."""
+    if not text:
+        return None
+    normalized = normalize_name(text)
+    if normalized in _MANUFACTURER_TABLE:
+        return _MANUFACTURER_TABLE[normalized]
+    # Longest known manufacturer that prefixes the text, e.g. "טויוטה קורולה"
+    for name in sorted(_MANUFACTURER_TABLE, key=len, reverse=True):
+        if normalized.startswith(name + " "):
+            return _MANUFACTURER_TABLE[name]
+    return None
+
+
+def _compile_category_keywords() -> Tuple["re.Pattern[str]", List[List[str]]]:
+    # One alternative per keyword, longest first so "חשמלי חלקי" wins over "חשמלי"
+    categories: Dict[str, List[str]] = {}
+    for name, keywords in CAR_CATEGORIES.items():
+        for keyword in keywords:
+            categories.setdefault(normalize_name(keyword), []).append(name)
+    keywords = sorted(categories, key=len, reverse=True)
+    alternatives = []
+    for position, keyword in enumerate(keywords):
+        # Hebrew keywords take prefix letters and gender/plural endings: "הקטנה", "משפחתיות"
+        if re.match("[א-ת]", keyword):
+            alternatives.append(f"(?P<k{position}>[{_HEBREW_PREFIXES}]{{0,2}}{re.escape(keyword)}(?:ה|ת|ים|ות|יות|יים)?)")
+        else:
+            alternatives.append(f"(?P<k{position}>{re.escape(keyword)})")
+    pattern = re.compile(f"(?<![א-תa-z0-9])(?:{'|'.join(alternatives)})(?![א-תa-z0-9])")
+    return pattern, [categories[keyword] for keyword in keywords]
+
+
+_CATEGORY_MATCHER, _KEYWORD_CATEGORIES = _compile_category_keywords()
+
+
+def canonical_category(text: Any) -> Optional[str]:
+    """Map a category name or keyword to one of CAR_CATEGORIES.
+
+    Keywords match whole words only, and a keyword shared by several
+    categories ("קטן") decides nothing on its own.
+    """
+    if not text:
+        return None
+    normalized = normalize_name(text)
+    for name in CATEGORY_NAMES:
+        if normalize_name(name) == normalized:
+            return name
+    for match in _CATEGORY_MATCHER.finditer(normalized):
+        categories = _KEYWORD_CATEGORIES[int(match.lastgroup[1:])]
+        if len(categories) == 1:
+            return categories[0]
+    return None
+
+
+def find_records(payload: Any) -> List[Dict[str, Any]]:
+    """Return the largest list of record dicts inside a catalog payload."""
+    best: List[Dict[str, Any]] = []
+    stack = [payload]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, list):
+            records = [item for item in value if isinstance(item, dict)]
+            if len(records) > len(best):
+                best = records
+            stack.extend(item for item in value if isinstance(item, (list, dict)))
+        elif isinstance(value, dict):
+            stack.extend(item for item in value.values() if isinstance(item, (list, dict)))
+    return best
+
+
+def _first(record: Dict[str, Any], fields: Sequence[str]) -> Any:
+    for field in fields:
+        value = record.get(field)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def _number(value: Any) -> float:
+    if isinstance(value, str):
+        value = re.sub(r"[^\d.,-]", "", value).replace(",", "")
+        if value.count(".") > 1:
+            # "1.234.567" uses dots as thousands separators
+            value = value.replace(".", "")
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+    # A negative price is a data error, not a bargain
+    return number if number >= 0 else float("nan")
+
+
+class CatalogIndex:
+    """NumPy-backed columns over all sales catalog rows."""
+
+    def __init__(self, catalogs: Dict[str, Any]) -> None:
+        rows: List[Dict[str, Any]] = []
+        for service_type in SERVICE_TYPES:
+            for record in find_records(catalogs.get(service_type)):
+                name = _first(record, NAME_FIELDS)
+                manufacturer = canonical_manufacturer(_first(record, MANUFACTURER_FIELDS)) or canonical_manufacturer(name)
+                category = canonical_category(_first(record, CATEGORY_FIELDS)) or canonical_category(name)
+                rows.append({
+                    "service_type": service_type,
+                    "id": _first(record, ID_FIELDS),
+                    "name": name,
+                    "manufacturer": manufacturer,
+                    "category": category,
+                    "price": _number(_first(record, PRICE_FIELDS)),
+                    "monthly_payment": _number(_first(record, MONTHLY_FIELDS)),
+                })
+
+        self.rows = rows
+        self.price = np.array([row["price"] for row in rows], dtype=np.float64)
+        self.monthly = np.array([row["monthly_payment"] for row in rows], dtype=np.float64)
+        self.service = np.array([SERVICE_TYPES.index(row["service_type"]) for row in rows], dtype=np.int8)
+        self.category = np.array(
+            [CATEGORY_NAMES.index(row["category"]) if row["category"] else -1 for row in rows], dtype=np.int16
+        )
+        self.manufacturer = np.array(
+            [CANONICAL_MANUFACTURERS.index(row["manufacturer"]) if row["manufacturer"] else -1 for row in rows],
+            dtype=np.int16,
+        )
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def mask(
+        self,
+        service_types: Optional[Sequence[str]] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_monthly: Optional[float] = None,
+        max_monthly: Optional[float] = None,
+        category: Optional[str] = None,
+        manufacturer: Optional[str] = None,
+    ) -> np.ndarray:
+        """Return a boolean mask of the rows matching every given filter."""
+        mask = np.ones(len(self.rows), dtype=bool)
+        if service_types:
+            codes = [SERVICE_TYPES.index(s) for s in service_types if s in SERVICE_TYPES]
+            mask &= np.isin(self.service, codes)
+        # NaN compares False, so rows without a price drop out of price filters
+        if min_price:
+            mask &= self.price >= min_price
+        if max_price:
+            mask &= self.price <= max_price
+        if min_monthly:
+            mask &= self.monthly >= min_monthly
+        if max_monthly:
+            mask &= self.monthly <= max_monthly
+        # Unknown or ambiguous names are skipped here and reported by unknown_filters()
+        canonical = canonical_category(category) if category else None
+        if canonical:
+            mask &= self.category == CATEGORY_NAMES.index(canonical)
+        canonical = canonical_manufacturer(manufacturer) if manufacturer else None
+        if canonical:
+            mask &= self.manufacturer == CANONICAL_MANUFACTURERS.index(canonical)
+        return mask
+
+    @staticmethod
+    def unknown_filters(category: Optional[str] = None, manufacturer: Optional[str] = None) -> Dict[str, str]:
+        """Return the category/manufacturer values that mask() could not resolve and ignored."""
+        unknown: Dict[str, str] = {}
+        if category and not canonical_category(category):
+            unknown["category"] = category
+        if manufacturer and not canonical_manufacturer(manufacturer):
+            unknown["manufacturer"] = manufacturer
+        return unknown
+
+    def search(self, limit: int = 10, sort_by: str = "price", **filters: Any) -> Tuple[int, List[Dict[str, Any]]]:
+        """Return the number of matches and the first ``limit`` rows, cheapest first."""
+        matches = np.flatnonzero(self.mask(**filters))
+        primary, fallback = (self.monthly, self.price) if sort_by == "monthly_payment" else (self.price, self.monthly)
+        # Leasing rows usually have only a monthly payment, so fall back to the other column
+        keys = np.where(np.isnan(primary[matches]), fallback[matches], primary[matches])
+        order = matches[np.argsort(np.nan_to_num(keys, nan=np.inf), kind="stable")]
+        return len(matches), [_compact(self.rows[i]) for i in order[:limit]]
+
+
+def _compact(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Drop empty fields so the model only sees values that exist
+    return {
+        key: value
+        for key, value in row.items()
+        if value is not None and not (isinstance(value, float) and np.isnan(value))
+    }
+
+
+_index_lock = threading.Lock()
+_index: Optional[CatalogIndex] = None
+_index_versions: Optional[Tuple[int, ...]] = None
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Return the index, rebuilding it when any catalog snapshot changed."""
+    global _index, _index_versions
+    start_catalog_refresh()
+    catalogs: Dict[str, Any] = {}
+    for name in SERVICE_TYPES:
+        try:
+            catalogs[name] = CATALOG_CACHES[name].get()
+        except Exception:
+            # A catalog that cannot be loaded is left out of the index
+            catalogs[name] = None
+    versions = tuple(CATALOG_CACHES[name].version for name in SERVICE_TYPES)
+
+    with _index_lock:
+        if _index is None or versions != _index_versions:
+            _index = CatalogIndex(catalogs)
+            _index_versions = versions
+        return _index
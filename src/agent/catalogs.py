@@ -0,0 +1,73 @@
+"""In-process snapshots of the Shlomo SIXT sales catalogs."""
+
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from agent.cache import RefreshingCache
+from agent.http_client import LEASING_BASE_URL, SALES_BASE_URL
+from agent.resilience import request
+
+CATALOG_TTL = float(os.getenv("SHLOMO_CATALOG_TTL", str(15 * 60)))
+# Scheduled refresh interval in seconds, 0 disables the scheduler
+CATALOG_REFRESH_INTERVAL = float(os.getenv("SHLOMO_CATALOG_REFRESH_INTERVAL", str(10 * 60)))
+CATALOG_SNAPSHOT_DIR = os.getenv("SHLOMO_CATALOG_SNAPSHOT_DIR") or None
+
+FIRST_HAND = "first_hand"
+ZERO_KM = "zero_km"
+LEASING = "leasing"
+
+
+def _fetch(base_url: str, path: str) -> Callable[[], Any]:
+    def fetch() -> Any:
+        response = request(base_url, "GET", path, endpoint="catalog")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {response.text}")
+        return response.json()
+
+    return fetch
+
+
+def _snapshot_path(name: str) -> Optional[str]:
+    if not CATALOG_SNAPSHOT_DIR:
+        return None
+    return os.path.join(CATALOG_SNAPSHOT_DIR, f"{name}.json")
+
+
+CATALOG_CACHES: Dict[str, RefreshingCache] = {
+    name: RefreshingCache(name, _fetch(base_url, path), ttl=CATALOG_TTL, snapshot_path=_snapshot_path(name))
+    for name, base_url, path in [
+        (FIRST_HAND, SALES_BASE_URL, "/api/shlomo/models"),
+        (ZERO_KM, SALES_BASE_URL, "/api/shlomo/zero-km-cars"),
+        (LEASING, LEASING_BASE_URL, "/api/shlomo/leasing-cars"),
+    ]
+}
+
+_schedule_lock = threading.Lock()
+_schedule_started = False
+
+
+def start_catalog_refresh(interval: float = CATALOG_REFRESH_INTERVAL) -> None:
+    """Start the periodic background refresh of every catalog."""
+    global _schedule_started
+    if interval <= 0:
+        return
+    with _schedule_lock:
+        if _schedule_started:
+            return
+        _schedule_started = True
+    for cache in CATALOG_CACHES.values():
+        cache.start_schedule(interval)
+
+
+def get_catalog(name: str) -> Dict[str, Any]:
+    """Return a tool-ready payload for one catalog from its in-process snapshot."""
+    start_catalog_refresh()
+    cache = CATALOG_CACHES[name]
+    try:
+        data = cache.get()
+    except Exception as e:
+        return {"error": str(e), "service_type": name}
+    return {"service_type": name, "data": data, "snapshot": cache.info()}
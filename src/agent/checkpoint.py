@@ -0,0 +1,627 @@
+"""Optional local SQLite checkpointer shared by the agent graphs.
+
+Set ``SHLOMO_CHECKPOINT_DB`` to a file path to persist graph state per
+``thread_id``; clients then only send the new message on each turn. Storage
+is kept compact and bounded:
+
+- values are msgpack-encoded by the LangGraph serializer and zlib-compressed
+  when large,
+- list channels such as ``messages`` are stored item by item in a
+  content-addressed payload table, so a message or tool result is written
+  once no matter how many checkpoints contain it,
+- each thread keeps at most ``SHLOMO_CHECKPOINT_MAX_PER_THREAD`` checkpoints
+  and, beyond its latest one, at most ``SHLOMO_CHECKPOINT_MAX_THREAD_BYTES``
+  bytes, counted across all its namespaces (every turn through a subgraph
+  opens a new one, and old ones are pruned like any other checkpoint),
+- threads idle for longer than ``SHLOMO_CHECKPOINT_TTL`` seconds, and the
+  least recently used ones beyond ``SHLOMO_CHECKPOINT_MAX_THREADS``, are
+  evicted.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    SerializerProtocol,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DB = os.getenv("SHLOMO_CHECKPOINT_DB", "")
+CHECKPOINT_TTL = float(os.getenv("SHLOMO_CHECKPOINT_TTL", str(7 * 24 * 3600)))
+MAX_THREADS = int(os.getenv("SHLOMO_CHECKPOINT_MAX_THREADS", "1000"))
+MAX_CHECKPOINTS_PER_THREAD = int(os.getenv("SHLOMO_CHECKPOINT_MAX_PER_THREAD", "20"))
+MAX_THREAD_BYTES = int(os.getenv("SHLOMO_CHECKPOINT_MAX_THREAD_BYTES", str(2 * 1024 * 1024)))
+EVICT_INTERVAL = float(os.getenv("SHLOMO_CHECKPOINT_EVICT_INTERVAL", "300"))
+
+# Values smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = 512
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id TEXT,
+    checkpoint_type TEXT NOT NULL,
+    checkpoint BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS channel_values (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS channel_items (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    hash BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version, position)
+);
+CREATE INDEX IF NOT EXISTS channel_items_hash ON channel_items (hash);
+CREATE TABLE IF NOT EXISTS payloads (
+    hash BLOB PRIMARY KEY,
+    type TEXT NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT NOT NULL,
+    value BLOB NOT NULL,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver[str]):
+    """Checkpoint saver on a local SQLite file with deduplicated payloads and eviction."""
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        ttl: float = CHECKPOINT_TTL,
+        max_threads: int = MAX_THREADS,
+        max_checkpoints_per_thread: int = MAX_CHECKPOINTS_PER_THREAD,
+        max_thread_bytes: int = MAX_THREAD_BYTES,
+        evict_interval: float = EVICT_INTERVAL,
+    ) -> None:
+        super().__init__(serde=serde)
+        if path != ":memory:" and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.ttl = ttl
+        self.max_threads = max_threads
+        self.max_checkpoints_per_thread = max(1, max_checkpoints_per_thread)
+        self.max_thread_bytes = max_thread_bytes
+        self.evict_interval = evict_interval
+        self._lock = threading.RLock()
+        self._last_evict = 0.0
+        # Running stored size per thread, loaded from the database on first use
+        self._sizes: Dict[str, int] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+    # Encoding
+
+    def _encode(self, value: Any) -> Tuple[str, bytes]:
+        type_, data = self.serde.dumps_typed(value)
+        if len(data) >= COMPRESS_MIN_BYTES:
+            compressed = zlib.compress(data)
+            if len(compressed) < len(data):
+                return f"z:{type_}", compressed
+        return type_, data
+
+    def _decode(self, type_: str, data: bytes) -> Any:
+        if type_.startswith("z:"):
+            type_, data = type_[2:], zlib.decompress(data)
+        return self.serde.loads_typed((type_, data))
+
+    # Reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the requested checkpoint, or the latest one of the thread."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        query = (
+            "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata "
+            "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        with self._lock, self._conn:
+            if checkpoint_id:
+                row = self._conn.execute(f"{query} AND checkpoint_id = ?", (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(f"{query} ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, checkpoint_ns)).fetchone()
+            if row is None:
+                return None
+            self._touch(thread_id)
+            return self._load_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """List checkpoints, newest first, optionally filtered by metadata."""
+        clauses: List[str] = []
+        params: List[Any] = []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            if config["configurable"].get("checkpoint_ns") is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(config["configurable"]["checkpoint_ns"])
+            if checkpoint_id := get_checkpoint_id(config):
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint, "
+                f"metadata_type, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC",
+                params,
+            ).fetchall()
+            results: List[CheckpointTuple] = []
+            for thread_id, checkpoint_ns, *row in rows:
+                if limit is not None and len(results) >= limit:
+                    break
+                if filter:
+                    metadata = self._decode(row[4], row[5])
+                    if not all(metadata.get(key) == value for key, value in filter.items()):
+                        continue
+                results.append(self._load_tuple(thread_id, checkpoint_ns, row))
+        yield from results
+
+    def _load_tuple(self, thread_id: str, checkpoint_ns: str, row: Sequence[Any]) -> CheckpointTuple:
+        checkpoint_id, parent_id, checkpoint_type, checkpoint_data, metadata_type, metadata_data = row
+        checkpoint = self._decode(checkpoint_type, checkpoint_data)
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config=_config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channels(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self._decode(metadata_type, metadata_data),
+            parent_config=_config(thread_id, checkpoint_ns, parent_id) if parent_id else None,
+            pending_writes=[(task_id, channel, self._decode(type_, value)) for task_id, channel, type_, value in writes],
+        )
+
+    def _load_channels(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        values: Dict[str, Any] = {}
+        for channel, version in versions.items():
+            row = self._conn.execute(
+                "SELECT kind FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                (thread_id, checkpoint_ns, channel, str(version)),
+            ).fetchone()
+            if row is None or row[0] == "empty":
+                continue
+            items = [
+                self._decode(type_, data)
+                for type_, data in self._conn.execute(
+                    "SELECT p.type, p.data FROM channel_items i JOIN payloads p ON p.hash = i.hash "
+                    "WHERE i.thread_id = ? AND i.checkpoint_ns = ? AND i.channel = ? AND i.version = ? ORDER BY i.position",
+                    (thread_id, checkpoint_ns, channel, str(version)),
+                )
+            ]
+            values[channel] = items if row[0] == "list" else items[0]
+        return values
+
+    # Writes
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Store a checkpoint and its new channel versions, then enforce the storage bounds."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        stored = checkpoint.copy()
+        values: Dict[str, Any] = stored.pop("channel_values")  # type: ignore[misc]
+
+        checkpoint_type, checkpoint_data = self._encode(stored)
+        metadata_type, metadata_data = self._encode(get_checkpoint_metadata(config, metadata))
+        with self._lock, self._counted(thread_id), self._conn:
+            added = sum(
+                self._put_channel(thread_id, checkpoint_ns, channel, str(version), values, channel in values)
+                for channel, version in new_versions.items()
+            )
+            replaced = self._conn.execute(
+                "SELECT length(checkpoint) + length(metadata) FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                (thread_id, checkpoint_ns, checkpoint["id"]),
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id, checkpoint_type, checkpoint_data, metadata_type, metadata_data),
+            )
+            self._grow(thread_id, added + len(checkpoint_data) + len(metadata_data) - (replaced[0] if replaced else 0))
+            self._touch(thread_id)
+            if self._over_bounds(thread_id):
+                self._prune_thread(thread_id, checkpoint_ns, checkpoint["id"])
+        self._maybe_evict()
+        return _config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def _put_channel(
+        self, thread_id: str, checkpoint_ns: str, channel: str, version: str, values: Dict[str, Any], present: bool
+    ) -> int:
+        """Store one channel version and return the payload bytes it adds to the thread."""
+        value = values.get(channel)
+        if not present:
+            kind, items = "empty", []
+        elif type(value) is list:
+            kind, items = "list", value
+        else:
+            kind, items = "value", [value]
+        key = (thread_id, checkpoint_ns, channel, version)
+        self._conn.execute("INSERT OR REPLACE INTO channel_values VALUES (?, ?, ?, ?, ?)", (*key, kind))
+        rewritten = self._conn.execute(
+            "DELETE FROM channel_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?", key
+        ).rowcount
+        if rewritten:
+            # Rewriting a version may release payloads; recount the thread on next use
+            self._sizes.pop(thread_id, None)
+        added = 0
+        for position, item in enumerate(items):
+            type_, data = self._encode(item)
+            digest = hashlib.blake2b(type_.encode() + b"\0" + data, digest_size=16).digest()
+            # A payload counts once per thread, however many of its items use it
+            if not self._conn.execute(
+                "SELECT 1 FROM channel_items WHERE hash = ? AND thread_id = ? LIMIT 1", (digest, thread_id)
+            ).fetchone():
+                added += len(data)
+            self._conn.execute("INSERT OR IGNORE INTO payloads VALUES (?, ?, ?)", (digest, type_, data))
+            self._conn.execute("INSERT INTO channel_items VALUES (?, ?, ?, ?, ?, ?)", (*key, position, digest))
+        return added
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Store the pending writes of a task for a checkpoint."""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = [
+            (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, *self._encode(value), task_path)
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock, self._counted(thread_id), self._conn:
+            missing, newest = self._conn.execute(
+                "SELECT NOT EXISTS (SELECT 1 FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?), "
+                "(SELECT checkpoint_ns || char(0) || checkpoint_id FROM checkpoints WHERE thread_id = ? AND checkpoint_id > ? "
+                "ORDER BY checkpoint_id DESC LIMIT 1)",
+                (thread_id, checkpoint_ns, checkpoint_id, thread_id, checkpoint_id),
+            ).fetchone()
+            # Writes that arrive after their checkpoint was pruned would never be read again
+            if missing and newest is not None:
+                logger.debug(
+                    "Dropped %d writes of task %s for pruned checkpoint %s of thread %s",
+                    len(rows), task_id, checkpoint_id, thread_id,
+                )
+                return
+            # Special writes (errors, interrupts) replace earlier ones; regular writes are kept once
+            added = 0
+            for row in rows:
+                if row[4] < 0:
+                    replaced = self._conn.execute(
+                        "SELECT length(value) FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                        "AND checkpoint_id = ? AND task_id = ? AND idx = ?",
+                        row[:5],
+                    ).fetchone()
+                    self._conn.execute("INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                    added += len(row[7]) - (replaced[0] if replaced else 0)
+                elif self._conn.execute("INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", row).rowcount:
+                    added += len(row[7])
+            self._grow(thread_id, added)
+            # Late writes for an older checkpoint land after the last prune, so check the bounds again
+            if newest is not None and self._over_bounds(thread_id):
+                self._prune_thread(thread_id, *newest.split("\0", 1))
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint, write and unshared payload of a thread."""
+        with self._lock, self._conn:
+            self._delete_thread(thread_id)
+
+    # Bounds and eviction
+
+    def _touch(self, thread_id: str) -> None:
+        self._conn.execute("INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, time.time()))
+
+    def thread_bytes(self, thread_id: str) -> int:
+        """Return the stored bytes of a thread, counting shared payloads in full."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT "
+                "(SELECT COALESCE(SUM(length(checkpoint) + length(metadata)), 0) FROM checkpoints WHERE thread_id = :t) + "
+                "(SELECT COALESCE(SUM(length(value)), 0) FROM writes WHERE thread_id = :t) + "
+                "(SELECT COALESCE(SUM(length(data)), 0) FROM payloads "
+                " WHERE hash IN (SELECT hash FROM channel_items WHERE thread_id = :t))",
+                {"t": thread_id},
+            ).fetchone()[0]
+
+    @contextmanager
+    def _counted(self, thread_id: str) -> Iterator[None]:
+        try:
+            yield
+        except BaseException:
+            # The transaction rolled back, so the running size may no longer match
+            self._sizes.pop(thread_id, None)
+            raise
+
+    def _size(self, thread_id: str) -> int:
+        size = self._sizes.get(thread_id)
+        if size is None:
+            size = self._sizes[thread_id] = self.thread_bytes(thread_id)
+        return size
+
+    def _grow(self, thread_id: str, delta: int) -> None:
+        # Threads not loaded yet are counted from the database when first needed
+        if thread_id in self._sizes:
+            self._sizes[thread_id] += delta
+
+    def _over_bounds(self, thread_id: str) -> bool:
+        count = self._conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = ?", (thread_id,)).fetchone()[0]
+        return count > self.max_checkpoints_per_thread or self._size(thread_id) > self.max_thread_bytes
+
+    def _prune_thread(self, thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> None:
+        rows = [
+            (row[0], row[1])
+            for row in self._conn.execute(
+                "SELECT checkpoint_ns, checkpoint_id FROM checkpoints WHERE thread_id = ? ORDER BY checkpoint_id DESC",
+                (thread_id,),
+            )
+        ]
+        # The checkpoint just written and the latest root checkpoint are always kept, whatever their size
+        protected = {(checkpoint_ns, checkpoint_id), *[row for row in rows if row[0] == ""][:1]}
+        candidates = [row for row in rows if row not in protected]
+        room = max(0, self.max_checkpoints_per_thread - len(protected))
+        drop, keep = candidates[room:], candidates[:room]
+        if drop:
+            self._grow(thread_id, -self._delete_checkpoints(thread_id, drop))
+        # Writes stored for checkpoints that were pruned before the writes arrived
+        orphans = (
+            "FROM writes WHERE thread_id = :t "
+            "AND checkpoint_id < (SELECT MIN(checkpoint_id) FROM checkpoints WHERE thread_id = :t) "
+            "AND NOT EXISTS (SELECT 1 FROM checkpoints c WHERE c.thread_id = :t "
+            "AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+        )
+        self._grow(thread_id, -self._conn.execute(f"SELECT COALESCE(SUM(length(value)), 0) {orphans}", {"t": thread_id}).fetchone()[0])
+        self._conn.execute(f"DELETE {orphans}", {"t": thread_id})
+        while keep and self._size(thread_id) > self.max_thread_bytes:
+            self._grow(thread_id, -self._delete_checkpoints(thread_id, [keep.pop()]))
+
+    def _delete_checkpoints(self, thread_id: str, checkpoints: Sequence[Tuple[str, str]]) -> int:
+        """Delete (namespace, checkpoint ID) pairs of a thread and return the bytes freed for it."""
+        freed = 0
+        hashes: Set[bytes] = set()
+        for checkpoint_ns in {ns for ns, _ in checkpoints}:
+            key = (thread_id, checkpoint_ns)
+            params = [(*key, checkpoint_id) for ns, checkpoint_id in checkpoints if ns == checkpoint_ns]
+            for table, size in (("checkpoints", "length(checkpoint) + length(metadata)"), ("writes", "length(value)")):
+                for param in params:
+                    freed += self._conn.execute(
+                        f"SELECT COALESCE(SUM({size}), 0) FROM {table} "
+                        "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                        param,
+                    ).fetchone()[0]
+                self._conn.executemany(
+                    f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?", params
+                )
+
+            # Channel versions still referenced by the remaining checkpoints of the namespace
+            referenced: Set[Tuple[str, str]] = set()
+            for type_, data in self._conn.execute(
+                "SELECT checkpoint_type, checkpoint FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?", key
+            ).fetchall():
+                referenced.update((channel, str(version)) for channel, version in self._decode(type_, data)["channel_versions"].items())
+            stale = [
+                (channel, version)
+                for channel, version in self._conn.execute(
+                    "SELECT channel, version FROM channel_values WHERE thread_id = ? AND checkpoint_ns = ?", key
+                ).fetchall()
+                if (channel, version) not in referenced
+            ]
+            for channel, version in stale:
+                version_key = (*key, channel, version)
+                hashes.update(
+                    row[0]
+                    for row in self._conn.execute(
+                        "SELECT hash FROM channel_items WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                        version_key,
+                    )
+                )
+                for table in ("channel_values", "channel_items"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?",
+                        version_key,
+                    )
+
+        # Payloads count towards the thread while any of its channel items still uses them
+        for digest in hashes:
+            freed += self._conn.execute(
+                "SELECT COALESCE(SUM(length(data)), 0) FROM payloads WHERE hash = ? "
+                "AND NOT EXISTS (SELECT 1 FROM channel_items WHERE thread_id = ? AND hash = ?)",
+                (digest, thread_id, digest),
+            ).fetchone()[0]
+        self._collect_payloads(hashes)
+        return freed
+
+    def _delete_thread(self, thread_id: str) -> None:
+        hashes = {row[0] for row in self._conn.execute("SELECT hash FROM channel_items WHERE thread_id = ?", (thread_id,))}
+        for table in ("checkpoints", "channel_values", "channel_items", "writes", "threads"):
+            self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        self._sizes.pop(thread_id, None)
+        self._collect_payloads(hashes)
+
+    def _collect_payloads(self, hashes: Iterable[bytes]) -> None:
+        # Payloads are shared across checkpoints and threads; drop only unreferenced ones
+        self._conn.executemany(
+            "DELETE FROM payloads WHERE hash = ? AND NOT EXISTS (SELECT 1 FROM channel_items WHERE hash = ?)",
+            [(digest, digest) for digest in hashes],
+        )
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Delete idle threads past the TTL and the least recently used ones over the limit."""
+        now = time.time() if now is None else now
+        with self._lock, self._conn:
+            expired = {
+                row[0] for row in self._conn.execute("SELECT thread_id FROM threads WHERE last_access < ?", (now - self.ttl,))
+            }
+            overflow = {
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT thread_id FROM threads ORDER BY last_access DESC LIMIT -1 OFFSET ?", (self.max_threads,)
+                )
+            }
+            for thread_id in expired | overflow:
+                self._delete_thread(thread_id)
+            self._last_evict = now
+        if expired or overflow:
+            logger.info("Evicted %d checkpoint threads", len(expired | overflow))
+        return len(expired | overflow)
+
+    def _maybe_evict(self) -> None:
+        if time.time() - self._last_evict >= self.evict_interval:
+            try:
+                self.evict()
+            except sqlite3.Error:
+                logger.warning("Checkpoint eviction failed", exc_info=True)
+
+    # Async API (runs the SQLite calls off the event loop)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Async version of get_tuple."""
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        """Async version of list."""
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in results:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Async version of put."""
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Async version of put_writes."""
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Async version of delete_thread."""
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        """Return a monotonically increasing, sortable channel version."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+
+_saver: Optional[SqliteCheckpointSaver] = None
+_saver_lock = threading.Lock()
+
+
+def get_checkpointer() -> Optional[SqliteCheckpointSaver]:
+    """Return the shared checkpointer, or None when SHLOMO_CHECKPOINT_DB is not set."""
+    global _saver
+    if not CHECKPOINT_DB:
+        return None
+    with _saver_lock:
+        if _saver is None:
+            _saver = SqliteCheckpointSaver(CHECKPOINT_DB)
+        return _saver
@@ -0,0 +1,148 @@
+"""Per-turn latency budget for the assistant graphs.
+
+Every user turn gets ``SHLOMO_TURN_BUDGET`` seconds (0 disables it). The
+deadline is stored in graph state when the assistant sees a new user message,
+so it spans every assistant <-> tool_executor loop of the turn. Inside a node
+``deadline_scope`` puts it in a context variable that the LLM call, the tool
+runner and the backend HTTP layer read:
+
+- the LLM request gets the time left as its timeout, and is abandoned when
+  the deadline passes,
+- tool calls still running at the deadline are cancelled and reported as
+  timed out,
+- backend requests never wait longer than the time left.
+
+A turn also runs at most ``SHLOMO_MAX_TOOL_LOOPS`` tool rounds; after that
+the model must answer with the results it has. When the budget is used up
+the assistant replies with the tool results gathered so far instead of
+hanging.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Sequence, TypeVar
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+from agent import metrics
+from agent.history import tool_digest
+from agent.message_utils import message_text
+
+TURN_BUDGET = float(os.getenv("SHLOMO_TURN_BUDGET", "45"))
+MAX_TOOL_LOOPS = int(os.getenv("SHLOMO_MAX_TOOL_LOOPS", "4"))
+
+PARTIAL_ANSWER = "מצטער, לא הספקתי להשלים את הבדיקה בזמן."
+PARTIAL_RESULTS = "הנה מה שמצאתי עד עכשיו:"
+PARTIAL_RETRY = "אפשר לנסות שוב בעוד רגע או לצמצם את החיפוש."
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("shlomo_turn_deadline", default=None)
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("SHLOMO_LLM_WORKERS", "32")), thread_name_prefix="shlomo-llm")
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the turn's time budget runs out."""
+
+
+class TurnBudget(NamedTuple):
+    deadline: Optional[float]   # time.time() at which the turn must be answered
+    tool_loops: int             # tool rounds already run in this turn
+
+
+def turn_budget(state: Any) -> TurnBudget:
+    """Start a new budget on a new user message, else continue the turn's budget."""
+    messages = state["messages"]
+    if messages and getattr(messages[-1], "type", None) == "human":
+        return TurnBudget(time.time() + TURN_BUDGET if TURN_BUDGET > 0 else None, 0)
+    return TurnBudget(state.get("turn_deadline"), state.get("tool_loops", 0))
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """Make ``deadline`` the current turn deadline for the calls in the block."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Return the seconds left in the current turn, or None without a deadline."""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def timeout_kwargs() -> Dict[str, float]:
+    """Return ``invoke`` keyword arguments that bound a model request by the time left."""
+    left = remaining()
+    return {} if left is None else {"timeout": max(0.001, left)}
+
+
+def call_with_deadline(fn: Callable[[], T]) -> T:
+    """Run ``fn`` and stop waiting for it at the current deadline.
+
+    ``fn`` should bound its own requests with ``timeout_kwargs()`` so the
+    abandoned worker is freed at the deadline as well.
+    """
+    left = remaining()
+    if left is None:
+        return fn()
+    if left <= 0:
+        raise DeadlineExceeded("turn time budget exhausted")
+    # Copy the context so callbacks and the deadline follow the call into the worker
+    future = _executor.submit(contextvars.copy_context().run, fn)
+    try:
+        return future.result(timeout=left)
+    except FutureTimeoutError:
+        future.cancel()
+        raise DeadlineExceeded("turn time budget exhausted") from None
+
+
+def partial_answer(history: Sequence[Any]) -> AIMessage:
+    """Build a reply from the tool results of the current turn."""
+    results = []
+    for message in reversed(history):
+        if getattr(message, "type", None) == "human":
+            break
+        if isinstance(message, ToolMessage) and not message_text(message).startswith("Error:"):
+            results.append(message_text(tool_digest(message)))
+    if not results:
+        return AIMessage(content=f"{PARTIAL_ANSWER} {PARTIAL_RETRY}")
+    return AIMessage(content="\n\n".join([f"{PARTIAL_ANSWER} {PARTIAL_RESULTS}", *reversed(results), PARTIAL_RETRY]))
+
+
+def answer_within_budget(
+    node: str,
+    budget: TurnBudget,
+    history: Sequence[Any],
+    with_tools: Callable[[], Any],
+    without_tools: Callable[[], Any],
+) -> Any:
+    """Run an assistant's LLM call within the turn budget.
+
+    After ``MAX_TOOL_LOOPS`` tool rounds the model is called with tool use
+    disabled; when the deadline passes, or the model still asks for tools,
+    the reply is a partial answer built from the turn's tool results.
+    """
+    exhausted = budget.tool_loops >= MAX_TOOL_LOOPS
+    with deadline_scope(budget.deadline):
+        try:
+            response = call_with_deadline(without_tools if exhausted else with_tools)
+        except DeadlineExceeded:
+            metrics.inc("turn_budget_exhausted_total", node=node, reason="deadline")
+            return partial_answer(history)
+    if exhausted:
+        metrics.inc("turn_budget_exhausted_total", node=node, reason="tool_loops")
+        if getattr(response, "tool_calls", None):
+            return partial_answer(history)
+    return response
@@ -0,0 +1,185 @@
+"""Token-budgeted conversation history for the assistant nodes.
+
+Each LLM call gets at most a configured number of history tokens:
+
+- the most recent turns are sent verbatim,
+- tool results from earlier turns inside that window are replaced by short
+  digests; structured results keep their identifiers (result_id,
+  next_cursor, totals, branch IDs and names) so later turns can still page
+  through them or copy them into other tools,
+- everything older is folded into a rolling summary kept in state, which is
+  extended incrementally with only the messages that just left the window.
+"""
+
+from __future__ import annotations
+
+import ast
+import os
+from typing import Any, Dict, List, NamedTuple, Sequence
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.message_utils import message_text
+
+# History token budget per assistant node
+HISTORY_TOKEN_BUDGETS: Dict[str, int] = {
+    "rental_assistant": int(os.getenv("SHLOMO_HISTORY_TOKENS_RENTAL", "6000")),
+    "sales_assistant": int(os.getenv("SHLOMO_HISTORY_TOKENS_SALES", "8000")),
+}
+
+# Rough tokens estimate: Hebrew averages fewer characters per token than English
+CHARS_PER_TOKEN = 3.0
+TOOL_DIGEST_CHARS = int(os.getenv("SHLOMO_TOOL_DIGEST_CHARS", "300"))
+# Structured tool results up to this size are kept whole
+TOOL_DIGEST_STRUCTURED_CHARS = int(os.getenv("SHLOMO_TOOL_DIGEST_STRUCTURED_CHARS", "1000"))
+# Records kept per list in the digest of a larger structured result
+TOOL_DIGEST_ITEMS = int(os.getenv("SHLOMO_TOOL_DIGEST_ITEMS", "10"))
+
+# Fields of a structured tool result that later turns need verbatim
+DIGEST_FIELDS = (
+    "result_id", "next_cursor", "total", "total_matches", "total_branches", "car_groups",
+    "searches", "service_type", "query", "error",
+)
+# Fields kept for every record in a digested list
+DIGEST_ITEM_FIELDS = (
+    "id", "groupCode", "groupTypeHe", "amountIncDiscountIncVat", "statusHe",
+    "pickupBranch", "returnBranch", "fromDate", "toDate",
+    "pickupBranchName", "pickupBranchNameEn", "branchCode", "branchName", "branchNameEn",
+    "name", "model", "manufacturer", "price", "monthly_payment",
+)
+SUMMARY_LINE_CHARS = 200
+SUMMARY_MAX_CHARS = int(os.getenv("SHLOMO_SUMMARY_MAX_CHARS", "4000"))
+
+
+class HistoryWindow(NamedTuple):
+    messages: List[Any]
+    summary: str
+    summarized_count: int
+
+
+def estimate_tokens(message: Any) -> int:
+    """Estimate the prompt tokens of a message without a tokenizer."""
+    tokens = len(message_text(message)) / CHARS_PER_TOKEN
+    tool_calls = getattr(message, "tool_calls", None) or []
+    tokens += sum(len(str(call.get("args", ""))) / CHARS_PER_TOKEN + 10 for call in tool_calls)
+    return int(tokens) + 4
+
+
+def _digest_records(records: List[Any]) -> List[Any]:
+    return [
+        {field: record[field] for field in DIGEST_ITEM_FIELDS if field in record} if isinstance(record, dict) else record
+        for record in records[:TOOL_DIGEST_ITEMS]
+    ]
+
+
+def _structured_digest(value: Any) -> Any:
+    """Keep the identifiers and the first records of a dict or list tool result."""
+    if isinstance(value, list):
+        digest: Any = _digest_records(value)
+        if len(value) > TOOL_DIGEST_ITEMS:
+            digest = {"items": digest, "omitted": len(value) - TOOL_DIGEST_ITEMS}
+        return digest
+    digest = {}
+    for key, item in value.items():
+        if key in DIGEST_FIELDS:
+            digest[key] = item
+        elif isinstance(item, list):
+            digest[key] = _digest_records(item)
+            if len(item) > TOOL_DIGEST_ITEMS:
+                digest[f"{key}_omitted"] = len(item) - TOOL_DIGEST_ITEMS
+        elif isinstance(item, dict):
+            digest[key] = _structured_digest(item)
+        elif len(str(item)) <= 80:
+            digest[key] = item
+    return digest
+
+
+def tool_digest(message: ToolMessage, limit: int = TOOL_DIGEST_CHARS) -> ToolMessage:
+    """Replace a tool result with a digest, keeping its tool_call_id."""
+    text = message_text(message)
+    if len(text) <= limit:
+        return message
+    # Dict and list results reach the ToolMessage as their repr
+    try:
+        value = ast.literal_eval(text) if text[:1] in "{[" else None
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        value = None
+    if isinstance(value, (dict, list)):
+        if len(text) <= TOOL_DIGEST_STRUCTURED_CHARS:
+            return message
+        digest = f"{_structured_digest(value)} [earlier tool result digested from {len(text)} chars - call the tool again for the full result]"
+    else:
+        digest = f"{text[:limit]}… [earlier tool result truncated, {len(text)} chars - call the tool again if needed]"
+    return ToolMessage(content=digest, tool_call_id=message.tool_call_id, id=message.id)
+
+
+def _summary_line(message: Any) -> str:
+    text = " ".join(message_text(message).split())[:SUMMARY_LINE_CHARS]
+    if isinstance(message, HumanMessage):
+        return f"User: {text}"
+    if isinstance(message, AIMessage):
+        calls = ", ".join(call["name"] for call in message.tool_calls or [])
+        if calls:
+            return f"Assistant called: {calls}" + (f" - {text}" if text else "")
+        return f"Assistant: {text}" if text else ""
+    if isinstance(message, ToolMessage):
+        return f"Tool result: {text[:SUMMARY_LINE_CHARS // 2]}"
+    return ""
+
+
+def extend_summary(summary: str, messages: Sequence[Any]) -> str:
+    """Append the given messages to the rolling summary, keeping it bounded."""
+    lines = [line for line in (summary.splitlines() if summary else []) if line]
+    lines += [line for line in (_summary_line(m) for m in messages) if line]
+    while lines and sum(len(line) + 1 for line in lines) > SUMMARY_MAX_CHARS:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+def window_history(
+    messages: Sequence[Any],
+    budget: int,
+    summary: str = "",
+    summarized_count: int = 0,
+) -> HistoryWindow:
+    """Fit the conversation into ``budget`` tokens.
+
+    The window always starts at a user message so tool results are never
+    separated from the AIMessage that requested them, and the latest turn is
+    always kept whole. Returns the messages to send (with the summary as a
+    leading system message when there is one), the updated summary and the
+    number of messages it covers.
+    """
+    turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    last_turn = turn_starts[-1] if turn_starts else 0
+
+    # Grow the window backwards one whole turn at a time while it fits
+    cut = last_turn
+    used = sum(estimate_tokens(m) for m in messages[last_turn:])
+    summary_tokens = len(summary) / CHARS_PER_TOKEN
+    for start in reversed(turn_starts[:-1]):
+        if start < summarized_count:
+            break
+        turn_tokens = sum(
+            estimate_tokens(tool_digest(m) if isinstance(m, ToolMessage) else m)
+            for m in messages[start:cut]
+        )
+        if used + turn_tokens + summary_tokens > budget:
+            break
+        used += turn_tokens
+        cut = start
+    cut = max(cut, min(summarized_count, last_turn))
+
+    # Only the messages that just left the window are added to the summary
+    if cut > summarized_count:
+        summary = extend_summary(summary, messages[summarized_count:cut])
+        summarized_count = cut
+
+    window: List[Any] = []
+    if summary:
+        window.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+    window += [
+        tool_digest(m) if isinstance(m, ToolMessage) and i < last_turn else m
+        for i, m in enumerate(messages[cut:], start=cut)
+    ]
+    return HistoryWindow(window, summary, summarized_count)
@@ -0,0 +1,129 @@
+"""Shared pooled HTTP clients for the Shlomo SIXT backends.
+
+Every tool goes through one long-lived ``httpx.Client`` per backend host so
+TCP/TLS connections are kept alive and reused between tool calls instead of
+being re-established on every request.
+
+The backend hosts are read when the module is imported, after the ``agent``
+package has loaded ``.env``. Pool limits, timeouts and the HTTP/2 switch are
+read each time a client is built, so they follow the environment at first
+use rather than at import.
+"""
+
+from __future__ import annotations
+
+import atexit
+import importlib.util
+import os
+import threading
+from typing import Dict
+
+import httpx
+
+# Backend hosts; agent/__init__.py loads .env before any submodule is imported
+RENT_BASE_URL = os.getenv("SHLOMO_BASE_URL", "https://backend-prod.shlomo.co.il")
+SALES_BASE_URL = os.getenv("SHLOMO_SALES_BASE_URL", "https://sales-backend-prod.shlomo.co.il")
+LEASING_BASE_URL = os.getenv("SHLOMO_LEASING_BASE_URL", "https://shlomo-leasing-backend-prod.shlomo.co.il")
+
+# Headers the rental backend expects from the website - built once
+RENT_HEADERS = {
+    "Content-Type": "application/json",
+    "Accept": "application/json",
+    "Origin": "https://www.shlomo.co.il",
+    "Referer": "https://www.shlomo.co.il/",
+    "clientdetails": '{"urlPath":"/israel/search-results","clientIP":"127.0.0.1"}',
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    "X-Requested-With": "XMLHttpRequest",
+}
+
+SALES_HEADERS = {
+    "Accept": "application/json",
+}
+
+HOST_HEADERS = {
+    RENT_BASE_URL: RENT_HEADERS,
+    SALES_BASE_URL: SALES_HEADERS,
+    LEASING_BASE_URL: SALES_HEADERS,
+}
+
+_clients: Dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+
+
+def _module_available(name: str) -> bool:
+    return importlib.util.find_spec(name) is not None
+
+
+def http2_available() -> bool:
+    """Return True if HTTP/2 is enabled and the `h2` package is installed."""
+    # HTTP/2 is only used when the optional `h2` package is installed
+    return os.getenv("SHLOMO_HTTP2", "true").lower() == "true" and _module_available("h2")
+
+
+def accept_encoding() -> str:
+    """Build the Accept-Encoding header from the decoders httpx can use."""
+    encodings = ["gzip", "deflate"]
+    if _module_available("brotli") or _module_available("brotlicffi"):
+        encodings.append("br")
+    if _module_available("zstandard"):
+        encodings.append("zstd")
+    return ", ".join(encodings)
+
+
+def build_client(base_url: str, transport: httpx.BaseTransport | None = None) -> httpx.Client:
+    """Create a keep-alive client for one backend host."""
+    headers = {"Accept-Encoding": accept_encoding()}
+    headers.update(HOST_HEADERS.get(base_url, SALES_HEADERS))
+
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers,
+        http2=http2_available() and transport is None,
+        # Pool limits and timeouts
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("SHLOMO_HTTP_MAX_CONNECTIONS", "20")),
+            max_keepalive_connections=int(os.getenv("SHLOMO_HTTP_MAX_KEEPALIVE", "10")),
+            keepalive_expiry=float(os.getenv("SHLOMO_HTTP_KEEPALIVE_EXPIRY", "60")),
+        ),
+        timeout=httpx.Timeout(
+            float(os.getenv("SHLOMO_HTTP_TIMEOUT", "30")),
+            connect=float(os.getenv("SHLOMO_HTTP_CONNECT_TIMEOUT", "5")),
+            pool=float(os.getenv("SHLOMO_HTTP_POOL_TIMEOUT", "5")),
+        ),
+        transport=transport,
+    )
+
+
+def get_client(base_url: str) -> httpx.Client:
+    """Return the shared client for a backend host, creating it on first use."""
+    client = _clients.get(base_url)
+    if client is not None:
+        return client
+
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None:
+            client = build_client(base_url)
+            _clients[base_url] = client
+        return client
+
+
+def set_client(base_url: str, client: httpx.Client) -> None:
+    """Replace the shared client for a host (used by tests and stand-in backends)."""
+    with _clients_lock:
+        previous = _clients.get(base_url)
+        _clients[base_url] = client
+    if previous is not None and previous is not client:
+        previous.close()
+
+
+def close_clients() -> None:
+    """Close all shared clients and their pooled connections."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_clients)
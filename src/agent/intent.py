@@ -0,0 +1,160 @@
+"""Rule-based rental/sales intent classification for the master router.
+
+All Hebrew and English keywords are compiled into one regular expression.
+Hebrew one-letter prefixes (ו/ב/ל/ה/מ/ש/כ) are accepted in front of every
+keyword, so "להשכיר", "בליסינג" and "ההשכרה" match without listing every
+inflection. Time words such as "שבוע" or "חודש" are weak evidence: they also
+come up in sales talk ("תשלום לחודש"), so they count for little next to a
+strong keyword of the other service. Scores are accumulated only from messages the router has not seen
+yet, and a decided intent sticks until a new message clearly points to the
+other service.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, Optional, Sequence, Set, Tuple
+
+from langchain_core.messages import HumanMessage
+
+from agent.message_utils import message_text
+
+RENTAL = "rental"
+SALES = "sales"
+UNKNOWN = "unknown"
+
+# Minimum confidence for the router to commit to a service
+INTENT_MIN_CONFIDENCE = float(os.getenv("SHLOMO_INTENT_MIN_CONFIDENCE", "0.5"))
+
+# keyword -> weight, keywords are written without Hebrew prefixes
+RENTAL_KEYWORDS = {
+    "השכרה": 2.0, "השכרת": 2.0, "השכיר": 2.0, "השכר": 1.5, "שכור": 2.0, "לשכור": 2.0,
+    "rental": 2.0, "rent": 2.0, "renting": 2.0, "hire": 1.5,
+    "תקופה": 0.5, "כמה ימים": 1.0, "שבוע": 1.0, "סוף שבוע": 1.0, "חודש": 0.5,
+    "זמני": 1.0, "קצר טווח": 1.5, "טווח קצר": 1.5, "חופשה": 1.0,
+}
+# Keywords that only hint at a service; scaled by WEAK_KEYWORD_FACTOR when a
+# keyword of the other service appears in the same message
+WEAK_KEYWORDS = {"תקופה", "שבוע", "חודש", "כמה ימים"}
+WEAK_KEYWORD_FACTOR = 0.25
+SALES_KEYWORDS = {
+    "קנות": 2.0, "קניה": 2.0, "קנייה": 2.0, "קונה": 1.5, "מכירה": 1.5, "רכישה": 2.0, "רכוש": 2.0,
+    "purchase": 2.0, "buy": 2.0, "buying": 2.0, "sale": 1.5, "lease": 2.0, "leasing": 2.0,
+    "יד ראשונה": 2.0, "זירו": 2.0, "זירו קמ": 2.0, "אפס קמ": 2.0, "ליסינג": 2.0, "מימון": 1.5,
+    "תשלומים": 1.0, "בעלות": 1.5, "קבע": 1.0, "ארוך טווח": 1.5, "טווח ארוך": 1.5, "רכב חדש": 1.5,
+}
+
+CLARIFICATION_MESSAGE = """שלום וברוכים הבאים לשלמה SIXT! 😊
+
+כדי שאוכל לעזור בצורה הטובה ביותר, ספרו לי במה אתם מתעניינים:
+
+1. 🚗 השכרת רכב - לתקופות קצרות (ימים/שבועות), למשל לחופשה או לנסיעה
+2. 💰 קניית/ליסינג רכב - לבעלות ארוכת טווח: רכבים יד ראשונה, זירו ק"מ או ליסינג
+
+בהשכרה משלמים רק על הימים שבהם משתמשים ברכב, ובקנייה או בליסינג הרכב נשאר אצלכם לטווח ארוך.
+במה אוכל לעזור?"""
+
+_HEBREW_LETTERS = "א-ת"
+_PREFIXES = "ובלהמשכ"
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, drop niqqud and quote marks and collapse whitespace."""
+    text = re.sub("[\u0591-\u05C7]", "", text.lower())
+    text = re.sub("[\"'`׳״]", "", text)
+    return " ".join(text.split())
+
+
+def _compile(keywords: Dict[str, Tuple[str, float]]) -> "re.Pattern[str]":
+    alternatives = []
+    for group, (keyword, _) in sorted(keywords.items(), key=lambda item: len(item[1][0]), reverse=True):
+        prefix = f"[{_PREFIXES}]{{0,2}}-?" if re.match(f"[{_HEBREW_LETTERS}]", keyword) else ""
+        alternatives.append(f"(?P<{group}>{prefix}{re.escape(keyword)})")
+    return re.compile(
+        f"(?<![{_HEBREW_LETTERS}a-z])(?:{'|'.join(alternatives)})(?![{_HEBREW_LETTERS}a-z])"
+    )
+
+
+# group name -> (normalized keyword, weight) and group name -> intent
+_KEYWORDS: Dict[str, Tuple[str, float]] = {}
+_GROUP_INTENT: Dict[str, str] = {}
+_WEAK_GROUPS: Set[str] = set()
+for _intent, _table in ((RENTAL, RENTAL_KEYWORDS), (SALES, SALES_KEYWORDS)):
+    for _index, (_keyword, _weight) in enumerate(_table.items()):
+        _group = f"{_intent}_{_index}"
+        _KEYWORDS[_group] = (normalize_text(_keyword), _weight)
+        _GROUP_INTENT[_group] = _intent
+        if _keyword in WEAK_KEYWORDS:
+            _WEAK_GROUPS.add(_group)
+
+_MATCHER = _compile(_KEYWORDS)
+
+
+def score_text(text: str) -> Dict[str, float]:
+    """Return the rental and sales keyword scores of a text."""
+    groups = [match.lastgroup for match in _MATCHER.finditer(normalize_text(text)) if match.lastgroup is not None]
+    strong = {_GROUP_INTENT[group] for group in groups if group not in _WEAK_GROUPS}
+    scores = {RENTAL: 0.0, SALES: 0.0}
+    for group in groups:
+        intent = _GROUP_INTENT[group]
+        weight = _KEYWORDS[group][1]
+        if group in _WEAK_GROUPS and strong - {intent}:
+            weight *= WEAK_KEYWORD_FACTOR
+        scores[intent] += weight
+    return scores
+
+
+def classify_scores(scores: Dict[str, float]) -> Tuple[str, float]:
+    """Turn keyword scores into an intent and a confidence between 0 and 1."""
+    rental, sales = scores.get(RENTAL, 0.0), scores.get(SALES, 0.0)
+    total = rental + sales
+    if total == 0:
+        return UNKNOWN, 0.0
+
+    # Confidence grows with the margin between the services and with evidence
+    margin = abs(rental - sales) / total
+    evidence = min(1.0, max(rental, sales) / 2.0)
+    confidence = round(margin * evidence, 3)
+
+    if confidence < INTENT_MIN_CONFIDENCE:
+        return UNKNOWN, confidence
+    return (RENTAL if rental > sales else SALES), confidence
+
+
+def update_intent(
+    messages: Sequence[Any],
+    intent: Optional[str] = None,
+    scores: Optional[Dict[str, float]] = None,
+    processed: int = 0,
+) -> Dict[str, Any]:
+    """Classify the user messages added since ``processed``.
+
+    Returns the state update: ``intent``, ``intent_confidence``,
+    ``intent_scores`` and ``intent_processed``.
+    """
+    intent = intent or UNKNOWN
+    scores = dict(scores or {RENTAL: 0.0, SALES: 0.0})
+    confidence = classify_scores(scores)[1]
+
+    for message in messages[processed:]:
+        if not isinstance(message, HumanMessage):
+            continue
+        message_scores = score_text(message_text(message))
+        message_intent, message_confidence = classify_scores(message_scores)
+
+        if intent != UNKNOWN:
+            # Sticky: only a confident switch to the other service changes intent
+            if message_intent not in (UNKNOWN, intent):
+                intent, confidence, scores = message_intent, message_confidence, message_scores
+            continue
+
+        scores = {key: scores.get(key, 0.0) + value for key, value in message_scores.items()}
+        intent, confidence = classify_scores(scores)
+
+    return {
+        "intent": intent,
+        "intent_confidence": confidence,
+        "intent_scores": scores,
+        "intent_processed": len(messages),
+    }
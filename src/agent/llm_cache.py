@@ -0,0 +1,232 @@
+"""Response cache in front of the shared chat model.
+
+Popular openers ("אני רוצה לשכור רכב") reach the assistants with
+byte-identical system prompts and histories. The cache keys each call on the
+model, its parameters, the bound tools and the normalized messages (message
+ids, response metadata and tool-call ids removed, whitespace collapsed), so
+those turns are answered without an LLM round trip.
+
+Entries live in an in-memory LRU and, when ``SHLOMO_LLM_CACHE_DB`` is set, in
+a SQLite file shared across restarts. Responses that call tools are only
+cached when the model runs at or below ``SHLOMO_LLM_CACHE_TOOL_TEMPERATURE``.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from langchain_core.outputs import ChatGeneration, Generation
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("SHLOMO_LLM_CACHE", "true").lower() == "true"
+LLM_CACHE_SIZE = int(os.getenv("SHLOMO_LLM_CACHE_SIZE", "512"))
+LLM_CACHE_TTL = float(os.getenv("SHLOMO_LLM_CACHE_TTL", "3600"))
+LLM_CACHE_DB = os.getenv("SHLOMO_LLM_CACHE_DB", "")
+LLM_CACHE_DISK_SIZE = int(os.getenv("SHLOMO_LLM_CACHE_DISK_SIZE", "10000"))
+# Tool-call responses are cached only for (near) deterministic sampling
+TOOL_CALL_MAX_TEMPERATURE = float(os.getenv("SHLOMO_LLM_CACHE_TOOL_TEMPERATURE", "0.1"))
+
+# Per-call fields that differ between otherwise identical messages
+_VOLATILE_FIELDS = ("id", "response_metadata", "usage_metadata")
+_TIMEOUT_PARAM = re.compile(r", \('timeout', [^)]*\)")
+
+
+def _normalize_prompt(prompt: str) -> str:
+    try:
+        messages = json.loads(prompt)
+    except ValueError:
+        return prompt
+    if not isinstance(messages, list):
+        return prompt
+
+    call_ids: Dict[str, str] = {}
+
+    def call_id(value: Any) -> Any:
+        if not isinstance(value, str):
+            return value
+        return call_ids.setdefault(value, f"call_{len(call_ids)}")
+
+    for message in messages:
+        kwargs = message.get("kwargs") if isinstance(message, dict) else None
+        if not isinstance(kwargs, dict):
+            continue
+        for field in _VOLATILE_FIELDS:
+            kwargs.pop(field, None)
+        if isinstance(kwargs.get("content"), str):
+            kwargs["content"] = " ".join(kwargs["content"].split())
+        for call in kwargs.get("tool_calls") or []:
+            call["id"] = call_id(call.get("id"))
+        for call in (kwargs.get("additional_kwargs") or {}).get("tool_calls") or []:
+            call["id"] = call_id(call.get("id"))
+        if "tool_call_id" in kwargs:
+            kwargs["tool_call_id"] = call_id(kwargs["tool_call_id"])
+    return json.dumps(messages, sort_keys=True, ensure_ascii=False)
+
+
+def _temperature(llm_string: str) -> Optional[float]:
+    match = re.search(r'"temperature":\s*([\d.]+)', llm_string.split("---", 1)[0])
+    return float(match.group(1)) if match else None
+
+
+def _has_tool_calls(generations: Sequence[Generation]) -> bool:
+    return any(getattr(getattr(g, "message", None), "tool_calls", None) for g in generations)
+
+
+def _dump(generations: Sequence[Generation]) -> str:
+    return json.dumps([
+        {"message": messages_to_dict([g.message])[0], "generation_info": g.generation_info}
+        for g in generations
+        if isinstance(g, ChatGeneration)
+    ], ensure_ascii=False)
+
+
+def _load(value: str) -> List[Generation]:
+    return [
+        ChatGeneration(message=messages_from_dict([item["message"]])[0], generation_info=item["generation_info"])
+        for item in json.loads(value)
+    ]
+
+
+class ResponseCache(BaseCache):
+    """LRU + optional SQLite cache of chat model responses with TTLs and counters."""
+
+    def __init__(
+        self,
+        max_entries: int = LLM_CACHE_SIZE,
+        ttl: float = LLM_CACHE_TTL,
+        path: str = LLM_CACHE_DB,
+        max_disk_entries: int = LLM_CACHE_DISK_SIZE,
+        tool_call_max_temperature: float = TOOL_CALL_MAX_TEMPERATURE,
+    ) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.tool_call_max_temperature = tool_call_max_temperature
+        self.stats: Dict[str, int] = {"hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "skipped": 0, "expired": 0}
+        self._entries: "OrderedDict[str, Tuple[float, List[Generation]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            with self._conn:
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL)"
+                )
+                self._conn.execute("DELETE FROM llm_cache WHERE stored_at < ?", (time.time() - ttl,))
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        """Return the cache key of a normalized prompt and model configuration."""
+        # The per-call timeout derived from the turn deadline does not change the answer
+        llm_string = _TIMEOUT_PARAM.sub("", llm_string)
+        return hashlib.sha256(f"{_normalize_prompt(prompt)}\0{llm_string}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        """Return the cached generations for the prompt, or None on a miss."""
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry[0] > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return list(entry[1])
+
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, stored_at FROM llm_cache WHERE key = ? AND stored_at >= ?", (key, now - self.ttl)
+                ).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            generations = _load(row[0])
+            self._remember(key, row[1], generations)
+            self.stats["disk_hits"] += 1
+            return list(generations)
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        """Store the generations, unless they call tools at a non-deterministic temperature."""
+        if _has_tool_calls(return_val):
+            temperature = _temperature(llm_string)
+            if temperature is None or temperature > self.tool_call_max_temperature:
+                with self._lock:
+                    self.stats["skipped"] += 1
+                return
+        # Cached messages get a fresh id on every hit
+        generations = [
+            g.model_copy(update={"message": g.message.model_copy(update={"id": None})}) if isinstance(g, ChatGeneration) else g
+            for g in return_val
+        ]
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, generations)
+            self.stats["stores"] += 1
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.execute("INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?)", (key, _dump(generations), now))
+                        self._conn.execute(
+                            "DELETE FROM llm_cache WHERE key IN "
+                            "(SELECT key FROM llm_cache ORDER BY stored_at DESC LIMIT -1 OFFSET ?)",
+                            (self.max_disk_entries,),
+                        )
+                except sqlite3.Error:
+                    logger.warning("Could not write LLM cache entry to disk", exc_info=True)
+
+    def _remember(self, key: str, stored_at: float, generations: List[Generation]) -> None:
+        self._entries[key] = (stored_at, generations)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self, **kwargs: Any) -> None:
+        """Drop every entry from memory and disk and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.stats = dict.fromkeys(self.stats, 0)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM llm_cache")
+
+    def info(self) -> Dict[str, Any]:
+        """Return the counters, hit rate and current size."""
+        with self._lock:
+            lookups = self.stats["hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["hits"] + self.stats["disk_hits"]
+            return {**self.stats, "entries": len(self._entries), "hit_rate": round(hits / lookups, 3) if lookups else 0.0}
+
+
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """Return the shared response cache, or None when SHLOMO_LLM_CACHE is off."""
+    global _cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,308 @@
+"""Concurrent-conversation load generator for the master graph.
+
+Simulated customers run scripted Hebrew conversations back to back through
+``master_agent`` (a weighted mix of rental, sales and ambiguous openers that
+go through the clarification menu first). The backends are
+``StandInBackends`` with ``--http-latency`` per request, and the model is a
+``ScriptedChatModel`` that takes ``--llm-think`` seconds per call.
+Concurrency is ramped through ``--levels``; each level runs for
+``--duration`` seconds and reports:
+
+- throughput (turns and conversations per second) and errors,
+- turn latency p50/p95/p99/max,
+- saturation: CPU utilisation, live threads and the queue depth of every
+  shared worker pool (LLM, tools, hedged HTTP, car details, prefetch),
+- resident memory, plus the retained memory of one session measured once
+  under ``tracemalloc``.
+
+The result names the highest level whose p95 stays within ``--degrade``
+times the single-customer p95. Run ``python -m agent.loadtest`` (or
+``make loadtest``).
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import itertools
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import HumanMessage
+
+from agent import registry
+from agent.benchmark import RENTAL_TURNS, SALES_TURNS, Turn, build_graph
+from agent.stand_ins import ScriptedChatModel, StandInBackends
+
+DEFAULT_LEVELS = (1, 2, 4, 8, 16, 32)
+DEFAULT_MIX = "rental=5,sales=3,ambiguous=2"
+SAMPLE_INTERVAL = 0.05
+
+CONVERSATIONS: Dict[str, List[Turn]] = {
+    "rental": RENTAL_TURNS,
+    "sales": SALES_TURNS,
+    # Two turns the router cannot place, answered by the clarification menu
+    "ambiguous": [Turn("שלום"), Turn("מה אתם מציעים?")] + SALES_TURNS,
+}
+
+
+def parse_mix(mix: str) -> List[str]:
+    """Expand ``"rental=5,sales=3"`` into a weighted, interleaved rotation of conversation names."""
+    weights = {}
+    for part in filter(None, mix.split(",")):
+        name, _, weight = part.partition("=")
+        if name not in CONVERSATIONS:
+            raise ValueError(f"Unknown conversation {name!r}, expected one of {sorted(CONVERSATIONS)}")
+        weights[name] = int(weight or 1)
+    rotation: List[str] = []
+    for round_ in range(max(weights.values(), default=0)):
+        rotation.extend(name for name, weight in weights.items() if weight > round_)
+    return rotation
+
+
+def _shared_executors() -> Dict[str, ThreadPoolExecutor]:
+    from agent import availability, car_details, deadline, resilience, tool_runner
+
+    return {
+        "llm": deadline._executor,
+        "tools": tool_runner._executor,
+        "http_hedge": resilience._executor,
+        "car_details": car_details._executor,
+        "prefetch": availability._executor,
+    }
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+
+
+class SaturationSampler:
+    """Sample CPU time, live threads and worker-pool queue depths in the background."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self.interval = interval
+        self.executors = _shared_executors()
+        self.queue_depths: Dict[str, List[int]] = {name: [] for name in self.executors}
+        self.threads: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="shlomo-load-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            for name, executor in self.executors.items():
+                self.queue_depths[name].append(executor._work_queue.qsize())
+            self.threads.append(threading.active_count())
+
+    def __enter__(self) -> "SaturationSampler":
+        self._wall, self._cpu = time.perf_counter(), time.process_time()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.wall = time.perf_counter() - self._wall
+        self.cpu = time.process_time() - self._cpu
+
+    def report(self) -> Dict[str, Any]:
+        """Return CPU utilisation, peak threads and per-pool queue depth."""
+        return {
+            "cpu_utilization": round(self.cpu / self.wall, 3) if self.wall else 0.0,
+            "max_threads": max(self.threads, default=threading.active_count()),
+            "queue_depth": {
+                name: {"max": max(depths, default=0), "mean": round(statistics.fmean(depths), 2) if depths else 0.0}
+                for name, depths in self.queue_depths.items()
+            },
+        }
+
+
+def _percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    if not latencies:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    ordered = sorted(latencies)
+
+    def at(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+
+    return {"p50": at(0.5), "p95": at(0.95), "p99": at(0.99), "max": round(ordered[-1] * 1000, 2)}
+
+
+def run_level(graph: Any, concurrency: int, duration: float, rotation: Sequence[str], level_id: str) -> Dict[str, Any]:
+    """Run ``concurrency`` customers for ``duration`` seconds and report the level."""
+    latencies: List[float] = []
+    errors: List[str] = []
+    conversations = itertools.count()
+    completed = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def customer(user: int) -> None:
+        # Every customer starts at least one conversation and always finishes the one it started
+        while True:
+            number = next(conversations)
+            name = rotation[number % len(rotation)]
+            config = {"configurable": {"thread_id": f"load-{level_id}-{user}-{number}"}}
+            for turn in CONVERSATIONS[name]:
+                start = time.perf_counter()
+                try:
+                    graph.invoke({"messages": [HumanMessage(content=turn.text)]}, config)
+                except Exception as e:
+                    with lock:
+                        errors.append(f"{name}: {e}")
+                    break
+                with lock:
+                    latencies.append(time.perf_counter() - start)
+            with lock:
+                completed[0] += 1
+            if time.perf_counter() >= deadline:
+                return
+
+    with SaturationSampler() as sampler:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="shlomo-customer") as pool:
+            for future in [pool.submit(customer, user) for user in range(concurrency)]:
+                future.result()
+
+    return {
+        "concurrency": concurrency,
+        "seconds": round(sampler.wall, 3),
+        "turns": len(latencies),
+        "conversations": completed[0],
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "turns_per_second": round(len(latencies) / sampler.wall, 2),
+        "conversations_per_second": round(completed[0] / sampler.wall, 3),
+        "latency_ms": _percentiles(latencies),
+        **sampler.report(),
+        "rss_mb": _rss_mb(),
+    }
+
+
+def session_memory_kb(graph: Any, rotation: Sequence[str], sessions: int = 8) -> float:
+    """Return the memory retained per finished session, measured with ``tracemalloc``."""
+
+    def run(prefix: str, count: int) -> None:
+        for number in range(count):
+            config = {"configurable": {"thread_id": f"{prefix}-{number}"}}
+            for turn in CONVERSATIONS[rotation[number % len(rotation)]]:
+                graph.invoke({"messages": [HumanMessage(content=turn.text)]}, config)
+
+    # Fill the process-wide caches first so only per-session state is counted
+    run("memory-warmup", len(set(rotation)))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        run("memory", sessions)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return round((after - before) / sessions / 1024, 1)
+
+
+def run_load(
+    levels: Sequence[int] = DEFAULT_LEVELS,
+    duration: float = 10.0,
+    llm_think: float = 0.5,
+    http_latency: float = 0.05,
+    mix: str = DEFAULT_MIX,
+    degrade: float = 2.0,
+) -> Dict[str, Any]:
+    """Ramp concurrency through ``levels`` and return the load report."""
+    rotation = parse_mix(mix)
+    model = ScriptedChatModel(
+        script={turn.text: turn.tool_calls for turns in CONVERSATIONS.values() for turn in turns if turn.tool_calls},
+        latency=llm_think,
+    )
+    backends = StandInBackends(latency=http_latency)
+    registry.set_llm(model)
+    backends.install()
+    try:
+        graph = build_graph("master")
+        results = [run_level(graph, level, duration, rotation, str(level)) for level in levels]
+        per_session = session_memory_kb(build_graph("master"), rotation)
+    finally:
+        registry.set_llm(None)
+        backends.uninstall()
+
+    baseline_p95 = results[0]["latency_ms"]["p95"] if results else 0.0
+    healthy = [
+        r["concurrency"] for r in results
+        if not r["errors"] and r["latency_ms"]["p95"] <= baseline_p95 * degrade
+    ]
+    return {
+        "config": {
+            "levels": list(levels),
+            "duration": duration,
+            "llm_think": llm_think,
+            "http_latency": http_latency,
+            "mix": mix,
+            "degrade": degrade,
+        },
+        "levels": results,
+        "session_memory_kb": per_session,
+        "max_concurrency_within_budget": max(healthy, default=0),
+    }
+
+
+def format_table(report: Dict[str, Any]) -> str:
+    """Render the per-level results as a plain-text table."""
+    columns = ("users", "turns/s", "p50 ms", "p95 ms", "p99 ms", "errors", "cpu", "threads", "tool q", "http q", "RSS MB")
+    lines = ["".join(f"{c:>10}" for c in columns)]
+    for r in report["levels"]:
+        queues = r["queue_depth"]
+        values = (
+            r["concurrency"], r["turns_per_second"], r["latency_ms"]["p50"], r["latency_ms"]["p95"],
+            r["latency_ms"]["p99"], r["errors"], f"{r['cpu_utilization']:.0%}", r["max_threads"],
+            queues["tools"]["max"], queues["http_hedge"]["max"], r["rss_mb"] if r["rss_mb"] is not None else "-",
+        )
+        lines.append("".join(f"{v:>10}" for v in values))
+    lines.append(f"memory per session: {report['session_memory_kb']} KiB")
+    lines.append(
+        f"max concurrency with p95 within {report['config']['degrade']}x of one user: "
+        f"{report['max_concurrency_within_budget']}"
+    )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the load test from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", default=",".join(map(str, DEFAULT_LEVELS)), help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--llm-think", type=float, default=0.5, help="seconds per scripted LLM call")
+    parser.add_argument("--http-latency", type=float, default=0.05, help="seconds per stand-in backend request")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="conversation weights, e.g. rental=5,sales=3,ambiguous=2")
+    parser.add_argument("--degrade", type=float, default=2.0, help="allowed p95 growth over one user")
+    parser.add_argument("--output", help="write the report JSON here")
+    args = parser.parse_args(argv)
+
+    report = run_load(
+        levels=[int(n) for n in args.levels.split(",") if n],
+        duration=args.duration,
+        llm_think=args.llm_think,
+        http_latency=args.http_latency,
+        mix=args.mix,
+        degrade=args.degrade,
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    print(format_table(report))  # noqa: T201
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
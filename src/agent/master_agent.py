@@ -1,128 +1,55 @@
 from __future__ import annotations
-import os
-from typing import Annotated, TypedDict, Literal
+from typing import Annotated, Any, Dict, Optional, TypedDict, Literal
 from langgraph.graph.message import add_messages
-from langchain_core.messages import AnyMessage, SystemMessage, AIMessage, HumanMessage
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import AnyMessage, AIMessage
 from langgraph.graph import StateGraph, START, END
-from dotenv import load_dotenv
 
-# Import the existing agents
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-
-from rent_cars_agent import graph as rental_graph, CarRentalState
-from sales_cars_agent import graph as sales_graph, CarSalesState
-
-load_dotenv()
-
-# Configuration
-llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
+from agent.checkpoint import get_checkpointer
+from agent.intent import CLARIFICATION_MESSAGE, UNKNOWN, update_intent
+from agent.metrics import instrument_node, start_exporters_if_enabled
+from agent.rent_cars_agent import graph as rental_graph
+from agent.sales_cars_agent import graph as sales_graph
+from agent.warmup import start_warmup_if_enabled
 
 # Master state that can handle both rental and sales
 class MasterAgentState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     intent: Literal["rental", "sales", "unknown"]
+    intent_confidence: float
+    intent_scores: Dict[str, float]     # accumulated keyword scores per service
+    intent_processed: int               # number of messages already classified
+    # Keys shared with the rental and sales subgraphs
+    rental_info_complete: bool
+    rental_slots: Dict[str, Any]
+    slots_processed: int
+    user_preferences_complete: bool
+    history_summary: str
+    summarized_count: int
+    turn_deadline: Optional[float]
+    tool_loops: int
     
-def detect_user_intent(messages) -> str:
-    """Detect if user wants rental or sales service"""
-    user_messages = []
-    for msg in messages:
-        if isinstance(msg, HumanMessage):
-            if isinstance(msg.content, str):
-                user_messages.append(msg.content)
-            elif isinstance(msg.content, list):
-                content_str = " ".join([str(item) if isinstance(item, str) else str(item.get('text', '')) for item in msg.content])
-                user_messages.append(content_str)
-    
-    user_text = "\n".join(user_messages).lower()
-    
-    # Keywords for rental intent
-    rental_keywords = [
-        "השכרה", "להשכיר", "לשכור", "rental", "rent", "השכר", 
-        "לתקופה", "לכמה ימים", "לשבוע", "לחודש", "זמני", "קצר טווח"
-    ]
-    
-    # Keywords for sales intent  
-    sales_keywords = [
-        "לקנות", "קניה", "מכירה", "רכישה", "purchase", "buy", "sale",
-        "יד ראשונה", "זירו קמ", "ליסינג", "מימון", "תשלומים", 
-        "לרכוש", "בעלות", "קבע", "ארוך טווח"
-    ]
-    
-    rental_score = sum(1 for keyword in rental_keywords if keyword in user_text)
-    sales_score = sum(1 for keyword in sales_keywords if keyword in user_text)
-    
-    if rental_score > sales_score:
-        return "rental"
-    elif sales_score > rental_score:
-        return "sales"
-    else:
-        return "unknown"
-
+@instrument_node("master")
 def master_router(state: MasterAgentState):
     """Main routing node that determines user intent and directs to appropriate service"""
     
-    current_intent = detect_user_intent(state["messages"])
+    # Only messages added since the last turn are classified, the intent is sticky
+    intent_update = update_intent(
+        state["messages"],
+        state.get("intent"),
+        state.get("intent_scores"),
+        state.get("intent_processed", 0),
+    )
     
-    if current_intent == "unknown":
-        # Ask user to clarify their intent
-        system_message = SystemMessage(content="""
-        You are Shlomo SIXT's main assistant in Israel. Help users choose the right service.
-        
-        Always respond in Hebrew (עברית).
-        
-        Ask the user to clarify what they need:
-        1. 🚗 השכרת רכב - לתקופות קצרות (ימים/שבועות)
-        2. 💰 קניית/ליסינג רכב - לבעלות ארוכת טווח
-        
-        Be friendly and explain the difference between the services.
-        """)
-        
-        messages = [system_message] + state["messages"]
-        response = llm.invoke(messages)
-        
+    if intent_update["intent"] == UNKNOWN:
+        # Ask user to clarify their intent - a fixed menu, no LLM call needed
         return {
-            "messages": response,
-            "intent": "unknown"
+            "messages": AIMessage(content=CLARIFICATION_MESSAGE),
+            **intent_update
         }
     
     return {
         "messages": [],
-        "intent": current_intent
-    }
-
-def rental_service_adapter(state: MasterAgentState):
-    """Adapter to run the rental service graph"""
-    # Convert master state to rental state
-    rental_state = CarRentalState(
-        messages=state["messages"],
-        rental_info_complete=False
-    )
-    
-    # Run the rental graph
-    result = rental_graph.invoke(rental_state)
-    
-    return {
-        "messages": result["messages"],
-        "intent": "rental"
-    }
-
-def sales_service_adapter(state: MasterAgentState):
-    """Adapter to run the sales service graph"""
-    # Convert master state to sales state  
-    sales_state = CarSalesState(
-        messages=state["messages"],
-        user_preferences_complete=False
-    )
-    
-    # Run the sales graph
-    result = sales_graph.invoke(sales_state)
-    
-    return {
-        "messages": result["messages"], 
-        "intent": "sales"
+        **intent_update
     }
 
 # Build the master graph
@@ -130,8 +57,11 @@ master_graph_builder = StateGraph(MasterAgentState)
 
 # Add nodes
 master_graph_builder.add_node("master_router", master_router)
-master_graph_builder.add_node("rental_service", rental_service_adapter)
-master_graph_builder.add_node("sales_service", sales_service_adapter)
+# The service graphs run as subgraphs: they read and write the shared state keys
+# directly and get their own checkpoint namespace, so their events can be
+# streamed with `graph.stream(..., subgraphs=True)`
+master_graph_builder.add_node("rental_service", rental_graph)
+master_graph_builder.add_node("sales_service", sales_graph)
 
 # Add edges
 master_graph_builder.add_edge(START, "master_router")
@@ -163,4 +93,7 @@ master_graph_builder.add_edge("rental_service", END)
 master_graph_builder.add_edge("sales_service", END)
 
 # Compile the master graph
-graph = master_graph_builder.compile() 
\ No newline at end of file
+graph = master_graph_builder.compile(checkpointer=get_checkpointer())
+
+start_warmup_if_enabled()
+start_exporters_if_enabled()
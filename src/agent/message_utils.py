@@ -0,0 +1,16 @@
+"""Helpers for reading LangChain messages."""
+
+from __future__ import annotations
+
+from typing import Any
+
+
+def message_text(message: Any) -> str:
+    """Return the text of a message whose content is a string or a list of parts."""
+    content = getattr(message, "content", "")
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        # Join list content into string
+        return " ".join([str(item) if isinstance(item, str) else str(item.get('text', '')) for item in content])
+    return str(content)
@@ -0,0 +1,332 @@
+"""Built-in latency, token, cache and payload metrics for the agent graphs.
+
+With ``SHLOMO_METRICS=true`` the graphs record:
+
+- ``node_latency_seconds{graph,node}`` for every graph node,
+- ``llm_latency_seconds{node}``, ``llm_tokens_total{node,kind}`` and, per
+  user turn, ``turn_llm_calls{node}`` and ``turn_tokens{node}``,
+- ``tool_latency_seconds{tool,status}`` and ``tool_result_chars{tool}``,
+- ``upstream_latency_seconds{host,endpoint,status}`` and
+  ``upstream_response_bytes{endpoint}`` for every backend request,
+- cache hit rates and sizes, read from the caches at export time.
+
+Metrics are exported as Prometheus text on ``SHLOMO_METRICS_PORT`` (bound to
+``SHLOMO_METRICS_HOST``, loopback by default) and/or
+dumped as JSON to ``SHLOMO_METRICS_JSON`` every ``SHLOMO_METRICS_INTERVAL``
+seconds. ``snapshot()``, ``render_prometheus()`` and ``reset()`` give tests
+the same data in-process. When disabled every recording call returns after
+a single flag check.
+"""
+
+from __future__ import annotations
+
+import bisect
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("SHLOMO_METRICS", "false").lower() == "true"
+# Port of the Prometheus text endpoint, 0 disables it
+METRICS_PORT = int(os.getenv("SHLOMO_METRICS_PORT", "0"))
+# Interface of the endpoint; set 0.0.0.0 only where the port is firewalled from the public
+METRICS_HOST = os.getenv("SHLOMO_METRICS_HOST", "127.0.0.1")
+METRICS_JSON = os.getenv("SHLOMO_METRICS_JSON") or None
+METRICS_INTERVAL = float(os.getenv("SHLOMO_METRICS_INTERVAL", "60"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+TOKEN_BUCKETS = (100, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+COUNT_BUCKETS = (1, 2, 3, 4, 6, 8, 12)
+
+# Buckets per histogram; histograms not listed use LATENCY_BUCKETS
+BUCKETS: Dict[str, Sequence[float]] = {
+    "tool_result_chars": SIZE_BUCKETS,
+    "upstream_response_bytes": SIZE_BUCKETS,
+    "turn_tokens": TOKEN_BUCKETS,
+    "turn_llm_calls": COUNT_BUCKETS,
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Histogram:
+    """Cumulative-bucket histogram of one labelled series."""
+
+    def __init__(self, buckets: Sequence[float]) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+_histograms: Dict[str, Dict[Labels, Histogram]] = {}
+_counters: Dict[str, Dict[Labels, float]] = {}
+_lock = threading.Lock()
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """Record one histogram observation."""
+    if not ENABLED:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(BUCKETS.get(name, LATENCY_BUCKETS))
+        histogram.observe(value)
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    """Increase a counter."""
+    if not ENABLED:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+@contextmanager
+def timer(name: str, **labels: Any) -> Iterator[None]:
+    """Observe the duration of the block in seconds."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+
+def instrument_node(graph: str) -> Callable[[F], F]:
+    """Time a graph node into ``node_latency_seconds``."""
+
+    def decorate(node: F) -> F:
+        @functools.wraps(node)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not ENABLED:
+                return node(*args, **kwargs)
+            with timer("node_latency_seconds", graph=graph, node=node.__name__):
+                return node(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def record_llm_call(node: str, history: Sequence[Any], response: Any, seconds: float) -> None:
+    """Record an assistant's LLM call, and its whole turn once the reply has no tool calls.
+
+    ``history`` is the node's state messages before the call; the turn's
+    earlier calls are the AI messages after the last user message.
+    """
+    if not ENABLED:
+        return
+    observe("llm_latency_seconds", seconds, node=node)
+    usage = getattr(response, "usage_metadata", None) or {}
+    inc("llm_calls_total", node=node)
+    inc("llm_tokens_total", usage.get("input_tokens", 0), node=node, kind="prompt")
+    inc("llm_tokens_total", usage.get("output_tokens", 0), node=node, kind="completion")
+    if getattr(response, "tool_calls", None):
+        return
+
+    turn = [response]
+    for message in reversed(history):
+        if getattr(message, "type", None) == "human":
+            break
+        if getattr(message, "type", None) == "ai":
+            turn.append(message)
+    observe("turn_llm_calls", len(turn), node=node)
+    observe("turn_tokens", sum((getattr(m, "usage_metadata", None) or {}).get("total_tokens", 0) for m in turn), node=node)
+
+
+def _cache_gauges() -> Dict[str, Dict[str, Any]]:
+    from agent.availability import availability_cache
+    from agent.branches import branch_cache
+    from agent.car_details import details_cache
+    from agent.catalogs import CATALOG_CACHES
+    from agent.llm_cache import get_response_cache
+
+    caches: Dict[str, Dict[str, Any]] = {
+        "availability": availability_cache.info(),
+        "car_details": details_cache.info(),
+        "branches": branch_cache.info(),
+    }
+    for name, cache in CATALOG_CACHES.items():
+        caches[f"catalog_{name}"] = cache.info()
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        caches["llm_response"] = response_cache.info()
+    # Only numeric fields become gauges
+    return {
+        name: {k: v for k, v in info.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+        for name, info in caches.items()
+    }
+
+
+def snapshot() -> Dict[str, Any]:
+    """Return every metric as plain data: histograms with count, sum and p50/p95, counters and cache gauges."""
+    with _lock:
+        histograms = {
+            name: [
+                {
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": round(h.sum, 6),
+                    "p50": h.quantile(0.5),
+                    "p95": h.quantile(0.95),
+                    "buckets": dict(zip([*map(str, h.buckets), "+Inf"], h.counts)),
+                }
+                for labels, h in series.items()
+            ]
+            for name, series in _histograms.items()
+        }
+        counters = {
+            name: [{"labels": dict(labels), "value": value} for labels, value in series.items()]
+            for name, series in _counters.items()
+        }
+    try:
+        caches = _cache_gauges()
+    except Exception:
+        logger.debug("Could not read cache statistics", exc_info=True)
+        caches = {}
+    return {"timestamp": time.time(), "histograms": histograms, "counters": counters, "caches": caches}
+
+
+def reset() -> None:
+    """Drop every recorded histogram and counter."""
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _format_labels(labels: Dict[str, Any], **extra: Any) -> str:
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in items.values())
+    return "{" + ",".join(f'{k}="{v}"' for k, v in zip(items, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """Render every metric in the Prometheus text exposition format."""
+    data = snapshot()
+    lines: List[str] = []
+    for name, series in sorted(data["histograms"].items()):
+        lines.append(f"# TYPE shlomo_{name} histogram")
+        for item in series:
+            cumulative = 0
+            for bound, count in item["buckets"].items():
+                cumulative += count
+                lines.append(f"shlomo_{name}_bucket{_format_labels(item['labels'], le=bound)} {cumulative}")
+            lines.append(f"shlomo_{name}_sum{_format_labels(item['labels'])} {item['sum']}")
+            lines.append(f"shlomo_{name}_count{_format_labels(item['labels'])} {item['count']}")
+    for name, series in sorted(data["counters"].items()):
+        lines.append(f"# TYPE shlomo_{name} counter")
+        for item in series:
+            lines.append(f"shlomo_{name}{_format_labels(item['labels'])} {item['value']}")
+    if data["caches"]:
+        fields = sorted({field for info in data["caches"].values() for field in info})
+        for field in fields:
+            lines.append(f"# TYPE shlomo_cache_{field} gauge")
+            for cache, info in sorted(data["caches"].items()):
+                if field in info:
+                    lines.append(f"shlomo_cache_{field}{_format_labels({'cache': cache})} {info[field]}")
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("metrics: " + format, *args)
+
+
+def start_http_server(port: int = METRICS_PORT, host: str = METRICS_HOST) -> ThreadingHTTPServer:
+    """Serve ``/metrics`` in Prometheus text format from a daemon thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="shlomo-metrics", daemon=True).start()
+    logger.info("Serving metrics on %s:%s", host, server.server_address[1])
+    return server
+
+
+def dump_json(path: str) -> None:
+    """Write the current snapshot to ``path`` atomically."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def _dump_periodically(path: str, interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            dump_json(path)
+        except Exception:
+            logger.warning("Could not dump metrics to %s", path, exc_info=True)
+
+
+_exporters_started = False
+_exporters_lock = threading.Lock()
+
+
+def start_exporters_if_enabled() -> None:
+    """Start the configured Prometheus endpoint and JSON dump once, if metrics are on."""
+    global _exporters_started
+    if not ENABLED:
+        return
+    with _exporters_lock:
+        if _exporters_started:
+            return
+        _exporters_started = True
+    if METRICS_PORT:
+        try:
+            start_http_server(METRICS_PORT)
+        except OSError:
+            logger.warning("Could not serve metrics on port %s", METRICS_PORT, exc_info=True)
+    if METRICS_JSON:
+        threading.Thread(
+            target=_dump_periodically, args=(METRICS_JSON, METRICS_INTERVAL), name="shlomo-metrics-dump", daemon=True
+        ).start()
@@ -0,0 +1,78 @@
+"""Shared, lazily built chat model and tool-bound runnables.
+
+All graphs use one ChatOpenAI client. It is created on first use, and each
+assistant's ``llm.bind_tools(...)`` runnable is built once and reused on
+every turn instead of being rebuilt per call.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from agent.llm_cache import get_response_cache
+
+MODEL_NAME = os.getenv("SHLOMO_MODEL", "gpt-4o")
+MODEL_TEMPERATURE = float(os.getenv("SHLOMO_MODEL_TEMPERATURE", "0.1"))
+
+_lock = threading.RLock()
+_llm: Optional[BaseChatModel] = None
+_bound: Dict[str, Runnable[Any, Any]] = {}
+
+# Startup timings in seconds (module imports, warm-up steps, first LLM calls)
+startup_timings: Dict[str, float] = {}
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Record a startup timing once; later values for the same name are ignored."""
+    startup_timings.setdefault(name, round(seconds, 4))
+
+
+def get_llm() -> BaseChatModel:
+    """Return the shared chat model, creating it on first use."""
+    global _llm
+    if _llm is None:
+        with _lock:
+            if _llm is None:
+                from langchain_openai import ChatOpenAI
+
+                start = time.perf_counter()
+                # Streaming lets tokens reach the graph's "messages" stream as they arrive
+                _llm = ChatOpenAI(
+                    model=MODEL_NAME, temperature=MODEL_TEMPERATURE, streaming=True, cache=get_response_cache()
+                )
+                record_timing("llm_client_init", time.perf_counter() - start)
+    return _llm
+
+
+def set_llm(llm: Optional[BaseChatModel]) -> None:
+    """Replace the shared chat model (used by tests and benchmarks)."""
+    global _llm
+    with _lock:
+        _llm = llm
+        _bound.clear()
+
+
+def get_bound_llm(name: str, tools: Sequence[Any], **kwargs: Any) -> Runnable[Any, Any]:
+    """Return the chat model bound to ``tools`` (with ``bind_tools`` options), built once per name."""
+    runnable = _bound.get(name)
+    if runnable is None:
+        with _lock:
+            runnable = _bound.get(name)
+            if runnable is None:
+                runnable = get_llm().bind_tools(list(tools), **kwargs).with_listeners(on_end=_first_call_listener(name))
+                _bound[name] = runnable
+    return runnable
+
+
+def _first_call_listener(name: str) -> Any:
+    def on_end(run: Any) -> None:
+        if run.start_time and run.end_time:
+            record_timing(f"first_llm_call.{name}", (run.end_time - run.start_time).total_seconds())
+
+    return on_end
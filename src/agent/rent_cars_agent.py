@@ -1,22 +1,29 @@
 
 from __future__ import annotations
-import os
-import httpx
-from typing import Annotated, TypedDict, Dict, Any
+import time
+from typing import Annotated, TypedDict, Dict, Any, List, Optional
 from urllib.parse import quote
 from langgraph.graph.message import add_messages
-from langchain_core.messages import AnyMessage, SystemMessage, AIMessage, HumanMessage, ToolMessage
+from langchain_core.messages import AnyMessage, SystemMessage, AIMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
-from dotenv import load_dotenv
 
+from agent.availability import get_availability, prefetch_availability, search_payload
+from agent.availability_sweep import sweep_availability
+from agent.branch_index import find_branches
+from agent.branches import get_branches
+from agent.checkpoint import get_checkpointer
+from agent.deadline import answer_within_budget, deadline_scope, timeout_kwargs, turn_budget
+from agent.history import HISTORY_TOKEN_BUDGETS, window_history
+from agent.metrics import instrument_node, record_llm_call, start_exporters_if_enabled
+from agent.registry import get_bound_llm
+from agent.rental_results import get_result_page, store_search_result
+from agent.rental_slots import rental_slots_complete, update_rental_slots
+from agent.tool_runner import EarlyToolCallHandler, execute_tool_calls
+from agent.warmup import start_warmup_if_enabled
 
-load_dotenv()
-
-# Configuration
-BASE_URL = os.getenv("SHLOMO_BASE_URL", "https://backend-prod.shlomo.co.il")
-llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
 
 @tool("search_available_cars")
 def search_available_cars_tool(
@@ -27,62 +34,63 @@ def search_available_cars_tool(
     pickupBranch: int,
     returnBranch: int
 ) -> dict:
-    """Search for available cars using Shlomo SIXT's rental API."""
-    url = "https://backend-prod.shlomo.co.il/api/v1/rent/all-groups"
-    payload = {
-        "agreement": "121845",        # Fixed value
-        "fromDate": fromDate,
-        "fromTime": fromTime,
-        "toDate": toDate,
-        "toTime": toTime,
-        "pickupBranch": pickupBranch,
-        "returnBranch": returnBranch,
-        "isTourist": False,           # Fixed value
-        "product": 9807               # Fixed value
-    }
+    """Search for available cars using Shlomo SIXT's rental API.
+    
+    Returns the cheapest car groups first, one page at a time. Use get_more_cars
+    with the returned result_id and next_cursor to see more.
+    """
+    payload = search_payload(fromDate, fromTime, toDate, toTime, pickupBranch, returnBranch)
     
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Origin": "https://www.shlomo.co.il",
-        "Referer": "https://www.shlomo.co.il/",
-        "clientdetails": '{"urlPath":"/israel/search-results","clientIP":"127.0.0.1"}',
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "X-Requested-With": "XMLHttpRequest"
-    }
     try:
-        response = httpx.post(url, json=payload, headers=headers, timeout=30)
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}"}
+        # Joins or reuses the search prefetched while the model was thinking, if any
+        result = get_availability(payload)
+        return store_search_result(result)
             
     except Exception as e:
         return {"error": str(e)}
 
-@tool("get_branches")
-def get_branches_tool() -> dict:
-    """Get list of available Shlomo SIXT branches."""
-    url = "https://backend-prod.shlomo.co.il/api/v1/rent/branches"
+@tool("sweep_available_cars")
+def sweep_available_cars_tool(
+    fromDate: str,
+    fromTime: str,
+    toDate: str,
+    toTime: str,
+    pickupBranches: List[int],
+    returnBranch: int = 0,
+    flexDays: int = 0
+) -> dict:
+    """Search several pickup branches and dates shifted by up to flexDays days in one call.
     
-    headers = {
-        "Content-Type": "application/json",
-        "Accept": "application/json",
-        "Origin": "https://www.shlomo.co.il",
-        "Referer": "https://www.shlomo.co.il/",
-        "clientdetails": '{"urlPath":"/israel/search-results","clientIP":"127.0.0.1"}',
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "X-Requested-With": "XMLHttpRequest"
-    }
+    Returns the cheapest option of each car group with the branch and dates it was found for.
+    returnBranch 0 means returning to the pickup branch. Prefer this over one search per branch or date.
+    Pass only the few closest branches (at most 8) and flexDays of 3 or less.
+    """
+    try:
+        return sweep_availability(fromDate, fromTime, toDate, toTime, pickupBranches, returnBranch, flexDays)
+    except Exception as e:
+        return {"error": str(e)}
+
+@tool("get_more_cars")
+def get_more_cars_tool(result_id: str, cursor: int) -> dict:
+    """Get the next page of a previous search_available_cars result."""
+    return get_result_page(result_id, cursor)
+
+@tool("find_branch")
+def find_branch_tool(query: str) -> dict:
+    """Find the Shlomo SIXT branches matching a place name, in Hebrew or English.
     
+    Returns the few best matches with their branch IDs and Hebrew and English names.
+    """
     try:
-        response = httpx.post(url, json={}, headers=headers, timeout=30)
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}"}
-            
+        return find_branches(query)
+    except Exception as e:
+        return {"error": str(e)}
+
+@tool("get_branches")
+def get_branches_tool() -> dict:
+    """Get the full list of Shlomo SIXT branches. Prefer find_branch for a named place."""
+    try:
+        return get_branches()
     except Exception as e:
         return {"error": str(e)}
 
@@ -145,50 +153,25 @@ def generate_purchase_link_tool(
     print(f"Generated purchase link: {purchase_url}")
     return purchase_url
 
+RENTAL_TOOLS = [search_available_cars_tool, sweep_available_cars_tool, get_more_cars_tool, find_branch_tool, get_branches_tool, generate_purchase_link_tool]
+
 # State definition
 class CarRentalState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     rental_info_complete: bool
+    rental_slots: Dict[str, Any]    # dates, times and branches parsed so far
+    slots_processed: int            # number of messages already parsed into rental_slots
+    history_summary: str            # rolling summary of messages outside the history window
+    summarized_count: int           # number of messages folded into history_summary
+    turn_deadline: Optional[float]  # time.time() by which the current turn must be answered
+    tool_loops: int                 # tool rounds already run in the current turn
 
 # Required rental information - including branch selection
 rental_info_needed = "pickup date (DD/MM/YYYY), pickup time (HH:MM), return date (DD/MM/YYYY), return time (HH:MM), pickup branch ID, return branch ID"
 
-def has_rental_info(messages):
-    """Check if user provided all rental information"""
-    user_messages = []
-    for msg in messages:
-        if isinstance(msg, HumanMessage):
-            # Handle both string and list content
-            if isinstance(msg.content, str):
-                user_messages.append(msg.content)
-            elif isinstance(msg.content, list):
-                # Join list content into string
-                content_str = " ".join([str(item) if isinstance(item, str) else str(item.get('text', '')) for item in msg.content])
-                user_messages.append(content_str)
-    
-    user_text = "\n".join(user_messages)
-    
-    prompt = f"""Return True if ALL the following rental information is present in the conversation, otherwise return False. 
-    Required info: {rental_info_needed}
-    User messages: {user_text}
-    
-    Return only True or False, no explanation."""
-    
-    response = llm.invoke(prompt)
-    
-    # Handle response content safely
-    if isinstance(response.content, str):
-        return "true" in response.content.lower()
-    elif isinstance(response.content, list):
-        content_str = " ".join([str(item) for item in response.content])
-        return "true" in content_str.lower()
-    else:
-        return False
-
-
-
 # Main conversation handler
-def rental_assistant(state: CarRentalState):
+@instrument_node("rental")
+def rental_assistant(state: CarRentalState, config: RunnableConfig):
     """Main conversation node - handles user interaction"""
     system_message = SystemMessage(content=f"""
     You are a helpful car rental assistant for Shlomo SIXT in Israel.
@@ -199,15 +182,16 @@ def rental_assistant(state: CarRentalState):
     - Help users rent cars by collecting: {rental_info_needed}
     
     WORKFLOW:
-    1. If user asks about locations or doesn't know branch IDs, use get_branches tool to show available branches
+    1. When the user names a place (city, airport or branch), use find_branch with that name to get the branch ID.
+       Use get_branches only if the user asks to see all branches
     2. Collect all required information from user
     3. Once you have complete rental info, use search_available_cars tool with:
       - fromDate: user date (DD/MM/YYYY format)
       - fromTime: user time (HH:MM format)
       - toDate: user date (DD/MM/YYYY format)
       - toTime: user time (HH:MM format)
-      - pickupBranch: user selected branch ID (from branches list)
-      - returnBranch: user selected branch ID (from branches list)
+      - pickupBranch: user selected branch ID (from find_branch or the branches list)
+      - returnBranch: user selected branch ID (from find_branch or the branches list)
     
     4. When displaying search results, ALWAYS show:
       - Car name (groupTypeHe)
@@ -215,31 +199,76 @@ def rental_assistant(state: CarRentalState):
       - Car Group ID (groupCode) - VERY IMPORTANT!
       - Status (statusHe)
       
-    5. After showing cars, ask user to select a car by specifying the car group ID
+    5. Search results come sorted by price, cheapest first, one page at a time. If the user
+       wants more options and next_cursor is not null, use get_more_cars with result_id and next_cursor
+    
+    6. If the user is flexible about the branch or the dates ("anywhere in the center", "give or take a day"),
+       use sweep_available_cars once with all the candidate branches and flexDays instead of several searches.
+       Each result shows the branch and dates of its price; use those in the purchase link
+    
+    7. After showing cars, ask user to select a car by specifying the car group ID
     
-    6. When user selects a car (provides car group ID), use generate_purchase_link tool to create the purchase URL
+    8. When user selects a car (provides car group ID), use generate_purchase_link tool to create the purchase URL,
+       with the branch names exactly as find_branch returned them (pickupBranchName and pickupBranchNameEn)
     
     IMPORTANT NOTES:
     - The tool automatically uses fixed values: agreement="121845", isTourist=false, product=9807
     - Always show car group ID (groupCode) clearly in search results
     - Ask user to choose by car group ID for purchase link generation
-    - Always show branches first if user hasn't selected them yet
+    - Ask where the user wants to pick up and return the car if they haven't said yet
     - Keep conversations natural and helpful
     - Ask for dates in DD/MM/YYYY format and times in HH:MM format
     """)
     
-    messages = [system_message] + state["messages"]
-    response = llm.bind_tools([search_available_cars_tool, get_branches_tool, generate_purchase_link_tool]).invoke(messages)
+    # Recent turns verbatim, older ones folded into a rolling summary
+    history = window_history(
+        state["messages"],
+        HISTORY_TOKEN_BUDGETS["rental_assistant"],
+        state.get("history_summary", ""),
+        state.get("summarized_count", 0),
+    )
+    messages = [system_message] + history.messages
     
-    # Check if we now have complete rental info
-    info_complete = has_rental_info(state["messages"] + [response])
+    # Check if we now have complete rental info - parses only the new messages
+    slots, processed = update_rental_slots(
+        state.get("rental_slots"),
+        state["messages"],
+        state.get("slots_processed", 0),
+    )
+    rental_info_complete = rental_slots_complete(slots)
+    if rental_info_complete and slots != (state.get("rental_slots") or {}):
+        # The user just completed or changed the details, so the model will almost
+        # certainly search next; start it now. Later turns and tool loops do not.
+        prefetch_availability(slots)
+    
+    # Streams tokens to the graph's "messages" stream and starts tool calls as soon as they are complete.
+    # The turn's time budget bounds the call and the number of tool rounds.
+    budget = turn_budget(state)
+    start = time.perf_counter()
+    response = answer_within_budget(
+        "rental_assistant",
+        budget,
+        state["messages"],
+        lambda: get_bound_llm("rental_assistant", RENTAL_TOOLS).invoke(
+            messages, merge_configs(config, {"callbacks": [EarlyToolCallHandler(RENTAL_TOOLS)]}), **timeout_kwargs()
+        ),
+        lambda: get_bound_llm("rental_assistant.final", RENTAL_TOOLS, tool_choice="none").invoke(messages, config, **timeout_kwargs()),
+    )
+    record_llm_call("rental_assistant", state["messages"], response, time.perf_counter() - start)
     
     return {
         "messages": response,
-        "rental_info_complete": info_complete
+        "rental_info_complete": rental_info_complete,
+        "rental_slots": slots,
+        "slots_processed": processed,
+        "history_summary": history.summary,
+        "summarized_count": history.summarized_count,
+        "turn_deadline": budget.deadline,
+        "tool_loops": budget.tool_loops
     }
 
 # Tool execution node
+@instrument_node("rental")
 def tool_executor(state: CarRentalState):
     """Execute tools when needed"""
     last_message = state["messages"][-1]
@@ -247,37 +276,10 @@ def tool_executor(state: CarRentalState):
     if not (isinstance(last_message, AIMessage) and hasattr(last_message, 'tool_calls')):
         return {"messages": []}
     
-    tool_results = []
+    with deadline_scope(state.get("turn_deadline")):
+        tool_results = execute_tool_calls(last_message.tool_calls, RENTAL_TOOLS)
     
-    for tool_call in last_message.tool_calls:
-        try:
-            # Handle both object and dict formats for tool_call
-            tool_name = getattr(tool_call, 'name', tool_call.get('name', ''))
-            tool_args = getattr(tool_call, 'args', tool_call.get('args', {}))
-            tool_id = getattr(tool_call, 'id', tool_call.get('id', 'unknown'))
-            
-            if tool_name == "search_available_cars":
-                result = search_available_cars_tool.invoke(tool_args)
-            elif tool_name == "get_branches":
-                result = get_branches_tool.invoke(tool_args)
-            elif tool_name == "generate_purchase_link":
-                result = generate_purchase_link_tool.invoke(tool_args)
-            else:
-                result = f"Unknown tool: {tool_name}"
-            
-            tool_results.append(ToolMessage(
-                content=result,
-                tool_call_id=tool_id
-            ))
-        except Exception as e:
-            # Handle tool_id safely for error case too
-            tool_id = getattr(tool_call, 'id', tool_call.get('id', 'unknown'))
-            tool_results.append(ToolMessage(
-                content=f"Error: {str(e)}",
-                tool_call_id=tool_id
-            ))
-    
-    return {"messages": tool_results}
+    return {"messages": tool_results, "tool_loops": state.get("tool_loops", 0) + 1}
 
 
 
@@ -329,4 +331,7 @@ graph_builder.add_conditional_edges(
 )
 
 # Compile the graph
-graph = graph_builder.compile()
+graph = graph_builder.compile(checkpointer=get_checkpointer())
+
+start_warmup_if_enabled()
+start_exporters_if_enabled()
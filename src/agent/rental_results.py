@@ -0,0 +1,122 @@
+"""Compact, paginated views of rental availability results.
+
+The raw ``/rent/all-groups`` payload is large and the model only needs a few
+fields of each car group. Results are projected to those fields, sorted by
+price and returned one page at a time; the full payload stays in a bounded
+in-process store keyed by ``result_id`` instead of the message history.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Fields of a car group the rental prompt actually uses
+PROJECTED_FIELDS = ("groupTypeHe", "amountIncDiscountIncVat", "groupCode", "statusHe")
+PRICE_FIELD = "amountIncDiscountIncVat"
+
+SEARCH_PAGE_SIZE = int(os.getenv("SHLOMO_SEARCH_PAGE_SIZE", "6"))
+RESULT_STORE_SIZE = int(os.getenv("SHLOMO_RESULT_STORE_SIZE", "256"))
+
+
+def find_car_groups(payload: Any) -> List[Dict[str, Any]]:
+    """Return the list of car group records inside an availability payload."""
+    if isinstance(payload, list):
+        if any(isinstance(item, dict) and any(f in item for f in PROJECTED_FIELDS) for item in payload):
+            return [item for item in payload if isinstance(item, dict)]
+        for item in payload:
+            groups = find_car_groups(item)
+            if groups:
+                return groups
+    elif isinstance(payload, dict):
+        for value in payload.values():
+            groups = find_car_groups(value)
+            if groups:
+                return groups
+    return []
+
+
+def price_of(group: Dict[str, Any]) -> Optional[float]:
+    """Return the price of a car group as a number, if it has one."""
+    try:
+        return float(group.get(PRICE_FIELD))  # type: ignore[arg-type]
+    except (TypeError, ValueError):
+        return None
+
+
+def project_car_groups(payload: Any) -> List[Dict[str, Any]]:
+    """Keep only the prompt fields of every car group, cheapest first."""
+    projected = [
+        {field: group.get(field) for field in PROJECTED_FIELDS if field in group}
+        for group in find_car_groups(payload)
+    ]
+
+    def sort_key(group: Dict[str, Any]) -> Tuple[bool, float]:
+        price = price_of(group)
+        return (price is None, price if price is not None else 0.0)
+
+    return sorted(projected, key=sort_key)
+
+
+class ResultStore:
+    """Bounded LRU store of full search payloads and their projections."""
+
+    def __init__(self, max_entries: int = RESULT_STORE_SIZE) -> None:
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, payload: Any, projected: List[Dict[str, Any]]) -> str:
+        result_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._entries[result_id] = (payload, projected)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id: str) -> Optional[Tuple[Any, List[Dict[str, Any]]]]:
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                self._entries.move_to_end(result_id)
+            return entry
+
+
+result_store = ResultStore()
+
+
+def page_of(result_id: str, projected: List[Dict[str, Any]], cursor: int = 0, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """Build one page of projected results with a cursor for the next page."""
+    page_size = page_size or SEARCH_PAGE_SIZE
+    cursor = max(0, cursor)
+    end = cursor + page_size
+    return {
+        "result_id": result_id,
+        "total": len(projected),
+        "cars": projected[cursor:end],
+        "next_cursor": end if end < len(projected) else None,
+    }
+
+
+def store_search_result(payload: Any, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """Project a raw availability payload, keep it in the store and return page one."""
+    projected = project_car_groups(payload)
+    result_id = result_store.put(payload, projected)
+    return page_of(result_id, projected, 0, page_size)
+
+
+def get_result_page(result_id: str, cursor: int, page_size: Optional[int] = None) -> Dict[str, Any]:
+    """Return a later page of a stored search result."""
+    entry = result_store.get(result_id)
+    if entry is None:
+        return {"error": f"Search result {result_id} expired, please search again"}
+    return page_of(result_id, entry[1], cursor, page_size)
+
+
+def get_full_result(result_id: str) -> Any:
+    """Return the full raw payload of a stored search result (or None)."""
+    entry = result_store.get(result_id)
+    return entry[0] if entry is not None else None
@@ -0,0 +1,288 @@
+"""Deterministic extraction of rental details from user messages.
+
+Dates, times and branches are parsed locally into slots named after the
+``search_available_cars`` arguments. Slots are updated incrementally from the
+messages added since the last turn, so checking whether the rental details
+are complete costs no LLM call.
+
+A message that is just a number ("49") is taken as a branch ID only when it
+answers an assistant question about the branch; otherwise it is more likely
+a car group code. Branch names are matched with one pattern built per branch
+list snapshot.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.branches import branch_cache, branch_id, branch_name, branch_name_en, iter_branch_records
+from agent.message_utils import message_text
+
+SLOT_NAMES = ("fromDate", "fromTime", "toDate", "toTime", "pickupBranch", "returnBranch")
+
+_HEBREW = "\u0590-\u05FF"
+
+HEBREW_MONTHS = {
+    "ינואר": 1, "פברואר": 2, "מרץ": 3, "מרס": 3, "אפריל": 4, "מאי": 5, "יוני": 6,
+    "יולי": 7, "אוגוסט": 8, "ספטמבר": 9, "אוקטובר": 10, "נובמבר": 11, "דצמבר": 12,
+}
+ENGLISH_MONTHS = {
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "jun": 6, "jul": 7, "aug": 8,
+    "sep": 9, "sept": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+_MONTH_NAMES = "|".join(sorted(list(HEBREW_MONTHS) + list(ENGLISH_MONTHS), key=len, reverse=True))
+
+_NUMERIC_DATE = re.compile(r"(?<![\d/.])(?<!\d-)(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{4}|\d{2})(?![\d/.\-])")
+_ISO_DATE = re.compile(r"(?<!\d)(\d{4})-(\d{1,2})-(\d{1,2})(?!\d)")
+_SHORT_DATE = re.compile(r"(?<![\d/.])(?<!\d-)(\d{1,2})/(\d{1,2})(?![\d/])")
+_NAMED_DATE = re.compile(
+    rf"(?<!\d)(\d{{1,2}})\s*(?:[בל]-?)?\s*({_MONTH_NAMES})(?![a-z{_HEBREW}])(?:\s*,?\s*(\d{{4}}))?",
+    re.IGNORECASE,
+)
+_NAMED_DATE_EN = re.compile(rf"\b({_MONTH_NAMES})\s+(\d{{1,2}})(?:st|nd|rd|th)?(?:,?\s*(\d{{4}}))?", re.IGNORECASE)
+_RELATIVE_DATE = re.compile(
+    rf"(?<![{_HEBREW}])[ולבמה]?(מחרתיים|מחר|היום)(?![{_HEBREW}])|\b(day after tomorrow|tomorrow|today)\b",
+    re.IGNORECASE,
+)
+
+_DAY_PARTS = r"בבוקר|בצהריים|אחה\"צ|אחר הצהריים|בערב|בלילה|am|pm"
+_CLOCK_TIME = re.compile(rf"(?<![\d:])([01]?\d|2[0-3]):([0-5]\d)(?![\d:])(?:\s*({_DAY_PARTS}))?", re.IGNORECASE)
+_SPOKEN_TIME = re.compile(
+    rf"(?:בשעה|בשעות|\bat)\s*(\d{{1,2}})(?:\s*({_DAY_PARTS}))?"
+    rf"|(?<![\d:/.])(\d{{1,2}})\s*({_DAY_PARTS})",
+    re.IGNORECASE,
+)
+
+_BRANCH_ID = re.compile(r"(?:סניף|branch)\s*(?:מס(?:פר|')?\.?|id|no\.?|number)?\s*[:#]?\s*(\d{1,4})(?!\d)", re.IGNORECASE)
+_BARE_ID = re.compile(r"^\s*#?(\d{1,4})\s*$")
+# A bare number is a branch ID only in reply to a message that asks about the branch
+_BRANCH_WORD = re.compile(r"סניף|סניפים|branch", re.IGNORECASE)
+
+_PICKUP_MARKER = re.compile(
+    rf"איסוף|לאסוף|אאסוף|מתאריך|החל מ|(?<![{_HEBREW}])מ-?(?=\s*\d)|\bpick\s?-?up\b|\bfrom\b",
+    re.IGNORECASE,
+)
+_RETURN_MARKER = re.compile(
+    rf"החזרה|להחזיר|אחזיר|מחזיר|(?<![{_HEBREW}])[ו]?עד(?![{_HEBREW}])|\breturn\b|\bdrop\s?-?off\b|\buntil\b|\bto\b(?=\s*\d)",
+    re.IGNORECASE,
+)
+# A clause boundary ends the reach of the last pickup/return marker
+_CLAUSE_BREAK = re.compile(r"[,;\n!?]|\.(?!\d)")
+_SAME_BRANCH = re.compile(r"אותו סניף|לאותו סניף|באותו סניף|אותו מקום|same branch|same location", re.IGNORECASE)
+
+_EVENING = {"בערב", "pm", "אחה\"צ", "אחר הצהריים"}
+
+Token = Tuple[int, str, Any]
+
+
+def _make_date(day: int, month: int, year: Optional[int], today: date) -> Optional[date]:
+    if year is not None and year < 100:
+        year += 2000
+    try:
+        value = date(year or today.year, month, day)
+    except ValueError:
+        return None
+    if year is None and value < today:
+        # A date without a year that already passed this year means next year
+        try:
+            value = value.replace(year=value.year + 1)
+        except ValueError:
+            return None
+    return value
+
+
+def _clock(hour: int, minute: int, part: Optional[str]) -> Optional[str]:
+    if hour > 23:
+        return None
+    part = (part or "").lower()
+    if hour < 12 and (part in _EVENING or (part == "בלילה" and hour >= 6) or (part == "בצהריים" and hour <= 5)):
+        hour += 12
+    return f"{hour:02d}:{minute:02d}"
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\"'`׳״.\-_,()]", " ", text).lower()
+
+
+_names_lock = threading.Lock()
+_names_key: Optional[Tuple[int, int]] = None
+_names: Tuple[Optional["re.Pattern[str]"], Dict[str, int]] = (None, {})
+
+
+def _branch_names() -> Tuple[Optional["re.Pattern[str]"], Dict[str, int]]:
+    """Return the branch name pattern and name -> ID map of the branch list held in memory."""
+    global _names_key, _names
+    payload = branch_cache.peek()
+    key = (branch_cache.version, id(payload))
+    with _names_lock:
+        if key == _names_key:
+            return _names
+    ids: Dict[str, int] = {}
+    for record in iter_branch_records(payload):
+        record_id = branch_id(record)
+        if record_id is None:
+            continue
+        for name in (branch_name(record), branch_name_en(record)):
+            name = " ".join(_normalize(name).split())
+            if len(name) >= 3:
+                ids.setdefault(name, record_id)
+    pattern = None
+    if ids:
+        # Longest names first, so "תל אביב מרכז" wins over "תל אביב"
+        alternatives = "|".join(re.escape(name) for name in sorted(ids, key=len, reverse=True))
+        pattern = re.compile(rf"(?<![a-z{_HEBREW}])[ולבמה]?(?P<name>{alternatives})(?![a-z{_HEBREW}])")
+    with _names_lock:
+        _names_key, _names = key, (pattern, ids)
+    return pattern, ids
+
+
+def _branch_tokens(text: str, prompt: str = "") -> List[Token]:
+    tokens: List[Token] = [(m.start(), "branch", int(m.group(1))) for m in _BRANCH_ID.finditer(text)]
+    bare = _BARE_ID.match(text)
+    if bare and _BRANCH_WORD.search(prompt):
+        tokens.append((bare.start(1), "branch", int(bare.group(1))))
+
+    # Branch names are matched only against the list already held in memory
+    pattern, ids = _branch_names()
+    if pattern is not None:
+        tokens.extend((m.start(), "branch", ids[m.group("name")]) for m in pattern.finditer(_normalize(text)))
+    return tokens
+
+
+def _date_and_time_tokens(text: str, today: date) -> List[Token]:
+    tokens: List[Token] = []
+    taken: List[Tuple[int, int]] = []
+
+    def add(match: "re.Match[str]", kind: str, value: Any) -> None:
+        if value is None or any(match.start() < end and start < match.end() for start, end in taken):
+            return
+        taken.append((match.start(), match.end()))
+        tokens.append((match.start(), kind, value))
+
+    for m in _ISO_DATE.finditer(text):
+        add(m, "date", _make_date(int(m.group(3)), int(m.group(2)), int(m.group(1)), today))
+    for m in _NUMERIC_DATE.finditer(text):
+        add(m, "date", _make_date(int(m.group(1)), int(m.group(2)), int(m.group(3)), today))
+    for m in _NAMED_DATE.finditer(text):
+        month = HEBREW_MONTHS.get(m.group(2)) or ENGLISH_MONTHS.get(m.group(2).lower())
+        year = int(m.group(3)) if m.group(3) else None
+        add(m, "date", _make_date(int(m.group(1)), month or 0, year, today))
+    for m in _NAMED_DATE_EN.finditer(text):
+        month = ENGLISH_MONTHS.get(m.group(1).lower())
+        year = int(m.group(3)) if m.group(3) else None
+        add(m, "date", _make_date(int(m.group(2)), month or 0, year, today))
+    for m in _SHORT_DATE.finditer(text):
+        add(m, "date", _make_date(int(m.group(1)), int(m.group(2)), None, today))
+    for m in _RELATIVE_DATE.finditer(text):
+        word = (m.group(1) or m.group(2)).lower()
+        offset = {"היום": 0, "today": 0, "מחר": 1, "tomorrow": 1}.get(word, 2)
+        add(m, "date", today + timedelta(days=offset))
+
+    for m in _CLOCK_TIME.finditer(text):
+        add(m, "time", _clock(int(m.group(1)), int(m.group(2)), m.group(3)))
+    for m in _SPOKEN_TIME.finditer(text):
+        hour = m.group(1) or m.group(3)
+        add(m, "time", _clock(int(hour), 0, m.group(2) or m.group(4)))
+
+    return [
+        (pos, kind, value.strftime("%d/%m/%Y") if isinstance(value, date) else value)
+        for pos, kind, value in tokens
+    ]
+
+
+def _side(position: int, markers: Sequence[Tuple[int, Optional[str]]]) -> Optional[str]:
+    side = None
+    for marker_position, marker_side in markers:
+        if marker_position > position:
+            break
+        side = marker_side
+    return side
+
+
+def extract_rental_slots(
+    text: str,
+    current: Optional[Dict[str, Any]] = None,
+    today: Optional[date] = None,
+    prompt: str = "",
+) -> Dict[str, Any]:
+    """Return the slot updates found in one user message.
+
+    Values after a pickup/return marker ("איסוף", "להחזיר", "until" ...) go to
+    that side. Unmarked values fill the pickup slot first and then the return
+    slot. ``prompt`` is the assistant message the user is answering.
+    """
+    current = current or {}
+    today = today or date.today()
+
+    markers = sorted(
+        [(m.start(), "pickup") for m in _PICKUP_MARKER.finditer(text)]
+        + [(m.start(), "return") for m in _RETURN_MARKER.finditer(text)]
+        + [(m.start(), None) for m in _CLAUSE_BREAK.finditer(text)]
+    )
+    tokens = sorted(_date_and_time_tokens(text, today) + _branch_tokens(text, prompt), key=lambda t: t[0])
+
+    updates: Dict[str, Any] = {}
+    for kind, from_slot, to_slot in [
+        ("date", "fromDate", "toDate"),
+        ("time", "fromTime", "toTime"),
+        ("branch", "pickupBranch", "returnBranch"),
+    ]:
+        unmarked = []
+        for position, token_kind, value in tokens:
+            if token_kind != kind:
+                continue
+            side = _side(position, markers)
+            if side == "pickup":
+                updates[from_slot] = value
+            elif side == "return":
+                updates[to_slot] = value
+            else:
+                unmarked.append(value)
+
+        if len(unmarked) >= 2 and from_slot not in updates and to_slot not in updates:
+            updates[from_slot], updates[to_slot] = unmarked[0], unmarked[1]
+            continue
+        for value in unmarked:
+            for slot in (from_slot, to_slot):
+                if slot not in updates and current.get(slot) is None:
+                    updates[slot] = value
+                    break
+
+    if _SAME_BRANCH.search(text):
+        pickup = updates.get("pickupBranch", current.get("pickupBranch"))
+        if pickup is not None:
+            updates["returnBranch"] = pickup
+
+    return updates
+
+
+def update_rental_slots(
+    slots: Optional[Dict[str, Any]],
+    messages: Sequence[Any],
+    processed: int = 0,
+    today: Optional[date] = None,
+) -> Tuple[Dict[str, Any], int]:
+    """Fold the user messages added since ``processed`` into the slots.
+
+    Returns the updated slots and the new processed-message count.
+    """
+    updated = dict(slots or {})
+    prompt = next((message_text(m) for m in reversed(messages[:processed]) if isinstance(m, AIMessage)), "")
+    for message in messages[processed:]:
+        if isinstance(message, AIMessage):
+            prompt = message_text(message)
+        elif isinstance(message, HumanMessage):
+            updated.update(extract_rental_slots(message_text(message), updated, today, prompt))
+    return updated, len(messages)
+
+
+def rental_slots_complete(slots: Optional[Dict[str, Any]]) -> bool:
+    """Return True if every slot needed for search_available_cars is filled."""
+    return bool(slots) and all(slots.get(name) is not None for name in SLOT_NAMES)
@@ -0,0 +1,339 @@
+"""Retries, hedged requests, circuit breakers and per-endpoint timeouts.
+
+Every backend call goes through ``request``:
+
+- each endpoint has its own timeout (``SHLOMO_TIMEOUT_<ENDPOINT>``),
+- idempotent requests are retried on transport errors, 429 and 5xx with
+  full-jitter exponential backoff,
+- idempotent requests still running after the endpoint's recent p95 latency
+  get one duplicate (hedged) request, and the first good response wins,
+- a host that keeps failing opens its circuit breaker: calls fail fast with
+  ``CircuitOpenError`` until a trial request succeeds after a cool-down.
+
+``RateLimiter`` is a token bucket for callers that fan out many requests to
+one endpoint; passed to ``request`` as ``limiter``, it is charged once per
+upstream attempt, retries and hedges included. ``fan_out`` runs such a batch
+on a shared pool with a bounded number of tasks submitted at a time.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Set
+
+import httpx
+
+from agent import deadline, metrics
+from agent.http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = int(os.getenv("SHLOMO_RETRY_ATTEMPTS", "3"))
+RETRY_BACKOFF = float(os.getenv("SHLOMO_RETRY_BACKOFF", "0.2"))
+RETRY_BACKOFF_MAX = float(os.getenv("SHLOMO_RETRY_BACKOFF_MAX", "2"))
+
+HEDGE_ENABLED = os.getenv("SHLOMO_HEDGE", "true").lower() == "true"
+# Hedge delay until an endpoint has enough latency samples for a p95
+HEDGE_DEFAULT_DELAY = float(os.getenv("SHLOMO_HEDGE_DEFAULT_DELAY", "1.0"))
+HEDGE_MIN_DELAY = float(os.getenv("SHLOMO_HEDGE_MIN_DELAY", "0.05"))
+HEDGE_MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+
+BREAKER_FAILURES = int(os.getenv("SHLOMO_BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("SHLOMO_BREAKER_RESET", "30"))
+
+# Total timeout per endpoint in seconds
+ENDPOINT_TIMEOUTS: Dict[str, float] = {
+    name: float(os.getenv(f"SHLOMO_TIMEOUT_{name.upper()}", default))
+    for name, default in {
+        "branches": "10",
+        "catalog": "20",
+        "availability": "15",
+        "details": "10",
+    }.items()
+}
+DEFAULT_TIMEOUT = float(os.getenv("SHLOMO_HTTP_TIMEOUT", "30"))
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SHLOMO_HEDGE_WORKERS", "32")), thread_name_prefix="shlomo-http"
+)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a host whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker for one host."""
+
+    def __init__(self, host: str, failures: int = BREAKER_FAILURES, reset_after: float = BREAKER_RESET) -> None:
+        self.host = host
+        self.failures = failures
+        self.reset_after = reset_after
+        self.state = "closed"
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_after:
+                self.state = "half_open"
+            # Half-open: let a single trial request through
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """End a request that says nothing about the host's health."""
+        with self._lock:
+            self._trial_running = False
+
+    def record(self, ok: bool) -> None:
+        """Record the outcome of a request."""
+        with self._lock:
+            self._trial_running = False
+            if ok:
+                self.state = "closed"
+                self._consecutive = 0
+                return
+            self._consecutive += 1
+            if self.state == "half_open" or self._consecutive >= self.failures:
+                if self.state != "open":
+                    logger.warning("Circuit breaker for %s opened", self.host)
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Token bucket limiting how many requests per second reach an upstream endpoint."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait for a token; a rate of 0 or less never waits.
+
+        Raises ``DeadlineExceeded`` if the turn deadline passes before the token is due.
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now, so waiters are served in arrival order
+            self._tokens -= 1
+            pause = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        left = deadline.remaining()
+        if left is not None and pause > left:
+            with self._lock:
+                self._tokens += 1
+            raise deadline.DeadlineExceeded("turn time budget exhausted waiting for the rate limit")
+        if pause > 0:
+            time.sleep(pause)
+
+
+def fan_out(executor: ThreadPoolExecutor, fn: Callable[[Any], Any], items: Sequence[Any], limit: int) -> List["Future[Any]"]:
+    """Run ``fn`` over ``items`` on a shared pool and return the finished futures in item order.
+
+    At most ``limit`` tasks are submitted at a time, so a large batch never
+    holds more pool workers than it can use and other callers are not queued
+    behind it. Each task runs in a copy of the caller's context, so the turn
+    deadline follows it into the pool.
+    """
+    futures: List["Future[Any]"] = []
+    running: Set["Future[Any]"] = set()
+    for item in items:
+        if len(running) >= max(1, limit):
+            _, running = wait(running, return_when=FIRST_COMPLETED)
+        future = executor.submit(contextvars.copy_context().run, fn, item)
+        futures.append(future)
+        running.add(future)
+    wait(running)
+    return futures
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+stats: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {"requests": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0, "rejected": 0}
+)
+_lock = threading.Lock()
+
+
+def get_breaker(base_url: str) -> CircuitBreaker:
+    """Return the circuit breaker of a backend host."""
+    with _lock:
+        if base_url not in _breakers:
+            _breakers[base_url] = CircuitBreaker(base_url)
+        return _breakers[base_url]
+
+
+def hedge_delay(endpoint: str) -> float:
+    """Return how long to wait before hedging: the endpoint's recent p95 latency."""
+    with _lock:
+        samples = sorted(_latencies[endpoint])
+    if len(samples) < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return max(HEDGE_MIN_DELAY, samples[int(0.95 * (len(samples) - 1))])
+
+
+def _backoff(attempt: int) -> float:
+    # Full jitter: anywhere between 0 and the exponential cap
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+
+
+def _retryable(response: Optional[httpx.Response], error: Optional[BaseException]) -> bool:
+    if error is not None:
+        return isinstance(error, httpx.TransportError)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+def _hedged(send: Callable[[], httpx.Response], endpoint: str) -> httpx.Response:
+    # Copy the context so the turn deadline also bounds rate-limit waits in the pool
+    first = _executor.submit(contextvars.copy_context().run, send)
+    done, _ = wait([first], timeout=hedge_delay(endpoint))
+    if done:
+        return first.result()
+
+    with _lock:
+        stats[endpoint]["hedges"] += 1
+    second = _executor.submit(contextvars.copy_context().run, send)
+    pending = {first, second}
+    error: Optional[BaseException] = None
+    response: Optional[httpx.Response] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if result.status_code not in RETRY_STATUSES:
+                if future is second:
+                    with _lock:
+                        stats[endpoint]["hedge_wins"] += 1
+                return result
+            response = result
+    if response is not None:
+        return response
+    assert error is not None
+    raise error
+
+
+def request(
+    base_url: str,
+    method: str,
+    path: str,
+    *,
+    endpoint: str,
+    idempotent: Optional[bool] = None,
+    limiter: Optional[RateLimiter] = None,
+    **kwargs: Any,
+) -> httpx.Response:
+    """Send a request to a backend host with retries, hedging and a circuit breaker.
+
+    ``idempotent`` defaults to True for GET; read-only POST searches pass it
+    explicitly. Non-idempotent requests are sent once, without hedging. With a
+    ``limiter``, every attempt sent upstream waits for its own token.
+    """
+    if idempotent is None:
+        idempotent = method.upper() == "GET"
+    breaker = get_breaker(base_url)
+    timeout = ENDPOINT_TIMEOUTS.get(endpoint, DEFAULT_TIMEOUT)
+    # Never wait past the turn deadline, whichever attempt or hedge is running
+    left = deadline.remaining()
+    if left is not None and left <= 0:
+        raise deadline.DeadlineExceeded(f"turn time budget exhausted before calling {endpoint}")
+    expires = None if left is None else time.perf_counter() + left
+    attempts = max(1, RETRY_ATTEMPTS) if idempotent else 1
+    host = httpx.URL(base_url).host
+
+    def send() -> httpx.Response:
+        if limiter is not None:
+            limiter.acquire()
+        start = time.perf_counter()
+        limit = timeout if expires is None else max(0.001, min(timeout, expires - start))
+        try:
+            response = get_client(base_url).request(method, path, timeout=limit, **kwargs)
+        except Exception as e:
+            metrics.observe("upstream_latency_seconds", time.perf_counter() - start, host=host, endpoint=endpoint, status=type(e).__name__)
+            raise
+        elapsed = time.perf_counter() - start
+        if response.status_code < 500:
+            with _lock:
+                _latencies[endpoint].append(elapsed)
+        metrics.observe("upstream_latency_seconds", elapsed, host=host, endpoint=endpoint, status=response.status_code)
+        metrics.observe("upstream_response_bytes", len(response.content), endpoint=endpoint)
+        return response
+
+    with _lock:
+        stats[endpoint]["requests"] += 1
+    for attempt in range(attempts):
+        if not breaker.allow():
+            with _lock:
+                stats[endpoint]["rejected"] += 1
+            raise CircuitOpenError(f"{base_url} is unavailable (circuit open), try again shortly")
+
+        response: Optional[httpx.Response] = None
+        error: Optional[BaseException] = None
+        try:
+            response = _hedged(send, endpoint) if idempotent and HEDGE_ENABLED else send()
+        except Exception as e:
+            error = e
+        if isinstance(error, deadline.DeadlineExceeded):
+            # Ran out of time waiting for a rate-limit token; the host was never called
+            breaker.release()
+            raise error
+        if isinstance(error, httpx.TimeoutException) and expires is not None and time.perf_counter() >= expires - 0.01:
+            # Cut short by the turn deadline, not by a slow backend: not a breaker failure
+            breaker.release()
+            raise deadline.DeadlineExceeded(f"turn time budget exhausted waiting for {endpoint}") from error
+        failed = error is not None or (response is not None and response.status_code >= 500)
+        breaker.record(not failed)
+        if failed:
+            with _lock:
+                stats[endpoint]["failures"] += 1
+
+        if attempt + 1 < attempts and _retryable(response, error):
+            pause = _backoff(attempt)
+            if expires is None or expires - time.perf_counter() > pause + HEDGE_MIN_DELAY:
+                with _lock:
+                    stats[endpoint]["retries"] += 1
+                time.sleep(pause)
+                continue
+        if error is not None:
+            raise error
+        assert response is not None
+        return response
+    raise AssertionError("unreachable")
+
+
+def resilience_info() -> Dict[str, Any]:
+    """Return per-endpoint counters and hedge delays, and per-host breaker states."""
+    with _lock:
+        endpoints = {name: dict(counters) for name, counters in stats.items()}
+        breakers = {host: breaker.state for host, breaker in _breakers.items()}
+    for name in endpoints:
+        endpoints[name]["hedge_delay"] = round(hedge_delay(name), 3)
+    return {"endpoints": endpoints, "breakers": breakers}
@@ -1,127 +1,116 @@
 from __future__ import annotations
 import os
-import httpx
-from typing import Annotated, TypedDict, Dict, Any, List
+import time
+from typing import Annotated, TypedDict, Dict, Any, List, Optional
 from langgraph.graph.message import add_messages
 from langchain_core.messages import AnyMessage, SystemMessage, AIMessage, HumanMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import merge_configs
 from langchain_core.tools import tool
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, START, END
-from dotenv import load_dotenv
 
-load_dotenv()
+from agent.car_details import get_car_details, get_car_details_batch
+from agent.catalog_index import SERVICE_TYPES, get_catalog_index
+from agent.catalogs import FIRST_HAND, LEASING, ZERO_KM, get_catalog
+from agent.checkpoint import get_checkpointer
+from agent.deadline import answer_within_budget, deadline_scope, timeout_kwargs, turn_budget
+from agent.history import HISTORY_TOKEN_BUDGETS, window_history
+from agent.metrics import instrument_node, record_llm_call, start_exporters_if_enabled
+from agent.registry import get_bound_llm
+from agent.tco import compare_offers, normalize_payment_preference
+from agent.tool_runner import EarlyToolCallHandler, execute_tool_calls
+from agent.warmup import start_warmup_if_enabled
 
-# Configuration
-llm = ChatOpenAI(model="gpt-4o", temperature=0.1)
-
-# Car categories mapping
-CAR_CATEGORIES = {
-    "מיני-משפחתיות": ["מיני", "קטן", "עירוני"],
-    "היברידי": ["היברידי", "הייברידי", "חשמלי חלקי"],
-    "קטנות": ["קטן", "קומפקטי", "חסכוני"],
-    "משפחתיות": ["משפחתי", "סדאן", "האצ'בק"],
-    "ג'יפונים/SUV": ["SUV", "ג'יפ", "גיפון", "קרוסאובר"],
-    "מנהלים / יוקרה": ["יוקרה", "מנהלים", "פרימיום"],
-    "7 מקומות ומיני וואן": ["7 מקומות", "מיני וואן", "ואן", "רב מקומות"],
-    "מסחריות": ["מסחרי", "נותן שירות", "עבודה"],
-    "חשמלי": ["חשמלי", "EV", "אלקטרי"]
-}
-
-# Manufacturers list
-MANUFACTURERS = [
-    "ב.מ.וו", "AIWAYS", "BMW", "BYD", "CHERY", "Geely", "Jaecoo", "KGM", "LEAP", 
-    "LYNK&CO", "MG", "ORA", "ZEEKR", "אאודי", "אופל", "אינפיניטי", "איסוזו", 
-    "אלפא רומיאו", "ב.מ.וו.", "ג'נסיס", "גנסיס", "דאצ'ה", "דאצה", "דונגפנג", 
-    "די אס", "די.אס", "הונדה", "וולוו", "טויוטה", "יונדאי", "לנד רובר", "לקסוס", 
-    "מאזדה", "מיצובישי", "מרצדס", "ניסאן", "סאנגיונג", "סובארו", "סוזוקי", 
-    "סיאט", "סיטרואן", "סקודה", "פולסטאר", "פולקסווגן", "פורד", "פורשה", 
-    "פיאט", "פיג'ו", "קאדילק", "קופרה", "קיה", "קרייזלר", "רנו", "שברולט"
-]
 
 @tool("get_first_hand_models")
 def get_first_hand_models_tool() -> dict:
     """Get all available first-hand car models from Shlomo SIXT sales."""
-    url = "https://sales-backend-prod.shlomo.co.il/api/shlomo/models"
-    
-    try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "first_hand", "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "first_hand"}
-    except Exception as e:
-        return {"error": str(e), "service_type": "first_hand"}
+    return get_catalog(FIRST_HAND)
 
 @tool("get_zero_km_cars")
 def get_zero_km_cars_tool() -> dict:
     """Get all available zero-km cars from Shlomo SIXT sales."""
-    url = "https://sales-backend-prod.shlomo.co.il/api/shlomo/zero-km-cars"
-    
-    try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "zero_km", "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "zero_km"}
-    except Exception as e:
-        return {"error": str(e), "service_type": "zero_km"}
+    return get_catalog(ZERO_KM)
 
 @tool("get_first_hand_car_details")
 def get_first_hand_car_details_tool(importer_model: str) -> dict:
     """Get detailed information about a specific first-hand car model."""
-    url = f"https://sales-backend-prod.shlomo.co.il/api/shlomo/first-hand-cars/{importer_model}"
-    
     try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "first_hand_details", "importer_model": importer_model, "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "first_hand_details"}
+        return {"service_type": "first_hand_details", "importer_model": importer_model, "data": get_car_details(FIRST_HAND, importer_model)}
     except Exception as e:
         return {"error": str(e), "service_type": "first_hand_details"}
 
 @tool("get_zero_km_car_details")
 def get_zero_km_car_details_tool(car_id: str) -> dict:
     """Get detailed information about a specific zero-km car."""
-    url = f"https://sales-backend-prod.shlomo.co.il/api/shlomo/zero-km-cars/{car_id}"
-    
     try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "zero_km_details", "car_id": car_id, "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "zero_km_details"}
+        return {"service_type": "zero_km_details", "car_id": car_id, "data": get_car_details(ZERO_KM, car_id)}
     except Exception as e:
         return {"error": str(e), "service_type": "zero_km_details"}
 
 @tool("get_leasing_cars")
 def get_leasing_cars_tool() -> dict:
     """Get all available leasing car models from Shlomo SIXT."""
-    url = "https://shlomo-leasing-backend-prod.shlomo.co.il/api/shlomo/leasing-cars"
-    
-    try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "leasing", "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "leasing"}
-    except Exception as e:
-        return {"error": str(e), "service_type": "leasing"}
+    return get_catalog(LEASING)
 
 @tool("get_leasing_car_details")
 def get_leasing_car_details_tool(car_id: str) -> dict:
     """Get detailed information about a specific leasing car model."""
-    url = f"https://shlomo-leasing-backend-prod.shlomo.co.il/api/shlomo/leasing-cars/{car_id}"
-    
     try:
-        response = httpx.get(url, timeout=30)
-        if response.status_code == 200:
-            return {"service_type": "leasing_details", "car_id": car_id, "data": response.json()}
-        else:
-            return {"error": f"HTTP {response.status_code}: {response.text}", "service_type": "leasing_details"}
+        return {"service_type": "leasing_details", "car_id": car_id, "data": get_car_details(LEASING, car_id)}
     except Exception as e:
         return {"error": str(e), "service_type": "leasing_details"}
 
+@tool("get_first_hand_cars_details")
+def get_first_hand_cars_details_tool(importer_models: List[str]) -> dict:
+    """Get details for several first-hand car models at once (up to 8). Prefer this over one call per car."""
+    return get_car_details_batch(FIRST_HAND, importer_models)
+
+@tool("get_zero_km_cars_details")
+def get_zero_km_cars_details_tool(car_ids: List[str]) -> dict:
+    """Get details for several zero-km cars at once (up to 8). Prefer this over one call per car."""
+    return get_car_details_batch(ZERO_KM, car_ids)
+
+@tool("get_leasing_cars_details")
+def get_leasing_cars_details_tool(car_ids: List[str]) -> dict:
+    """Get details for several leasing cars at once (up to 8). Prefer this over one call per car."""
+    return get_car_details_batch(LEASING, car_ids)
+
+@tool("search_sales_catalog")
+def search_sales_catalog_tool(
+    service_type: str = "any",        # "first_hand", "zero_km", "leasing", "any"
+    min_price: int = 0,
+    max_price: int = 0,
+    max_monthly_payment: int = 0,
+    category: str = "",
+    manufacturer: str = "",
+    limit: int = 10
+) -> dict:
+    """
+    Search all Shlomo SIXT sales catalogs (first-hand, zero-km, leasing) with filters.
+    Returns only the matching cars, cheapest first. 0 or empty means no filter.
+    """
+    try:
+        index = get_catalog_index()
+        total, cars = index.search(
+            limit=max(1, min(limit, 25)),
+            service_types=[service_type] if service_type in SERVICE_TYPES else None,
+            min_price=min_price,
+            max_price=max_price,
+            max_monthly=max_monthly_payment,
+            category=category,
+            manufacturer=manufacturer
+        )
+    except Exception as e:
+        return {"error": str(e), "service_type": "search"}
+    
+    result = {"service_type": "search", "total_matches": total, "cars": cars}
+    ignored = index.unknown_filters(category=category, manufacturer=manufacturer)
+    if ignored:
+        # Tell the model which values were not applied so it can ask the user
+        result["ignored_filters"] = ignored
+    return result
+
 @tool("compare_and_recommend")
 def compare_and_recommend_tool(
     user_budget: int,
@@ -131,36 +120,54 @@ def compare_and_recommend_tool(
 ) -> dict:
     """
     Compare deals across all Shlomo SIXT services and provide smart recommendations.
+    Ranks cars by total cost of ownership and effective monthly cost over 12-48 months.
     This tool should be used after gathering user preferences.
     """
     
-    recommendations = {
-        "user_criteria": {
-            "budget": user_budget,
-            "category": preferred_category,
-            "manufacturer": preferred_manufacturer,
-            "payment_preference": payment_preference
-        },
-        "analysis": "Based on your criteria, here are the best deals I found across our services:",
-        "recommendations": [],
-        "savings_potential": {}
+    user_criteria = {
+        "budget": user_budget,
+        "category": preferred_category,
+        "manufacturer": preferred_manufacturer,
+        "payment_preference": payment_preference
     }
     
-
+    try:
+        comparison = compare_offers(
+            get_catalog_index(),
+            user_budget,
+            preferred_category,
+            preferred_manufacturer,
+            normalize_payment_preference(payment_preference)
+        )
+    except Exception as e:
+        return {"error": str(e), "user_criteria": user_criteria}
     
-    # This is a placeholder for the comparison logic
-    # In a real implementation, this would:
-    # 1. Filter cars by criteria
-    # 2. Calculate monthly costs for each service
-    # 3. Compare total cost of ownership
-    # 4. Recommend the best value option
+    recommendations = {"user_criteria": user_criteria, **comparison}
     
     return recommendations
 
+SALES_TOOLS = [
+    search_sales_catalog_tool,
+    get_first_hand_models_tool,
+    get_zero_km_cars_tool,
+    get_first_hand_car_details_tool,
+    get_zero_km_car_details_tool,
+    get_leasing_cars_tool,
+    get_leasing_car_details_tool,
+    get_first_hand_cars_details_tool,
+    get_zero_km_cars_details_tool,
+    get_leasing_cars_details_tool,
+    compare_and_recommend_tool
+]
+
 # State definition
 class CarSalesState(TypedDict):
     messages: Annotated[list[AnyMessage], add_messages]
     user_preferences_complete: bool
+    history_summary: str            # rolling summary of messages outside the history window
+    summarized_count: int           # number of messages folded into history_summary
+    turn_deadline: Optional[float]  # time.time() by which the current turn must be answered
+    tool_loops: int                 # tool rounds already run in the current turn
 
 # Required user information for car sales
 sales_info_needed = "budget range and car type preference (family/SUV/economical/luxury)"
@@ -197,7 +204,8 @@ def has_user_preferences(messages):
     return has_budget and has_car_type
 
 # Main conversation handler
-def sales_assistant(state: CarSalesState):
+@instrument_node("sales")
+def sales_assistant(state: CarSalesState, config: RunnableConfig):
     """Main conversation node for car sales assistance"""
     
     system_message = SystemMessage(content=f"""
@@ -212,12 +220,18 @@ def sales_assistant(state: CarSalesState):
     1. If user hasn't specified preferences, ask about:
        - Budget range (תקציב)
        - Car type preference (משפחתי, SUV, חסכוני, יוקרה)
-    2. Once you have budget AND car type, IMMEDIATELY use search tools:
+    2. Once you have budget AND car type, IMMEDIATELY use search_sales_catalog with the user's filters
+       (max_price / max_monthly_payment, category, manufacturer). It searches all three services at once
+       and returns only matching cars. Use service_type="any" to cover every service.
+       Only if you need the full lists, use:
        - get_first_hand_models (for used cars with history)
        - get_zero_km_cars (for new cars at special prices)
        - get_leasing_cars (for monthly payment options)
-    3. Present ALL available cars from different services
-    4. Make intelligent comparisons and recommendations
+    3. Present ALL available cars from different services. When you need details for the cars you
+       present, fetch them in ONE call per service with get_first_hand_cars_details,
+       get_zero_km_cars_details or get_leasing_cars_details (lists of IDs), not one call per car
+    4. Make intelligent comparisons and recommendations - use compare_and_recommend to rank the
+       options by total cost of ownership and effective monthly cost instead of calculating yourself
     
     IMPORTANT: Always search across ALL three services to give comprehensive options!
     
@@ -274,26 +288,43 @@ def sales_assistant(state: CarSalesState):
     - Connect each feature to user's stated needs
     """)
     
-    messages = [system_message] + state["messages"]
-    response = llm.bind_tools([
-        get_first_hand_models_tool,
-        get_zero_km_cars_tool, 
-        get_first_hand_car_details_tool,
-        get_zero_km_car_details_tool,
-        get_leasing_cars_tool,
-        get_leasing_car_details_tool,
-        compare_and_recommend_tool
-    ]).invoke(messages)
+    # Recent turns verbatim, older ones folded into a rolling summary
+    history = window_history(
+        state["messages"],
+        HISTORY_TOKEN_BUDGETS["sales_assistant"],
+        state.get("history_summary", ""),
+        state.get("summarized_count", 0),
+    )
+    messages = [system_message] + history.messages
+    # Streams tokens to the graph's "messages" stream and starts tool calls as soon as they are complete.
+    # The turn's time budget bounds the call and the number of tool rounds.
+    budget = turn_budget(state)
+    start = time.perf_counter()
+    response = answer_within_budget(
+        "sales_assistant",
+        budget,
+        state["messages"],
+        lambda: get_bound_llm("sales_assistant", SALES_TOOLS).invoke(
+            messages, merge_configs(config, {"callbacks": [EarlyToolCallHandler(SALES_TOOLS)]}), **timeout_kwargs()
+        ),
+        lambda: get_bound_llm("sales_assistant.final", SALES_TOOLS, tool_choice="none").invoke(messages, config, **timeout_kwargs()),
+    )
+    record_llm_call("sales_assistant", state["messages"], response, time.perf_counter() - start)
     
     # Check if we now have complete user preferences
     preferences_complete = has_user_preferences(state["messages"] + [response])
     
     return {
         "messages": response,
-        "user_preferences_complete": preferences_complete
+        "user_preferences_complete": preferences_complete,
+        "history_summary": history.summary,
+        "summarized_count": history.summarized_count,
+        "turn_deadline": budget.deadline,
+        "tool_loops": budget.tool_loops
     }
 
 # Tool execution node
+@instrument_node("sales")
 def tool_executor(state: CarSalesState):
     """Execute tools when needed"""
     last_message = state["messages"][-1]
@@ -301,46 +332,10 @@ def tool_executor(state: CarSalesState):
     if not (isinstance(last_message, AIMessage) and hasattr(last_message, 'tool_calls')):
         return {"messages": []}
     
-    tool_results = []
-    
-    for tool_call in last_message.tool_calls:
-        try:
-            # Handle both object and dict formats for tool_call
-            tool_name = getattr(tool_call, 'name', tool_call.get('name', ''))
-            tool_args = getattr(tool_call, 'args', tool_call.get('args', {}))
-            tool_id = getattr(tool_call, 'id', tool_call.get('id', 'unknown'))
-            
-            if tool_name == "get_first_hand_models":
-                result = get_first_hand_models_tool.invoke(tool_args)
-            elif tool_name == "get_zero_km_cars":
-                result = get_zero_km_cars_tool.invoke(tool_args)
-            elif tool_name == "get_first_hand_car_details":
-                result = get_first_hand_car_details_tool.invoke(tool_args)
-            elif tool_name == "get_zero_km_car_details":
-                result = get_zero_km_car_details_tool.invoke(tool_args)
-            elif tool_name == "get_leasing_cars":
-                result = get_leasing_cars_tool.invoke(tool_args)
-            elif tool_name == "get_leasing_car_details":
-                result = get_leasing_car_details_tool.invoke(tool_args)
-            elif tool_name == "compare_and_recommend":
-                result = compare_and_recommend_tool.invoke(tool_args)
-            else:
-                result = f"Unknown tool: {tool_name}"
-            
-            tool_results.append(ToolMessage(
-                content=result,
-                tool_call_id=tool_id
-            ))
-            
-        except Exception as e:
-            # Handle tool_id safely for error case too
-            tool_id = getattr(tool_call, 'id', tool_call.get('id', 'unknown'))
-            tool_results.append(ToolMessage(
-                content=f"Error: {str(e)}",
-                tool_call_id=tool_id
-            ))
-    
-    return {"messages": tool_results}
+    with deadline_scope(state.get("turn_deadline")):
+        tool_results = execute_tool_calls(last_message.tool_calls, SALES_TOOLS)
+    
+    return {"messages": tool_results, "tool_loops": state.get("tool_loops", 0) + 1}
 
 # Build the graph
 graph_builder = StateGraph(CarSalesState)
@@ -388,4 +383,7 @@ graph_builder.add_conditional_edges(
 )
 
 # Compile the graph
-graph = graph_builder.compile()
+graph = graph_builder.compile(checkpointer=get_checkpointer())
+
+start_warmup_if_enabled()
+start_exporters_if_enabled()
@@ -0,0 +1,230 @@
+"""Local stand-ins for the Shlomo SIXT backends and the chat model.
+
+``StandInBackends`` answers every REST endpoint the tools call (branches,
+availability, the three sales catalogs and their car details) from generated
+data through ``httpx.MockTransport``, with an optional per-request latency,
+and counts the calls. ``ScriptedChatModel`` replies to each user message
+from a script: a scripted message gets its tool calls, anything else (and
+every turn after a tool result) gets a plain text reply. It reports token
+usage like a real model so prompts can be measured without an API key.
+
+Used by the benchmark suite and the tests; nothing here touches the network.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Union
+
+import httpx
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field, PrivateAttr
+
+from agent import http_client
+from agent.history import estimate_tokens
+from agent.message_utils import message_text
+
+MANUFACTURERS = ("טויוטה", "יונדאי", "קיה", "סקודה", "BMW", "מאזדה")
+CATEGORIES = ("משפחתי", "SUV", "קטנות", "מנהלים")
+
+# Tool call arguments, or a function building them from the prompt messages
+ToolArgs = Union[Dict[str, Any], Callable[[Sequence[BaseMessage]], Dict[str, Any]]]
+ScriptedCall = Dict[str, Any]
+
+
+def _branches(count: int) -> List[Dict[str, Any]]:
+    return [
+        {"branchCode": i, "branchName": f"סניף {i}", "branchNameEn": f"Branch {i}", "city": f"עיר {i % 12}"}
+        for i in range(1, count + 1)
+    ]
+
+
+def _car_groups(count: int) -> List[Dict[str, Any]]:
+    return [
+        {
+            "groupCode": i,
+            "groupTypeHe": f"קבוצה {i}",
+            "amountIncDiscountIncVat": 150 + (i * 37) % 400,
+            "statusHe": "זמין" if i % 5 else "לפי בקשה",
+            # Fields the real backend sends that the tools project away
+            "groupDescriptionEn": f"Group {i} - compact, automatic, air conditioning",
+            "images": [f"https://cdn.example/cars/{i}/{n}.jpg" for n in range(3)],
+            "extras": [{"code": n, "nameHe": f"תוספת {n}", "price": 20 + n} for n in range(5)],
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def _catalog(prefix: str, count: int, monthly: bool = False) -> List[Dict[str, Any]]:
+    cars = []
+    for i in range(1, count + 1):
+        car: Dict[str, Any] = {
+            "id": f"{prefix}{i}",
+            "model": f"דגם {i}",
+            "manufacturer": MANUFACTURERS[i % len(MANUFACTURERS)],
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "year": 2020 + i % 5,
+        }
+        if monthly:
+            car["monthlyPayment"] = 1800 + (i * 97) % 2500
+        else:
+            car["price"] = 70000 + (i * 7919) % 180000
+        cars.append(car)
+    return cars
+
+
+def _details(car_id: str) -> Dict[str, Any]:
+    return {
+        "id": car_id,
+        "engine": "1.6 בנזין",
+        "gearbox": "אוטומטי",
+        "seats": 5,
+        "safety": {"airbags": 7, "rating": 5},
+        "equipment": [f"אבזור {n}" for n in range(12)],
+        "warranty": "",
+        "notes": None,
+    }
+
+
+class StandInBackends:
+    """In-process stand-ins for the rental, sales and leasing backends."""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        branches: int = 60,
+        car_groups: int = 30,
+        catalog_size: int = 40,
+    ) -> None:
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._lock = threading.Lock()
+        self._routes: Dict[tuple[str, str], Any] = {
+            ("POST", "/api/v1/rent/branches"): _branches(branches),
+            ("POST", "/api/v1/rent/all-groups"): _car_groups(car_groups),
+            ("GET", "/api/shlomo/models"): {"data": _catalog("FH", catalog_size)},
+            ("GET", "/api/shlomo/zero-km-cars"): _catalog("ZK", catalog_size),
+            ("GET", "/api/shlomo/leasing-cars"): _catalog("LS", catalog_size, monthly=True),
+        }
+
+    @property
+    def total_calls(self) -> int:
+        """Return the number of requests served so far."""
+        with self._lock:
+            return sum(self.calls.values())
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        """Answer one request like the real backend would."""
+        path = request.url.path
+        with self._lock:
+            self.calls[f"{request.method} {path}"] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        payload = self._routes.get((request.method, path))
+        if payload is not None:
+            return httpx.Response(200, json=payload)
+        detail_prefixes = ("/api/shlomo/first-hand-cars/", "/api/shlomo/zero-km-cars/", "/api/shlomo/leasing-cars/")
+        if request.method == "GET" and path.startswith(detail_prefixes):
+            return httpx.Response(200, json=_details(path.rsplit("/", 1)[-1]))
+        return httpx.Response(404, text=f"No stand-in for {request.method} {path}")
+
+    def install(self) -> None:
+        """Route the shared HTTP clients to the stand-ins and empty every backend cache."""
+        transport = httpx.MockTransport(self.handle)
+        for base_url in (http_client.RENT_BASE_URL, http_client.SALES_BASE_URL, http_client.LEASING_BASE_URL):
+            http_client.set_client(base_url, http_client.build_client(base_url, transport=transport))
+        reset_backend_caches()
+
+    def uninstall(self) -> None:
+        """Close the stand-in clients so the next call builds real ones."""
+        http_client.close_clients()
+        reset_backend_caches()
+
+
+def reset_backend_caches() -> None:
+    """Empty the branch, catalog, availability and car detail caches."""
+    from agent.availability import availability_cache
+    from agent.branches import branch_cache
+    from agent.car_details import details_cache
+    from agent.catalogs import CATALOG_CACHES
+
+    branch_cache.invalidate()
+    for cache in CATALOG_CACHES.values():
+        cache.invalidate()
+    availability_cache.invalidate()
+    details_cache.invalidate()
+
+
+def _words(count: int) -> str:
+    words = ("בשמחה", "אשמח", "לעזור", "לך", "עם", "הרכב", "המתאים", "ביותר", "עבורך", "היום")
+    return " ".join(words[i % len(words)] for i in range(count))
+
+
+class ScriptedChatModel(BaseChatModel):
+    """Chat model that answers from a script keyed by the latest user message."""
+
+    script: Dict[str, List[ScriptedCall]] = Field(default_factory=dict)
+    # Words in a plain reply and in the answer that follows tool results
+    reply_words: int = 40
+    answer_words: int = 120
+    latency: float = 0.0
+    stats: Dict[str, int] = Field(default_factory=lambda: {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted-chat"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "ScriptedChatModel":
+        """Return the model itself; the script decides which tools are called."""
+        return self
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        last = messages[-1] if messages else None
+        calls = self.script.get(message_text(last).strip(), []) if isinstance(last, HumanMessage) else []
+        if calls:
+            message = AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": call["name"],
+                        "args": call["args"](messages) if callable(call.get("args")) else dict(call.get("args") or {}),
+                        "id": f"call_{uuid.uuid4().hex[:12]}",
+                    }
+                    for call in calls
+                ],
+            )
+        else:
+            message = AIMessage(content=_words(self.reply_words if isinstance(last, HumanMessage) else self.answer_words))
+
+        prompt_tokens = sum(estimate_tokens(m) for m in messages)
+        completion_tokens = estimate_tokens(message)
+        message.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def snapshot(self) -> Dict[str, int]:
+        """Return a copy of the call and token counters."""
+        with self._lock:
+            return dict(self.stats)
@@ -0,0 +1,177 @@
+"""Vectorized total-cost-of-ownership comparison across sales services.
+
+Every candidate car from the catalog index is costed at once as NumPy arrays
+over a grid of holding periods (cars x periods) and checked against a grid of
+budgets (budgets x cars). Bought cars (first-hand, zero-km) pay the price,
+lose value over time, tie up capital and carry running costs; operating
+leasing pays the monthly fee, which already includes insurance and
+maintenance.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from agent.catalog_index import (
+    CANONICAL_MANUFACTURERS,
+    CATEGORY_NAMES,
+    SERVICE_TYPES,
+    CatalogIndex,
+    canonical_category,
+    canonical_manufacturer,
+)
+from agent.catalogs import FIRST_HAND, LEASING, ZERO_KM
+
+HOLDING_PERIODS_MONTHS = (12, 24, 36, 48)
+DEFAULT_HOLDING_MONTHS = int(os.getenv("SHLOMO_TCO_HOLDING_MONTHS", "36"))
+BUDGET_GRID = (0.8, 1.0, 1.2)
+
+# Yearly loss of value for a car that is bought
+ANNUAL_DEPRECIATION = {
+    FIRST_HAND: float(os.getenv("SHLOMO_TCO_DEPRECIATION_FIRST_HAND", "0.12")),
+    ZERO_KM: float(os.getenv("SHLOMO_TCO_DEPRECIATION_ZERO_KM", "0.15")),
+    LEASING: 0.0,
+}
+# Insurance, maintenance and licensing for an owned car (included in leasing)
+ANNUAL_RUNNING_COST = float(os.getenv("SHLOMO_TCO_ANNUAL_RUNNING_COST", "7000"))
+# Cost of capital / financing rate for bought cars
+ANNUAL_INTEREST_RATE = float(os.getenv("SHLOMO_TCO_INTEREST_RATE", "0.06"))
+LOAN_MONTHS = int(os.getenv("SHLOMO_TCO_LOAN_MONTHS", "60"))
+
+# Budgets below this are read as a monthly budget
+MONTHLY_BUDGET_THRESHOLD = 20000
+
+CATEGORY_BONUS = 0.15
+MANUFACTURER_BONUS = 0.10
+
+
+def monthly_installment(principal: np.ndarray, annual_rate: float = ANNUAL_INTEREST_RATE, months: int = LOAN_MONTHS) -> np.ndarray:
+    """Return the fixed monthly loan payment for each principal."""
+    rate = annual_rate / 12
+    if rate == 0:
+        return principal / months
+    return principal * rate / (1 - (1 + rate) ** -months)
+
+
+def total_cost_of_ownership(
+    price: np.ndarray,
+    monthly: np.ndarray,
+    service: np.ndarray,
+    periods: Sequence[int] = HOLDING_PERIODS_MONTHS,
+) -> np.ndarray:
+    """Return the TCO of every car for every holding period (cars x periods)."""
+    months = np.asarray(periods, dtype=np.float64)[None, :]
+    years = months / 12
+
+    depreciation = np.array([ANNUAL_DEPRECIATION[s] for s in SERVICE_TYPES])[service][:, None]
+    owned_price = price[:, None]
+    residual = owned_price * (1 - depreciation) ** years
+    capital_cost = owned_price * ((1 + ANNUAL_INTEREST_RATE) ** years - 1)
+    owned = owned_price - residual + capital_cost + ANNUAL_RUNNING_COST * years
+
+    leased = monthly[:, None] * months
+    is_leasing = (service == SERVICE_TYPES.index(LEASING))[:, None]
+    return np.where(is_leasing, leased, owned)
+
+
+def compare_offers(
+    index: CatalogIndex,
+    user_budget: float,
+    preferred_category: str = "",
+    preferred_manufacturer: str = "",
+    payment_preference: str = "any",
+    top_n: int = 4,
+    periods: Sequence[int] = HOLDING_PERIODS_MONTHS,
+) -> Dict[str, Any]:
+    """Rank every catalog car by effective monthly cost against the user's criteria."""
+    monthly_budget = payment_preference == "monthly" or 0 < user_budget < MONTHLY_BUDGET_THRESHOLD
+    periods = sorted(set(periods) | {DEFAULT_HOLDING_MONTHS})
+    default_column = periods.index(DEFAULT_HOLDING_MONTHS)
+
+    candidates = index.mask(service_types=[FIRST_HAND, ZERO_KM] if payment_preference == "cash" else None)
+    rows = np.flatnonzero(candidates)
+    price, monthly, service = index.price[rows], index.monthly[rows], index.service[rows]
+
+    tco = total_cost_of_ownership(price, monthly, service, periods)
+    effective_monthly = tco / np.asarray(periods, dtype=np.float64)[None, :]
+
+    # What the budget is compared with: the monthly outlay or the upfront/committed amount
+    is_leasing = service == SERVICE_TYPES.index(LEASING)
+    if monthly_budget:
+        outlay = np.where(is_leasing, monthly, monthly_installment(price))
+    else:
+        outlay = np.where(is_leasing, monthly * DEFAULT_HOLDING_MONTHS, price)
+
+    budgets = user_budget * np.asarray(BUDGET_GRID)
+    fits = outlay[None, :] <= budgets[:, None]      # budgets x cars
+    within_budget = fits[BUDGET_GRID.index(1.0)] if user_budget > 0 else np.ones(len(rows), dtype=bool)
+
+    # Lower score is better: cost at the default period, discounted for matching preferences
+    category = canonical_category(preferred_category)
+    manufacturer = canonical_manufacturer(preferred_manufacturer)
+    discount = np.ones(len(rows))
+    if category:
+        discount -= CATEGORY_BONUS * (index.category[rows] == CATEGORY_NAMES.index(category))
+    if manufacturer:
+        discount -= MANUFACTURER_BONUS * (index.manufacturer[rows] == CANONICAL_MANUFACTURERS.index(manufacturer))
+    score = effective_monthly[:, default_column] * discount
+
+    valid = ~np.isnan(score)
+    # Prefer cars within budget; fall back to the closest ones if nothing fits
+    pool = valid & within_budget if (valid & within_budget).any() else valid
+    ranked = np.flatnonzero(pool)[np.argsort(score[pool], kind="stable")][:top_n]
+
+    recommendations: List[Dict[str, Any]] = []
+    for i in ranked:
+        row = dict(index.rows[rows[i]])
+        row = {k: v for k, v in row.items() if v is not None and not (isinstance(v, float) and np.isnan(v))}
+        row.update({
+            "effective_monthly_cost": {str(m): round(float(c)) for m, c in zip(periods, effective_monthly[i])},
+            "total_cost": {str(m): round(float(c)) for m, c in zip(periods, tco[i])},
+            "best_holding_months": int(periods[int(np.nanargmin(effective_monthly[i]))]),
+            "fits_budget": bool(within_budget[i]),
+            "fits_budget_at": [round(float(b)) for b, ok in zip(budgets, fits[:, i]) if ok],
+        })
+        recommendations.append(row)
+
+    savings: Dict[str, Any] = {}
+    if len(ranked) >= 2:
+        best, runner_up = effective_monthly[ranked[0], default_column], effective_monthly[ranked[1], default_column]
+        savings["monthly_vs_next_best"] = round(float(runner_up - best))
+        savings["total_vs_next_best"] = round(float((runner_up - best) * DEFAULT_HOLDING_MONTHS))
+    if len(ranked):
+        cheapest_by_service = {}
+        for code, name in enumerate(SERVICE_TYPES):
+            in_service = pool & (service == code)
+            if in_service.any():
+                cheapest_by_service[name] = round(float(np.nanmin(effective_monthly[in_service, default_column])))
+        savings["cheapest_monthly_by_service"] = cheapest_by_service
+
+    return {
+        "analysis": (
+            f"{int(pool.sum())} of {len(rows)} cars compared by effective monthly cost over "
+            f"{DEFAULT_HOLDING_MONTHS} months ({'monthly' if monthly_budget else 'total'} budget)."
+        ),
+        "assumptions": {
+            "holding_periods_months": list(periods),
+            "annual_depreciation": ANNUAL_DEPRECIATION,
+            "annual_running_cost_owned": ANNUAL_RUNNING_COST,
+            "annual_interest_rate": ANNUAL_INTEREST_RATE,
+            "loan_months": LOAN_MONTHS,
+        },
+        "recommendations": recommendations,
+        "savings_potential": savings,
+    }
+
+
+def normalize_payment_preference(value: Optional[str]) -> str:
+    """Map free-form payment preferences to "cash", "monthly" or "any"."""
+    value = (value or "any").strip().lower()
+    if value in ("cash", "מזומן", "תשלום אחד"):
+        return "cash"
+    if value in ("monthly", "חודשי", "תשלומים", "ליסינג", "leasing"):
+        return "monthly"
+    return "any"
@@ -0,0 +1,207 @@
+"""Concurrent execution of the tool calls in one AIMessage.
+
+Tool calls can also be started while the model is still streaming: the
+assistant nodes attach an ``EarlyToolCallHandler`` that assembles the
+streamed tool-call chunks and starts each call as soon as it is complete.
+``execute_tool_calls`` then picks up the running call instead of starting it
+again. Early calls take slots of the same per-message ``SHLOMO_TOOL_CONCURRENCY``
+limit as the calls started by ``execute_tool_calls``.
+"""
+
+from __future__ import annotations
+
+import contextvars
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+from agent import deadline, metrics
+
+# Max tool calls from a single AIMessage that run at the same time
+TOOL_CONCURRENCY = int(os.getenv("SHLOMO_TOOL_CONCURRENCY", "4"))
+
+# Process-wide worker threads shared by all sessions
+TOOL_WORKERS = int(os.getenv("SHLOMO_TOOL_WORKERS", "32"))
+
+# Tool calls started before their AIMessage was complete (bounded, oldest dropped first)
+EARLY_CALLS_LIMIT = 256
+
+_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="shlomo-tool")
+_early_calls: "OrderedDict[Tuple[str, str, str], Tuple[Future[ToolMessage], threading.BoundedSemaphore]]" = OrderedDict()
+_early_lock = threading.Lock()
+
+
+def _call_field(tool_call: Any, field: str, default: Any) -> Any:
+    # Handle both object and dict formats for tool_call
+    if isinstance(tool_call, dict):
+        return tool_call.get(field, default)
+    return getattr(tool_call, field, default)
+
+
+def run_tool_call(tool_call: Any, tools_by_name: Dict[str, BaseTool]) -> ToolMessage:
+    """Run a single tool call and wrap the result (or error) in a ToolMessage."""
+    tool_id = _call_field(tool_call, "id", "unknown")
+    tool_name = _call_field(tool_call, "name", "")
+    start = time.perf_counter()
+    try:
+        tool_args = _call_field(tool_call, "args", {})
+
+        selected_tool = tools_by_name.get(tool_name)
+        if selected_tool is None:
+            result = f"Unknown tool: {tool_name}"
+        else:
+            result = selected_tool.invoke(tool_args)
+
+        message = ToolMessage(content=result, tool_call_id=tool_id)
+        status = "ok"
+    except Exception as e:
+        message = ToolMessage(content=f"Error: {str(e)}", tool_call_id=tool_id)
+        status = "error"
+    if metrics.ENABLED:
+        metrics.observe("tool_latency_seconds", time.perf_counter() - start, tool=tool_name, status=status)
+        metrics.observe("tool_result_chars", len(str(message.content)), tool=tool_name)
+    return message
+
+
+def _run_limited(tool_call: Any, tools_by_name: Dict[str, BaseTool], limit: threading.BoundedSemaphore) -> ToolMessage:
+    with limit:
+        # A call that waited for a slot past the deadline is not started at all
+        left = deadline.remaining()
+        if left is not None and left <= 0:
+            return _timed_out(tool_call)
+        return run_tool_call(tool_call, tools_by_name)
+
+
+def _concurrency_limit(max_concurrency: Optional[int] = None) -> threading.BoundedSemaphore:
+    return threading.BoundedSemaphore(max(1, max_concurrency or TOOL_CONCURRENCY))
+
+
+def _early_key(tool_call: Any) -> Tuple[str, str, str]:
+    # Keyed on the full call so a cached response with a reused id never picks up another call's result
+    args = json.dumps(_call_field(tool_call, "args", {}), sort_keys=True, ensure_ascii=False, default=str)
+    return str(_call_field(tool_call, "id", "")), str(_call_field(tool_call, "name", "")), args
+
+
+def start_tool_call(tool_call: Any, tools: Iterable[BaseTool], limit: threading.BoundedSemaphore) -> None:
+    """Start a complete tool call in the background before its AIMessage has finished.
+
+    ``limit`` is the concurrency limit of the message the call belongs to.
+    """
+    key = _early_key(tool_call)
+    tools_by_name = {t.name: t for t in tools}
+    with _early_lock:
+        if key in _early_calls:
+            return
+        future = _executor.submit(contextvars.copy_context().run, _run_limited, tool_call, tools_by_name, limit)
+        _early_calls[key] = (future, limit)
+        while len(_early_calls) > EARLY_CALLS_LIMIT:
+            _early_calls.popitem(last=False)
+
+
+def _take_early_call(tool_call: Any) -> Optional[Tuple["Future[ToolMessage]", threading.BoundedSemaphore]]:
+    with _early_lock:
+        return _early_calls.pop(_early_key(tool_call), None)
+
+
+class EarlyToolCallHandler(BaseCallbackHandler):
+    """Assemble streamed tool-call chunks and start each call once it is complete.
+
+    The model streams tool calls one after another, so a chunk for a new
+    index means every earlier call is complete; the rest start when the
+    model finishes.
+    """
+
+    def __init__(self, tools: Iterable[BaseTool]) -> None:
+        self.tools = list(tools)
+        # One handler per model call, so this is the per-message limit
+        self.limit = _concurrency_limit()
+        self._calls: Dict[int, Dict[str, str]] = {}
+        self._started: Set[int] = set()
+
+    def on_llm_new_token(self, token: str, *, chunk: Any = None, **kwargs: Any) -> None:
+        message = getattr(chunk, "message", None)
+        for part in getattr(message, "tool_call_chunks", None) or []:
+            index = part.get("index") or 0
+            call = self._calls.setdefault(index, {"id": "", "name": "", "args": ""})
+            for field in ("id", "name", "args"):
+                call[field] += part.get(field) or ""
+            for earlier in [i for i in self._calls if i < index]:
+                self._start(earlier)
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        for index in list(self._calls):
+            self._start(index)
+
+    def _start(self, index: int) -> None:
+        call = self._calls[index]
+        if index in self._started or not call["id"] or not call["name"]:
+            return
+        try:
+            args = json.loads(call["args"] or "{}")
+        except ValueError:
+            # Malformed arguments are left to the regular tool executor
+            return
+        self._started.add(index)
+        start_tool_call({"id": call["id"], "name": call["name"], "args": args}, self.tools, self.limit)
+
+
+def execute_tool_calls(
+    tool_calls: Iterable[Any],
+    tools: Iterable[BaseTool],
+    max_concurrency: Optional[int] = None,
+) -> List[ToolMessage]:
+    """Run tool calls concurrently and return their ToolMessages in call order.
+
+    Every call is isolated: an exception in one tool becomes an error
+    ToolMessage for that call and never cancels the others. Calls already
+    started while the model was streaming are awaited, not run again. Calls
+    still running at the turn deadline are reported as timed out; their backend
+    requests carry the time left as their timeout, so the workers are freed
+    at the deadline too.
+    """
+    calls = list(tool_calls)
+    tools_by_name = {t.name: t for t in tools}
+
+    taken = [_take_early_call(call) for call in calls]
+    early = [entry[0] if entry else None for entry in taken]
+    left = deadline.remaining()
+    if left is None and not any(early) and len(calls) <= 1:
+        return [run_tool_call(call, tools_by_name) for call in calls]
+    if left is not None and left <= 0:
+        for started in early:
+            if started is not None:
+                started.cancel()
+        return [_timed_out(call) for call in calls]
+
+    # Calls not started early share the slots of the ones that were
+    limit = next((entry[1] for entry in taken if entry), None) or _concurrency_limit(max_concurrency)
+
+    # Copy the caller's context so tracing callbacks follow the tool into the worker
+    futures = [
+        started or _executor.submit(contextvars.copy_context().run, _run_limited, call, tools_by_name, limit)
+        for call, started in zip(calls, early)
+    ]
+    if left is None:
+        return [future.result() for future in futures]
+
+    done, pending = wait(futures, timeout=left)
+    for future in pending:
+        # Only drops calls still queued; running ones stop at their request timeouts
+        future.cancel()
+    return [future.result() if future in done else _timed_out(call) for call, future in zip(calls, futures)]
+
+
+def _timed_out(tool_call: Any) -> ToolMessage:
+    metrics.inc("tool_timeouts_total", tool=_call_field(tool_call, "name", ""))
+    return ToolMessage(
+        content="Error: the turn's time budget ran out before this tool finished",
+        tool_call_id=_call_field(tool_call, "id", "unknown"),
+    )
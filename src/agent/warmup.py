@@ -0,0 +1,120 @@
+"""Optional warm-up stage for the agent graphs.
+
+With ``SHLOMO_WARMUP=true`` the first graph module to load starts a
+background thread that builds the shared model and tool-bound runnables,
+opens the connections to OpenAI and the Shlomo backends and preloads the
+branch list and sales catalogs, so the first real request does not pay for
+any of it. Every step is timed into ``registry.startup_timings``.
+
+Run ``python -m agent.warmup`` to measure cold start and warm-up times.
+"""
+
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict
+
+from agent.registry import record_timing, startup_timings
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("SHLOMO_WARMUP", "false").lower() == "true"
+# Pre-open the TLS connection to OpenAI with a lightweight authenticated request
+WARMUP_OPENAI = os.getenv("SHLOMO_WARMUP_OPENAI", "true").lower() == "true"
+
+GRAPH_MODULES = ("agent.rent_cars_agent", "agent.sales_cars_agent", "agent.master_agent")
+
+_started = False
+_started_lock = threading.Lock()
+
+
+def _bind_tools() -> None:
+    from agent.registry import get_bound_llm
+    from agent.rent_cars_agent import RENTAL_TOOLS
+    from agent.sales_cars_agent import SALES_TOOLS
+
+    get_bound_llm("rental_assistant", RENTAL_TOOLS)
+    get_bound_llm("sales_assistant", SALES_TOOLS)
+
+
+def _open_openai_connection() -> None:
+    from agent.registry import get_llm
+
+    client = getattr(get_llm(), "root_client", None)
+    if client is not None:
+        client.models.list()
+
+
+def _preload_branches() -> None:
+    from agent.branch_index import get_branch_index
+
+    # Loads the branch list and builds the name index over it
+    get_branch_index()
+
+
+def _preload_catalogs() -> None:
+    from agent.catalog_index import get_catalog_index
+
+    # Loads every catalog snapshot and builds the index over them
+    get_catalog_index()
+
+
+def warm_up() -> Dict[str, float]:
+    """Run every warm-up step concurrently and return the recorded timings."""
+    steps: Dict[str, Callable[[], None]] = {
+        "bind_tools": _bind_tools,
+        "branches": _preload_branches,
+        "catalogs": _preload_catalogs,
+    }
+    if WARMUP_OPENAI:
+        steps["openai_connection"] = _open_openai_connection
+
+    def run(name: str, step: Callable[[], None]) -> None:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning("Warm-up step %s failed", name, exc_info=True)
+            return
+        record_timing(f"warmup.{name}", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="shlomo-warmup") as pool:
+        for name, step in steps.items():
+            pool.submit(run, name, step)
+    record_timing("warmup.total", time.perf_counter() - start)
+
+    logger.info("Warm-up finished: %s", json.dumps(startup_timings))
+    return dict(startup_timings)
+
+
+def start_warmup_if_enabled() -> None:
+    """Start the warm-up in a background thread once, if SHLOMO_WARMUP is set."""
+    global _started
+    if not WARMUP_ENABLED:
+        return
+    with _started_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_up, name="shlomo-warmup", daemon=True).start()
+
+
+def main() -> None:
+    """Measure the cold import of every graph module, then warm up and report."""
+    for module in GRAPH_MODULES:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        record_timing(f"import.{module}", time.perf_counter() - start)
+    warm_up()
+    print(json.dumps(startup_timings, indent=2))  # noqa: T201
+
+
+if __name__ == "__main__":
+    main()
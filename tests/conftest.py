@@ -1,5 +1,10 @@
+import os
+
 import pytest
 
+# Tests that reach registry.get_llm() build a real ChatOpenAI client, which needs a key
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+
 
 @pytest.fixture(scope="session")
 def anyio_backend():
@@ -0,0 +1,155 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from agent import availability, deadline, http_client
+
+SLOTS = {
+    "fromDate": "28/08/2030",
+    "fromTime": "10:00",
+    "toDate": "30/08/2030",
+    "toTime": "10:00",
+    "pickupBranch": 49,
+    "returnBranch": 49,
+}
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    availability.availability_cache.invalidate()
+    yield
+    availability.availability_cache.invalidate()
+
+
+def _mock_backend(seen, release=None):
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        if release is not None:
+            release.wait(2)
+        return httpx.Response(200, json=[{"groupCode": len(seen)}])
+
+    http_client.set_client(
+        http_client.RENT_BASE_URL,
+        http_client.build_client(http_client.RENT_BASE_URL, transport=httpx.MockTransport(handler)),
+    )
+
+
+def test_matching_search_uses_the_prefetched_response(monkeypatch) -> None:
+    from agent.rent_cars_agent import search_available_cars_tool
+
+    monkeypatch.setattr(availability, "PREFETCH_ENABLED", True)
+    seen = []
+    release = threading.Event()
+    _mock_backend(seen, release)
+    try:
+        assert availability.prefetch_availability(SLOTS)
+        assert not availability.prefetch_availability(SLOTS)
+        while not seen:
+            pass
+        release.set()
+        # The model sends the branch as a string - still the same search, joining the prefetch
+        result = search_available_cars_tool.invoke({**SLOTS, "pickupBranch": "49"})
+        assert result["cars"] == [{"groupCode": 1}]
+        assert len(seen) == 1
+
+        # A different search goes to the backend
+        assert search_available_cars_tool.invoke({**SLOTS, "toDate": "31/08/2030"})["cars"] == [{"groupCode": 2}]
+        assert len(seen) == 2
+    finally:
+        http_client.close_clients()
+
+
+def test_prefetches_are_bounded_and_waiting_for_one_stops_at_the_deadline(monkeypatch) -> None:
+    from agent.rent_cars_agent import search_available_cars_tool
+
+    monkeypatch.setattr(availability, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(availability, "PREFETCH_SIZE", 2)
+    seen = []
+    release = threading.Event()
+    _mock_backend(seen, release)
+    try:
+        started = [availability.prefetch_availability({**SLOTS, "fromDate": f"{day}/08/2030"}) for day in ("01", "02", "03")]
+        assert started == [True, True, False]
+
+        with deadline.deadline_scope(time.time() + 0.1):
+            begin = time.perf_counter()
+            result = search_available_cars_tool.invoke({**SLOTS, "fromDate": "01/08/2030"})
+        assert "time budget" in result["error"]
+        assert time.perf_counter() - begin < 1
+    finally:
+        release.set()
+        while availability._prefetching:
+            time.sleep(0.01)
+        http_client.close_clients()
+
+
+def test_prefetch_is_off_by_default_and_needs_complete_slots(monkeypatch) -> None:
+    assert not availability.prefetch_availability(SLOTS)
+    monkeypatch.setattr(availability, "PREFETCH_ENABLED", True)
+    assert not availability.prefetch_availability({"fromDate": "28/08/2030"})
+
+
+def test_identical_searches_share_one_upstream_call() -> None:
+    from agent.rent_cars_agent import search_available_cars_tool
+
+    seen = []
+    release = threading.Event()
+    _mock_backend(seen, release)
+    results = []
+    before = availability.availability_cache.info()
+    try:
+        threads = [threading.Thread(target=lambda: results.append(search_available_cars_tool.invoke(SLOTS))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        while not seen:
+            pass
+        release.set()
+        for thread in threads:
+            thread.join()
+        # Within the TTL a repeat search is served from the cache
+        results.append(search_available_cars_tool.invoke(SLOTS))
+    finally:
+        http_client.close_clients()
+
+    assert len(seen) == 1
+    assert all(result["cars"] == [{"groupCode": 1}] for result in results)
+    info = availability.availability_cache.info()
+    assert info["misses"] - before["misses"] == 1
+    assert info["coalesced"] + info["hits"] - before["coalesced"] - before["hits"] == 4
+
+
+def test_prefetch_runs_only_when_the_user_changes_the_slots(monkeypatch) -> None:
+    from langchain_core.messages import AIMessage, HumanMessage
+    from langgraph.checkpoint.memory import InMemorySaver
+
+    from agent import master_agent, registry
+    from tests.unit_tests.test_master_graph import FakeChatModel
+
+    monkeypatch.setattr(availability, "PREFETCH_ENABLED", True)
+    monkeypatch.setattr(availability.availability_cache, "ttl", 0)
+    seen = []
+    _mock_backend(seen)
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content=f"תשובה {i}") for i in range(3)])))
+    graph = master_agent.master_graph_builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "prefetch"}}
+
+    def settle() -> None:
+        while availability._prefetching:
+            time.sleep(0.01)
+
+    try:
+        graph.invoke({"messages": [HumanMessage(content="אני רוצה לשכור רכב")]}, config)
+        graph.invoke({"messages": [HumanMessage(
+            content="איסוף ב-28/08/2030 בשעה 10:00 והחזרה ב-30/08/2030 בשעה 10:00, סניף 49 לאותו סניף"
+        )]}, config)
+        settle()
+        assert len(seen) == 1
+        # The cached search has expired, but nothing new was asked, so nothing is prefetched
+        graph.invoke({"messages": [HumanMessage(content="תודה, אני חושב על זה")]}, config)
+        settle()
+        assert len(seen) == 1
+    finally:
+        registry.set_llm(None)
+        http_client.close_clients()
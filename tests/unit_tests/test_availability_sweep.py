@@ -0,0 +1,80 @@
+import json
+import threading
+import time
+from datetime import date
+
+import httpx
+import pytest
+
+from agent import availability, availability_sweep, http_client
+from agent.resilience import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def _empty_cache():
+    availability.availability_cache.invalidate()
+    yield
+    availability.availability_cache.invalidate()
+    http_client.close_clients()
+
+
+def test_grid_keeps_the_rental_length_and_skips_past_days() -> None:
+    grid = availability_sweep.sweep_grid("02/09/2030", "04/09/2030", [5, 7, 5], flexDays=1, today=date(2030, 9, 2))
+    assert grid == [
+        (5, 5, "02/09/2030", "04/09/2030"),
+        (7, 7, "02/09/2030", "04/09/2030"),
+        (5, 5, "03/09/2030", "05/09/2030"),
+        (7, 7, "03/09/2030", "05/09/2030"),
+    ]
+    assert availability_sweep.sweep_grid("02/09/2030", "04/09/2030", [5], returnBranch=9)[0][1] == 9
+
+
+def test_oversized_sweeps_are_bounded_before_searching(monkeypatch) -> None:
+    monkeypatch.setattr(availability_sweep, "SWEEP_MAX_BRANCHES", 3)
+    today = date(2030, 9, 1)
+    with pytest.raises(ValueError, match="at most 3 pickup branches"):
+        availability_sweep.sweep_grid("02/09/2030", "04/09/2030", range(1, 10**9), today=today)
+    # Repeated branches count once, and day shifts are clamped
+    grid = availability_sweep.sweep_grid("10/09/2030", "12/09/2030", [1, 2, 3, 1], flexDays=10**6, today=today)
+    assert len(grid) == 3 * (2 * availability_sweep.SWEEP_MAX_FLEX_DAYS + 1)
+
+
+def test_sweep_runs_concurrently_and_keeps_the_cheapest_per_group(monkeypatch) -> None:
+    monkeypatch.setattr(availability_sweep, "SWEEP_FANOUT", 3)
+    lock = threading.Lock()
+    in_flight, peak = [0], [0]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.05)
+        with lock:
+            in_flight[0] -= 1
+        # Branch 7 is cheaper for group 1, the day after is cheaper for group 2
+        shifted = body["fromDate"] != "28/08/2030"
+        return httpx.Response(200, json={"data": [
+            {"groupCode": 1, "groupTypeHe": "קטן", "amountIncDiscountIncVat": 300 - body["pickupBranch"]},
+            {"groupCode": 2, "groupTypeHe": "משפחתי", "amountIncDiscountIncVat": 500 - 50 * shifted},
+        ]})
+
+    url = http_client.RENT_BASE_URL
+    http_client.set_client(url, http_client.build_client(url, transport=httpx.MockTransport(handler)))
+
+    start = time.perf_counter()
+    result = availability_sweep.sweep_availability("28/08/2030", "10:00", "30/08/2030", "10:00", [5, 7], flexDays=1)
+    assert time.perf_counter() - start < 6 * 0.05
+    assert result["searches"] == 6 and peak[0] == 3
+    assert [(o["groupCode"], o["amountIncDiscountIncVat"], o["pickupBranch"]) for o in result["cheapest"]] == [
+        (1, 293.0, 7), (2, 450.0, 5)
+    ]
+    assert result["cheapest"][1]["fromDate"] == "27/08/2030"
+
+
+def test_rate_limiter_spaces_requests_beyond_the_burst() -> None:
+    limiter = RateLimiter(rate=20, burst=2)
+    start = time.perf_counter()
+    for _ in range(4):
+        limiter.acquire()
+    assert 0.08 <= time.perf_counter() - start < 0.5
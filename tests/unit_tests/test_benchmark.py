@@ -0,0 +1,39 @@
+import httpx
+from langchain_core.messages import HumanMessage, ToolMessage
+
+from agent import benchmark
+from agent.stand_ins import ScriptedChatModel, StandInBackends
+
+
+def test_scripted_model_calls_tools_then_answers() -> None:
+    model = ScriptedChatModel(script={"חפש": [{"name": "get_branches", "args": {}}]})
+    call = model.invoke([HumanMessage(content="חפש")])
+    assert call.tool_calls[0]["name"] == "get_branches"
+
+    answer = model.invoke([HumanMessage(content="חפש"), call, ToolMessage(content="[]", tool_call_id=call.tool_calls[0]["id"])])
+    assert answer.content and not answer.tool_calls
+    assert model.snapshot()["calls"] == 2
+    assert answer.usage_metadata["input_tokens"] > call.usage_metadata["input_tokens"]
+
+
+def test_stand_in_backends_answer_and_count() -> None:
+    backends = StandInBackends()
+    response = backends.handle(httpx.Request("GET", "https://sales.test/api/shlomo/zero-km-cars/ZK3"))
+    assert response.json()["id"] == "ZK3"
+    assert backends.handle(httpx.Request("GET", "https://sales.test/unknown")).status_code == 404
+    assert backends.total_calls == 2
+
+
+def test_rental_benchmark_and_comparison() -> None:
+    document = benchmark.run_benchmark(scenarios=["rental"], lengths=[6], repeats=1)
+    result = document["results"]["rental/6"]
+    # Branches and availability are fetched once each
+    assert sum(turn["http_calls"] for turn in result["turns"]) == 2
+    assert [turn["llm_calls"] for turn in result["turns"]] == [1, 2, 1, 2, 2, 2]
+    assert result["summary"]["peak_memory_kb"] > 0
+
+    assert benchmark.compare(document, document) == []
+    worse = {"results": {"rental/6": {"summary": {**result["summary"], "llm_calls_per_turn": 4}}}}
+    assert benchmark.compare(document, worse) == [
+        f"rental/6 llm_calls_per_turn: {result['summary']['llm_calls_per_turn']} -> 4 (+140%)"
+    ]
@@ -0,0 +1,46 @@
+from agent.branch_index import BranchIndex, find_branches, skeleton
+from agent.stand_ins import StandInBackends
+
+BRANCHES = {"data": [
+    {"branchCode": 1, "branchName": "נמל התעופה בן גוריון", "branchNameEn": "Ben Gurion Airport"},
+    {"branchCode": 2, "branchName": "חיפה", "branchNameEn": "Haifa"},
+    {"branchCode": 3, "branchName": "הרצליה", "branchNameEn": "Herzliya"},
+    {"branchCode": 4, "branchName": "תל אביב - דיזנגוף", "branchNameEn": "Tel Aviv - Dizengoff"},
+    {"branchCode": 5, "branchName": "אילת - שדה רמון", "branchNameEn": "Eilat Ramon Airport"},
+]}
+
+
+def _ids(index, query):
+    return [match["id"] for match in index.search(query)]
+
+
+def test_hebrew_and_latin_spellings_share_a_skeleton() -> None:
+    assert skeleton("חיפה") == skeleton("haifa")
+    assert skeleton("הרצליה") == skeleton("herzliya")
+
+
+def test_names_aliases_and_typos_resolve() -> None:
+    index = BranchIndex(BRANCHES)
+    assert _ids(index, 'נתב"ג') == [1]
+    assert _ids(index, "Haifa") == _ids(index, "בחיפה") == [2]
+    assert _ids(index, "הרצליא") == [3]
+    assert _ids(index, 'ת"א') == [4]
+    assert _ids(index, "דיזינגוף") == [4]
+    assert set(_ids(index, "שדה התעופה")) == {1, 5}
+    assert _ids(index, "4") == [4]
+    assert _ids(index, "קריית שמונה") == []
+
+    (match,) = index.search("herzlia")
+    assert match["pickupBranchName"] == "הרצליה" and match["pickupBranchNameEn"] == "Herzliya"
+
+
+def test_find_branches_returns_only_the_matches() -> None:
+    backends = StandInBackends(branches=60)
+    backends.install()
+    try:
+        result = find_branches("branch 17", limit=3)
+    finally:
+        backends.uninstall()
+    assert result["total_branches"] == 60
+    assert len(result["matches"]) <= 3
+    assert result["matches"][0]["id"] == 17
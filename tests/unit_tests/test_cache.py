@@ -0,0 +1,175 @@
+import threading
+import time
+
+from agent.cache import KeyedCache, RefreshingCache
+
+
+class CountingLoader:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    def __call__(self) -> dict:
+        self.calls += 1
+        return {"version": self.calls}
+
+
+def test_fresh_value_is_served_without_refetch() -> None:
+    loader = CountingLoader()
+    cache = RefreshingCache("test", loader, ttl=60)
+    assert cache.get() == {"version": 1}
+    assert cache.get() == {"version": 1}
+    assert loader.calls == 1
+
+
+def test_stale_value_is_served_while_refreshing() -> None:
+    release = threading.Event()
+    calls = []
+
+    def loader() -> int:
+        calls.append(1)
+        if len(calls) > 1:
+            release.wait(2)
+        return len(calls)
+
+    cache = RefreshingCache("test", loader, ttl=0)
+    assert cache.get() == 1
+    # Stale: returns immediately with the old value and refreshes in background
+    assert cache.get() == 1
+    assert cache.get() == 1
+    release.set()
+    for _ in range(100):
+        if cache.get() == 2:
+            break
+        time.sleep(0.01)
+    assert cache.get() >= 2
+
+
+def test_concurrent_stale_reads_start_one_background_refresh(monkeypatch) -> None:
+    loader = CountingLoader()
+    cache = RefreshingCache("test", loader, ttl=60)
+    cache.get()
+    cache.ttl = 0
+
+    barrier = threading.Barrier(16)
+    readers = [threading.Thread(target=lambda: (barrier.wait(), cache.get())) for _ in range(16)]
+    deferred = []
+
+    class DeferredThread(threading.Thread):
+        # Hold refresh threads back so every reader sees the cache before any refresh runs
+        def start(self) -> None:
+            deferred.append(self)
+
+    monkeypatch.setattr(threading, "Thread", DeferredThread)
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    monkeypatch.undo()
+    for thread in deferred:
+        threading.Thread.start(thread)
+        thread.join()
+    assert len(deferred) == 1
+    assert loader.calls == 2
+
+
+def test_snapshot_serves_restarted_worker(tmp_path) -> None:
+    path = str(tmp_path / "branches.json")
+    RefreshingCache("test", lambda: ["Tel Aviv"], ttl=60, snapshot_path=path).get()
+
+    def unreachable() -> list:
+        raise AssertionError("should be served from the snapshot")
+
+    restarted = RefreshingCache("test", unreachable, ttl=60, snapshot_path=path)
+    assert restarted.get() == ["Tel Aviv"]
+
+
+def test_concurrent_cold_reads_share_one_fetch() -> None:
+    loader_started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def loader() -> str:
+        calls.append(1)
+        loader_started.set()
+        release.wait(2)
+        return "catalog"
+
+    cache = RefreshingCache("test", loader, ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get())) for _ in range(5)]
+    for t in threads:
+        t.start()
+    loader_started.wait(2)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert results == ["catalog"] * 5
+    assert len(calls) == 1
+    assert cache.info()["version"] == 1
+
+
+def test_failed_refresh_keeps_serving_stale_value() -> None:
+    values = iter(["v1"])
+
+    def loader() -> str:
+        try:
+            return next(values)
+        except StopIteration:
+            raise RuntimeError("backend down") from None
+
+    cache = RefreshingCache("test", loader, ttl=60)
+    assert cache.get() == "v1"
+    try:
+        cache.refresh()
+    except RuntimeError:
+        pass
+    assert cache.get() == "v1"
+    assert cache.info()["version"] == 1
+    assert cache.age() is not None
+
+
+def test_catalog_tool_payload_exposes_snapshot_info() -> None:
+    from agent import catalogs
+
+    cache = catalogs.CATALOG_CACHES[catalogs.LEASING]
+    cache.invalidate()
+    original = cache.loader
+    cache.loader = lambda: [{"model": "Corolla"}]
+    try:
+        payload = catalogs.get_catalog(catalogs.LEASING)
+    finally:
+        cache.loader = original
+        cache.invalidate()
+    assert payload["service_type"] == "leasing"
+    assert payload["data"] == [{"model": "Corolla"}]
+    assert set(payload["snapshot"]) == {"version", "age_seconds", "stale"}
+
+
+def test_keyed_cache_expires_and_does_not_cache_errors() -> None:
+    calls = []
+
+    def loader(key: str) -> str:
+        calls.append(key)
+        if key == "bad":
+            raise RuntimeError("backend down")
+        return key.upper()
+
+    cache = KeyedCache("test", loader, ttl=60, max_entries=1)
+    assert cache.get("a") == "A"
+    assert cache.get("a") == "A"
+    assert cache.get("b") == "B"
+    # "a" was evicted by the size bound
+    assert cache.get("a") == "A"
+    for _ in range(2):
+        try:
+            cache.get("bad")
+        except RuntimeError:
+            pass
+    assert calls == ["a", "b", "a", "bad", "bad"]
+    assert cache.info()["hits"] == 1
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    cache.get("a")
+    assert calls[-1] == "a"
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import httpx
+
+from agent import car_details, http_client
+from agent.catalogs import ZERO_KM
+
+
+def test_batch_fetches_concurrently_and_caches_per_id(monkeypatch) -> None:
+    from agent.sales_cars_agent import get_zero_km_car_details_tool, get_zero_km_cars_details_tool
+
+    monkeypatch.setattr(car_details, "DETAILS_FANOUT", 2)
+    car_details.details_cache.invalidate()
+    seen = []
+    active = []
+    peaks = []
+    lock = threading.Lock()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        car_id = request.url.path.rsplit("/", 1)[-1]
+        with lock:
+            seen.append(car_id)
+            active.append(1)
+            peaks.append(len(active))
+        time.sleep(0.05)
+        with lock:
+            active.pop()
+        if car_id == "404":
+            return httpx.Response(404, text="not found")
+        return httpx.Response(200, json={"id": car_id, "price": 100, "notes": None, "extras": []})
+
+    http_client.set_client(
+        http_client.SALES_BASE_URL,
+        http_client.build_client(http_client.SALES_BASE_URL, transport=httpx.MockTransport(handler)),
+    )
+    try:
+        start = time.perf_counter()
+        result = get_zero_km_cars_details_tool.invoke({"car_ids": ["1", "2", "3", "2", "404"]})
+        elapsed = time.perf_counter() - start
+        single = get_zero_km_car_details_tool.invoke({"car_id": "1"})
+    finally:
+        http_client.close_clients()
+
+    assert result["service_type"] == "zero_km_details"
+    assert result["cars"] == {"1": {"id": "1", "price": 100}, "2": {"id": "2", "price": 100}, "3": {"id": "3", "price": 100}}
+    assert result["errors"] == {"404": "HTTP 404: not found"}
+    # Four distinct IDs, two at a time: faster than sequential, never more than the fan-out
+    assert sorted(seen) == ["1", "2", "3", "404"]
+    assert elapsed < 4 * 0.05
+    assert max(peaks) == 2
+    # The single-ID tool is served from the per-ID cache
+    assert single["data"]["id"] == "1"
+    assert len(seen) == 4
+    assert car_details.details_cache.info()["hits"] >= 1
+
+
+def test_batch_size_is_bounded(monkeypatch) -> None:
+    monkeypatch.setattr(car_details, "DETAILS_BATCH_MAX", 2)
+    monkeypatch.setattr(car_details, "get_car_details", lambda service_type, car_id: {"id": car_id})
+    result = car_details.get_car_details_batch(ZERO_KM, ["a", "b", "c"])
+    assert list(result["cars"]) == ["a", "b"]
+    assert result["skipped"] == ["c"]
@@ -0,0 +1,73 @@
+import math
+
+from agent.catalog_index import CatalogIndex, _number, canonical_category, canonical_manufacturer
+
+CATALOGS = {
+    "first_hand": {"data": [
+        {"id": "fh1", "model": "טויוטה קורולה", "category": "משפחתי", "price": "₪95,000"},
+        {"id": "fh2", "model": "X1", "manufacturer": "ב.מ.וו", "category": "SUV", "price": 180000},
+    ]},
+    "zero_km": [
+        {"id": "zk1", "model": "i3", "manufacturer": "BMW", "category": "חשמלי", "price": 150000},
+        {"id": "zk2", "model": "Picanto", "manufacturer": "קיה", "category": "קטנות", "price": 70000},
+    ],
+    "leasing": [
+        {"id": "ls1", "model": "Tucson", "manufacturer": "Hyundai", "category": "ג'יפ", "monthlyPayment": 2900},
+    ],
+}
+
+
+def test_manufacturer_variants_are_canonicalized() -> None:
+    assert canonical_manufacturer("ב.מ.וו.") == canonical_manufacturer("BMW") == "BMW"
+    assert canonical_manufacturer("hyundai") == "יונדאי"
+
+
+def test_category_keywords_match_whole_words() -> None:
+    assert canonical_category("Chevrolet Bolt EV") == "חשמלי"
+    assert canonical_category("Chevrolet Trax Level 2") is None
+    assert canonical_category("מיני וואן") == canonical_category("ואן") == "7 מקומות ומיני וואן"
+    assert canonical_category("טייוואן") is None
+    assert canonical_category("חשמלי חלקי") == "היברידי"
+    assert canonical_category("משפחתית") == "משפחתיות"
+    # "קטן" fits two categories, so it only counts next to a word that tells them apart
+    assert canonical_category("קטן") is None
+    assert canonical_category("רכב קטן וחסכוני") == "קטנות"
+
+
+def test_vectorized_filters() -> None:
+    index = CatalogIndex(CATALOGS)
+    assert len(index) == 5
+
+    total, cars = index.search(manufacturer="bmw")
+    assert total == 2
+    assert [car["id"] for car in cars] == ["zk1", "fh2"]
+
+    total, cars = index.search(max_price=100000)
+    assert [car["id"] for car in cars] == ["zk2", "fh1"]
+    assert cars[1]["manufacturer"] == "טויוטה"
+
+    total, cars = index.search(category="SUV", max_monthly=3000)
+    assert [car["id"] for car in cars] == ["ls1"]
+    assert "price" not in cars[0]
+
+    total, _ = index.search(service_types=["zero_km"], category="משפחתיות")
+    assert total == 0
+
+
+def test_unknown_filters_are_ignored_and_reported() -> None:
+    index = CatalogIndex(CATALOGS)
+    total, _ = index.search(category="קטן")
+    assert total == 5
+    total, _ = index.search(manufacturer="Lada", max_price=100000)
+    assert total == 2
+    assert index.unknown_filters(category="קטן", manufacturer="Lada") == {"category": "קטן", "manufacturer": "Lada"}
+    assert index.unknown_filters(category="SUV", manufacturer="bmw") == {}
+
+
+def test_number_parsing() -> None:
+    assert _number("₪95,000") == 95000
+    assert _number("1.234.567") == 1234567
+    assert _number("2,900.50") == 2900.5
+    assert math.isnan(_number("-5,000"))
+    assert math.isnan(_number(-1))
+    assert math.isnan(_number(None))
@@ -0,0 +1,131 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agent import master_agent, registry
+from agent.checkpoint import SqliteCheckpointSaver
+from tests.unit_tests.test_master_graph import FakeChatModel
+
+
+def _turns(saver: SqliteCheckpointSaver, thread_id: str = "t1", replies: int = 2):
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content=f"reply {i}") for i in range(replies)])))
+    graph = master_agent.master_graph_builder.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": thread_id}}
+    graph.invoke({"messages": [HumanMessage(content="אני רוצה לשכור רכב")]}, config)
+    result = graph.invoke({"messages": [HumanMessage(content="איסוף ב-28/08/2030 בשעה 10:00")]}, config)
+    registry.set_llm(None)
+    return graph, config, result
+
+
+def test_state_survives_reopening_the_database(tmp_path) -> None:
+    path = str(tmp_path / "checkpoints.db")
+    _, config, result = _turns(SqliteCheckpointSaver(path))
+    assert len(result["messages"]) == 4
+
+    reopened = master_agent.master_graph_builder.compile(checkpointer=SqliteCheckpointSaver(path))
+    state = reopened.get_state(config).values
+    assert [m.content for m in state["messages"]] == [m.content for m in result["messages"]]
+    assert state["rental_slots"] == {"fromDate": "28/08/2030", "fromTime": "10:00"}
+
+
+def test_messages_are_stored_once_across_checkpoints(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"))
+    big = ToolMessage(content="x" * 5000 + "result", tool_call_id="call-1")
+    config = {"configurable": {"thread_id": "t1", "checkpoint_ns": ""}}
+    checkpoint = {"v": 1, "id": "", "ts": "", "channel_versions": {}, "versions_seen": {}, "channel_values": {}}
+    messages = []
+    for step in range(5):
+        messages = messages + ([big] if step == 0 else [HumanMessage(content=f"turn {step}")])
+        version = saver.get_next_version(None if step == 0 else version, None)
+        checkpoint = {
+            **checkpoint,
+            "id": f"{step:04}",
+            "channel_versions": {"messages": version},
+            "channel_values": {"messages": messages},
+        }
+        config = saver.put(config, checkpoint, {"step": step}, {"messages": version})
+
+    assert saver._conn.execute("SELECT COUNT(*) FROM payloads").fetchone()[0] == 5
+    # The repeated tool result is compressed and stored once
+    assert saver.thread_bytes("t1") < 2000
+    latest = saver.get_tuple({"configurable": {"thread_id": "t1"}})
+    assert [m.content for m in latest.checkpoint["channel_values"]["messages"]] == [m.content for m in messages]
+
+
+def test_checkpoints_per_thread_are_bounded(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), max_checkpoints_per_thread=3)
+    graph, config, _ = _turns(saver)
+    # The bound covers the subgraph namespaces too
+    assert len(list(saver.list({"configurable": {"thread_id": "t1"}}))) == 3
+    assert len(graph.get_state(config).values["messages"]) == 4
+
+    tiny = SqliteCheckpointSaver(str(tmp_path / "tiny.db"), max_thread_bytes=1)
+    graph, config, _ = _turns(tiny)
+    # Only the latest checkpoint is kept once a thread is over its byte budget
+    assert len(list(tiny.list({"configurable": {"thread_id": "t1"}}))) == 1
+    assert len(graph.get_state(config).values["messages"]) == 4
+
+
+def test_subgraph_namespaces_are_pruned_over_many_turns(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), max_checkpoints_per_thread=5, max_thread_bytes=20000)
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content=f"reply {i}") for i in range(40)])))
+    graph = master_agent.master_graph_builder.compile(checkpointer=saver)
+    config = {"configurable": {"thread_id": "long"}}
+    try:
+        graph.invoke({"messages": [HumanMessage(content="אני רוצה לשכור רכב")]}, config)
+        for turn in range(39):
+            graph.invoke({"messages": [HumanMessage(content=f"שאלה {turn}")]}, config)
+    finally:
+        registry.set_llm(None)
+
+    rows = saver._conn.execute("SELECT checkpoint_ns FROM checkpoints WHERE thread_id = 'long'").fetchall()
+    assert len(rows) <= 5
+    assert len({ns for (ns,) in rows}) <= 2
+    assert saver.thread_bytes("long") <= 20000
+    assert saver._size("long") == saver.thread_bytes("long")
+    assert len(graph.get_state(config).values["messages"]) == 80
+
+
+def test_threads_within_bounds_are_not_pruned(tmp_path, monkeypatch) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), max_checkpoints_per_thread=100)
+    pruned = []
+    monkeypatch.setattr(saver, "_prune_thread", lambda *args: pruned.append(args))
+    monkeypatch.setattr(saver, "thread_bytes", lambda thread_id: 0)
+    _turns(saver)
+    assert pruned == []
+    assert 0 < saver._size("t1") < saver.max_thread_bytes
+
+
+def test_idle_and_least_recent_threads_are_evicted(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"), ttl=60, max_threads=2, evict_interval=1e9)
+    for thread_id in ("a", "b", "c"):
+        _turns(saver, thread_id)
+    saver._conn.execute("UPDATE threads SET last_access = last_access - 3600 WHERE thread_id = 'a'")
+
+    assert saver.evict() == 1
+    assert saver.get_tuple({"configurable": {"thread_id": "a"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "b"}}) is not None
+
+    # Reads count as use, so make "b" the least recently used thread again
+    saver._conn.execute("UPDATE threads SET last_access = last_access - 10 WHERE thread_id = 'b'")
+    saver.max_threads = 1
+    saver.evict()
+    assert saver.get_tuple({"configurable": {"thread_id": "b"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "c"}}) is not None
+    assert saver._conn.execute(
+        "SELECT COUNT(*) FROM payloads WHERE hash NOT IN (SELECT hash FROM channel_items)"
+    ).fetchone()[0] == 0
+
+
+def test_async_api(tmp_path) -> None:
+    saver = SqliteCheckpointSaver(str(tmp_path / "checkpoints.db"))
+    _turns(saver)
+
+    async def run():
+        latest = await saver.aget_tuple({"configurable": {"thread_id": "t1"}})
+        listed = [item async for item in saver.alist({"configurable": {"thread_id": "t1"}}, limit=2)]
+        return latest, listed
+
+    latest, listed = asyncio.run(run())
+    assert listed[0].config == latest.config
+    assert len(listed) == 2
@@ -0,0 +1,157 @@
+import itertools
+import time
+
+import httpx
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.tools import tool
+
+from agent import deadline, http_client, registry, resilience
+from agent.benchmark import build_graph
+from agent.car_details import get_car_details_batch
+from agent.catalogs import FIRST_HAND
+from agent.llm_cache import ResponseCache
+from agent.stand_ins import StandInBackends
+from agent.tool_runner import execute_tool_calls
+
+BASE_URL = "https://backend.test"
+
+
+class FakeChatModel(GenericFakeChatModel):
+    delay: float = 0.0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, *args, **kwargs):
+        time.sleep(self.delay)
+        return super()._generate(*args, **kwargs)
+
+
+@tool("nap")
+def nap(seconds: float) -> str:
+    """Sleep, then report how long."""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+@pytest.fixture
+def backends():
+    stand_ins = StandInBackends()
+    stand_ins.install()
+    yield stand_ins
+    stand_ins.uninstall()
+    registry.set_llm(None)
+
+
+def test_tool_still_running_at_deadline_is_timed_out() -> None:
+    calls = [
+        {"name": "nap", "args": {"seconds": 0.0}, "id": "fast"},
+        {"name": "nap", "args": {"seconds": 1.0}, "id": "slow"},
+    ]
+    start = time.perf_counter()
+    with deadline.deadline_scope(time.time() + 0.2):
+        results = execute_tool_calls(calls, [nap])
+    assert time.perf_counter() - start < 0.8
+    assert results[0].content == "slept 0.0"
+    assert results[1].tool_call_id == "slow" and results[1].content.startswith("Error:")
+
+
+def test_backend_requests_respect_the_deadline(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    statuses = iter([503, 200])
+    http_client.set_client(
+        BASE_URL,
+        http_client.build_client(BASE_URL, transport=httpx.MockTransport(lambda r: httpx.Response(next(statuses)))),
+    )
+    try:
+        with deadline.deadline_scope(time.time() - 1):
+            with pytest.raises(deadline.DeadlineExceeded):
+                resilience.request(BASE_URL, "GET", "/cars", endpoint="test_deadline")
+
+        # Too little time left to back off and retry: the first answer is final
+        with deadline.deadline_scope(time.time() + 0.01):
+            response = resilience.request(BASE_URL, "GET", "/cars", endpoint="test_deadline")
+        assert response.status_code == 503
+        assert resilience.stats["test_deadline"]["retries"] == 0
+    finally:
+        http_client.close_clients()
+
+
+def test_tool_loops_are_bounded(monkeypatch, backends) -> None:
+    monkeypatch.setattr(deadline, "MAX_TOOL_LOOPS", 2)
+    ids = itertools.count()
+    # A model that never stops asking for branches
+    replies = (
+        AIMessage(content="", tool_calls=[{"name": "get_branches", "args": {}, "id": f"call_{next(ids)}"}])
+        for _ in itertools.count()
+    )
+    registry.set_llm(FakeChatModel(messages=replies))
+
+    result = build_graph("rental").invoke(
+        {"messages": [HumanMessage(content="אילו סניפים יש?")]}, {"configurable": {"thread_id": "loops"}}
+    )
+    assert result["tool_loops"] == 2
+    assert backends.total_calls == 1  # the second round is served from the branches cache
+    answer = result["messages"][-1]
+    assert not answer.tool_calls
+    assert answer.content.startswith(deadline.PARTIAL_ANSWER)
+
+
+def test_slow_model_gets_a_partial_answer(monkeypatch, backends) -> None:
+    monkeypatch.setattr(deadline, "TURN_BUDGET", 0.2)
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content="תשובה מאוחרת")]), delay=1.0))
+
+    start = time.perf_counter()
+    result = build_graph("sales").invoke(
+        {"messages": [HumanMessage(content="אני מחפש רכב משפחתי")]}, {"configurable": {"thread_id": "slow"}}
+    )
+    assert time.perf_counter() - start < 0.8
+    assert result["messages"][-1].content == f"{deadline.PARTIAL_ANSWER} {deadline.PARTIAL_RETRY}"
+
+
+def test_model_request_gets_the_time_left_as_timeout(monkeypatch, backends) -> None:
+    seen = []
+
+    class RecordingModel(FakeChatModel):
+        def _generate(self, *args, **kwargs):
+            seen.append(kwargs.get("timeout"))
+            return super()._generate(*args, **kwargs)
+
+    monkeypatch.setattr(deadline, "TURN_BUDGET", 30)
+    registry.set_llm(RecordingModel(messages=iter([AIMessage(content="שלום")])))
+    build_graph("sales").invoke({"messages": [HumanMessage(content="היי")]}, {"configurable": {"thread_id": "timeout"}})
+    assert seen and 0 < seen[0] <= 30
+
+    key = ResponseCache.key("[]", "model---[('stop', None), ('timeout', 29.5), ('tools', [])]")
+    assert key == ResponseCache.key("[]", "model---[('stop', None), ('tools', [])]")
+
+
+def test_deadline_timeouts_do_not_open_the_breaker(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "BREAKER_FAILURES", 2)
+    monkeypatch.setattr(resilience, "HEDGE_ENABLED", False)
+
+    def handler(request):
+        # Stands in for a read that outlived the timeout derived from the deadline
+        time.sleep(request.extensions["timeout"]["read"])
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    http_client.set_client(BASE_URL, http_client.build_client(BASE_URL, transport=httpx.MockTransport(handler)))
+    try:
+        for _ in range(3):
+            with deadline.deadline_scope(time.time() + 0.05):
+                with pytest.raises(deadline.DeadlineExceeded):
+                    resilience.request(BASE_URL, "GET", "/slow", endpoint="test_deadline_breaker")
+        assert resilience.get_breaker(BASE_URL).state == "closed"
+    finally:
+        http_client.close_clients()
+
+
+def test_batched_details_see_the_deadline(backends) -> None:
+    with deadline.deadline_scope(time.time() - 1):
+        result = get_car_details_batch(FIRST_HAND, ["FH1", "FH2"])
+    assert set(result["errors"]) == {"FH1", "FH2"}
+    assert backends.total_calls == 0
@@ -0,0 +1,69 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agent.history import SUMMARY_MAX_CHARS, estimate_tokens, window_history
+
+
+def _turn(i: int) -> list:
+    return [
+        HumanMessage(content=f"שאלה מספר {i} " + "מילה " * 50),
+        AIMessage(content="", tool_calls=[{"name": "get_branches", "args": {}, "id": f"call_{i}"}]),
+        ToolMessage(content="x" * 3000, tool_call_id=f"call_{i}"),
+        AIMessage(content=f"תשובה {i}"),
+    ]
+
+
+def test_short_history_is_sent_verbatim() -> None:
+    messages = _turn(0)
+    window = window_history(messages, budget=10000)
+    assert window.messages == messages
+    assert window.summary == ""
+    assert window.summarized_count == 0
+
+
+def test_long_history_is_bounded_and_summarized_incrementally() -> None:
+    messages = [m for i in range(20) for m in _turn(i)]
+    window = window_history(messages, budget=2500)
+
+    assert isinstance(window.messages[0], SystemMessage)
+    assert "User: שאלה מספר" in window.summary
+    assert len(window.summary) <= SUMMARY_MAX_CHARS
+    assert window.summarized_count > 0
+    assert isinstance(window.messages[1], HumanMessage)
+    assert sum(estimate_tokens(m) for m in window.messages) < 2500 + 1200
+    # Latest turn keeps its full tool payload, earlier ones are digested
+    assert window.messages[-2].content == "x" * 3000
+    older_tools = [m for m in window.messages[1:-4] if isinstance(m, ToolMessage)]
+    assert older_tools and all(len(m.content) < 500 for m in older_tools)
+
+    messages += _turn(20)
+    later = window_history(messages, 2500, window.summary, window.summarized_count)
+    assert later.summarized_count >= window.summarized_count
+    assert window.summary.splitlines()[-1] in later.summary
+
+
+def test_earlier_search_results_keep_their_cursor_and_ids() -> None:
+    cars = [{"groupTypeHe": f"קבוצה {i}", "amountIncDiscountIncVat": 100 + i, "groupCode": i, "description": "פירוט " * 40} for i in range(30)]
+    branches = [{"id": i, "pickupBranchName": f"סניף {i}", "pickupBranchNameEn": f"Branch {i}", "score": 0.9} for i in range(12)]
+    messages = [
+        HumanMessage(content="איפה יש סניף בחיפה?"),
+        AIMessage(content="", tool_calls=[{"name": "find_branch", "args": {"query": "חיפה"}, "id": "call_1"}]),
+        ToolMessage(content={"query": "חיפה", "matches": branches, "total_branches": 60}, tool_call_id="call_1"),
+        AIMessage(content="מצאתי סניפים"),
+        HumanMessage(content="חפש רכבים"),
+        AIMessage(content="", tool_calls=[{"name": "search_available_cars", "args": {}, "id": "call_2"}]),
+        ToolMessage(content={"result_id": "abc123", "total": 30, "next_cursor": 6, "cars": cars[:6]}, tool_call_id="call_2"),
+        AIMessage(content="הנה האפשרויות"),
+        HumanMessage(content="יש עוד אפשרויות?"),
+    ]
+    window = window_history(messages, budget=10000)
+    finder, search = [m for m in window.messages if isinstance(m, ToolMessage)]
+
+    assert "'result_id': 'abc123'" in search.content and "'next_cursor': 6" in search.content
+    assert "'total': 30" in search.content and "'groupCode': 5" in search.content
+    assert "'total_branches': 60" in finder.content
+    assert "'id': 9" in finder.content and "'pickupBranchNameEn': 'Branch 9'" in finder.content
+    assert "'matches_omitted': 2" in finder.content
+
+    # Small structured results are kept whole
+    small = ToolMessage(content={"result_id": "r1", "next_cursor": None, "cars": cars[:1]}, tool_call_id="call_3")
+    assert window_history([HumanMessage(content="a"), small, HumanMessage(content="b")], 10000).messages[1] is small
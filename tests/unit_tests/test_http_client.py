@@ -0,0 +1,55 @@
+import httpx
+
+from agent import http_client
+
+
+def test_get_client_is_shared_per_host() -> None:
+    client = http_client.get_client(http_client.SALES_BASE_URL)
+    assert http_client.get_client(http_client.SALES_BASE_URL) is client
+    assert http_client.get_client(http_client.RENT_BASE_URL) is not client
+
+
+def test_client_settings_are_read_when_the_client_is_built(monkeypatch) -> None:
+    monkeypatch.setenv("SHLOMO_HTTP_TIMEOUT", "7")
+    monkeypatch.setenv("SHLOMO_HTTP_CONNECT_TIMEOUT", "2")
+    client = http_client.build_client(http_client.SALES_BASE_URL, transport=httpx.MockTransport(lambda r: httpx.Response(200)))
+    try:
+        assert client.timeout.read == 7 and client.timeout.connect == 2
+    finally:
+        client.close()
+
+
+def test_rent_tools_reuse_pooled_client() -> None:
+    from agent.availability import availability_cache
+    from agent.rent_cars_agent import search_available_cars_tool
+
+    args = {
+        "fromDate": "28/08/2025",
+        "fromTime": "10:00",
+        "toDate": "30/08/2025",
+        "toTime": "10:00",
+        "pickupBranch": 49,
+        "returnBranch": 49,
+    }
+
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request)
+        return httpx.Response(200, json=[{"groupCode": 7}])
+
+    http_client.set_client(
+        http_client.RENT_BASE_URL,
+        http_client.build_client(http_client.RENT_BASE_URL, transport=httpx.MockTransport(handler)),
+    )
+    availability_cache.invalidate()
+    try:
+        assert search_available_cars_tool.invoke(args)["cars"] == [{"groupCode": 7}]
+        assert search_available_cars_tool.invoke({**args, "toDate": "31/08/2025"})["cars"] == [{"groupCode": 7}]
+    finally:
+        http_client.close_clients()
+
+    assert len(seen) == 2
+    assert seen[0].url.path == "/api/v1/rent/all-groups"
+    assert seen[0].headers["Origin"] == "https://www.shlomo.co.il"
+    assert "gzip" in seen[0].headers["Accept-Encoding"]
@@ -0,0 +1,39 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.intent import RENTAL, SALES, UNKNOWN, classify_scores, score_text, update_intent
+
+
+def test_hebrew_prefixes_are_matched() -> None:
+    assert classify_scores(score_text("אני רוצה להשכיר רכב"))[0] == RENTAL
+    assert classify_scores(score_text("מתעניין בליסינג"))[0] == SALES
+    assert classify_scores(score_text("רכב זירו ק\"מ"))[0] == SALES
+
+
+def test_no_keywords_is_unknown() -> None:
+    assert classify_scores(score_text("שלום"))[0] == UNKNOWN
+
+
+def test_intent_is_sticky_and_incremental() -> None:
+    messages = [HumanMessage(content="אני רוצה לשכור רכב")]
+    update = update_intent(messages)
+    assert update["intent"] == RENTAL
+    assert update["intent_confidence"] == 1.0
+    assert update["intent_processed"] == 1
+
+    messages += [AIMessage(content="מתי?"), HumanMessage(content="לשבוע הבא, מה עם תשלומים?")]
+    update = update_intent(messages, update["intent"], update["intent_scores"], update["intent_processed"])
+    assert update["intent"] == RENTAL
+    assert update["intent_processed"] == 3
+
+    messages.append(HumanMessage(content="בעצם אני רוצה לקנות רכב יד ראשונה"))
+    update = update_intent(messages, update["intent"], update["intent_scores"], update["intent_processed"])
+    assert update["intent"] == SALES
+
+
+def test_time_words_do_not_cancel_a_strong_keyword() -> None:
+    assert classify_scores(score_text("אני רוצה לקנות רכב, אפשר לראות אותו השבוע?"))[0] == SALES
+    assert classify_scores(score_text("ליסינג לתקופה של חודש?"))[0] == SALES
+    # On their own time words still point to a rental
+    assert classify_scores(score_text("צריך רכב לשבוע"))[0] == RENTAL
+    # Two strong keywords of both services stay undecided
+    assert classify_scores(score_text("לשכור או לקנות?"))[0] == UNKNOWN
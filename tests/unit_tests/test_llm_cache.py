@@ -0,0 +1,48 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langchain_core.outputs import ChatGeneration
+
+from agent.llm_cache import ResponseCache
+
+LLM_STRING = '{"kwargs": {"model_name": "gpt-4o", "temperature": 0.1}}---[]'
+
+
+def test_repeated_opener_is_served_from_cache() -> None:
+    cache = ResponseCache()
+    llm = GenericFakeChatModel(messages=iter([AIMessage(content="first"), AIMessage(content="second")]), cache=cache)
+    system = SystemMessage(content="You are a rental assistant")
+
+    first = llm.invoke([system, HumanMessage(content="אני רוצה לשכור רכב", id="a")])
+    again = llm.invoke([system, HumanMessage(content=" אני רוצה  לשכור רכב ", id="b")])
+    other = llm.invoke([system, HumanMessage(content="אני רוצה לקנות רכב")])
+
+    assert (first.content, again.content, other.content) == ("first", "first", "second")
+    assert again.id != first.id
+    assert cache.info()["hits"] == 1
+    assert cache.info()["misses"] == 2
+
+
+def test_tool_calls_are_cached_only_when_deterministic() -> None:
+    cache = ResponseCache()
+    prompt = '[{"kwargs": {"content": "hi", "type": "human"}}]'
+    response = [ChatGeneration(message=AIMessage(content="", tool_calls=[{"name": "get_branches_tool", "args": {}, "id": "c1"}]))]
+
+    cache.update(prompt, LLM_STRING.replace("0.1", "0.7"), response)
+    assert cache.lookup(prompt, LLM_STRING.replace("0.1", "0.7")) is None
+    assert cache.stats["skipped"] == 1
+
+    cache.update(prompt, LLM_STRING, response)
+    assert cache.lookup(prompt, LLM_STRING)[0].message.tool_calls[0]["name"] == "get_branches_tool"
+
+
+def test_entries_expire_and_persist_on_disk(tmp_path) -> None:
+    path = str(tmp_path / "llm_cache.db")
+    prompt = '[{"kwargs": {"content": "hi", "type": "human"}}]'
+    ResponseCache(path=path).update(prompt, LLM_STRING, [ChatGeneration(message=AIMessage(content="hello"))])
+
+    restarted = ResponseCache(path=path)
+    assert restarted.lookup(prompt, LLM_STRING)[0].message.content == "hello"
+    assert restarted.stats["disk_hits"] == 1
+
+    expired = ResponseCache(path=path, ttl=0)
+    assert expired.lookup(prompt, LLM_STRING) is None
@@ -0,0 +1,21 @@
+import pytest
+
+from agent import loadtest
+
+
+def test_mix_is_weighted_and_interleaved() -> None:
+    assert loadtest.parse_mix("rental=2,sales=1,ambiguous=1") == ["rental", "sales", "ambiguous", "rental"]
+    with pytest.raises(ValueError):
+        loadtest.parse_mix("unknown=1")
+
+
+def test_ramp_reports_every_level() -> None:
+    report = loadtest.run_load(levels=[1, 3], duration=0.1, llm_think=0.0, http_latency=0.0, degrade=1000)
+    assert [level["concurrency"] for level in report["levels"]] == [1, 3]
+    for level in report["levels"]:
+        assert level["errors"] == 0, level["error_samples"]
+        assert level["conversations"] >= level["concurrency"]
+        assert level["latency_ms"]["p95"] >= level["latency_ms"]["p50"] > 0
+        assert set(level["queue_depth"]) == {"llm", "tools", "http_hedge", "car_details", "prefetch"}
+    assert report["session_memory_kb"] > 0
+    assert report["max_concurrency_within_budget"] == 3
@@ -0,0 +1,52 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import master_agent, registry
+
+
+class FakeChatModel(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def test_router_clarifies_without_llm() -> None:
+    result = master_agent.graph.invoke({"messages": [HumanMessage(content="שלום")]})
+    assert result["intent"] == "unknown"
+    assert "השכרת רכב" in result["messages"][-1].content
+
+
+def test_rental_subgraph_shares_state_across_turns() -> None:
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content="מתי?"), AIMessage(content="ולהחזיר?")])))
+    graph = master_agent.master_graph_builder.compile(checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "test"}}
+
+    namespaces = [
+        ns
+        for ns, _ in graph.stream(
+            {"messages": [HumanMessage(content="אני רוצה לשכור רכב")]}, config, subgraphs=True
+        )
+    ]
+    assert any(ns and ns[0].startswith("rental_service:") for ns in namespaces)
+
+    result = graph.invoke({"messages": [HumanMessage(content="איסוף ב-28/08/2030 בשעה 10:00")]}, config)
+    assert [type(m).__name__ for m in result["messages"]] == [
+        "HumanMessage", "AIMessage", "HumanMessage", "AIMessage"
+    ]
+    assert result["rental_slots"] == {"fromDate": "28/08/2030", "fromTime": "10:00"}
+    registry.set_llm(None)
+
+
+def test_rental_tokens_stream_through_master_graph() -> None:
+    registry.set_llm(FakeChatModel(messages=iter([AIMessage(content="מתי תרצה לאסוף את הרכב?")])))
+    tokens = [
+        (namespace, chunk.content)
+        for namespace, (chunk, metadata) in master_agent.graph.stream(
+            {"messages": [HumanMessage(content="אני רוצה לשכור רכב")]}, stream_mode="messages", subgraphs=True
+        )
+        if metadata["langgraph_node"] == "rental_assistant"
+    ]
+    assert len(tokens) > 1
+    assert tokens[0][0][0].startswith("rental_service:")
+    assert "".join(content for _, content in tokens) == "מתי תרצה לאסוף את הרכב?"
+    registry.set_llm(None)
@@ -0,0 +1,67 @@
+import urllib.request
+
+import pytest
+
+from agent import benchmark, metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def _series(snapshot, name, **labels):
+    return [s for s in snapshot["histograms"].get(name, []) if labels.items() <= s["labels"].items()]
+
+
+def test_disabled_records_nothing() -> None:
+    metrics.reset()
+    metrics.observe("node_latency_seconds", 0.1, graph="g", node="n")
+    metrics.inc("llm_calls_total", node="n")
+    snapshot = metrics.snapshot()
+    assert snapshot["histograms"] == {} and snapshot["counters"] == {}
+
+
+def test_histogram_buckets_and_prometheus_text(enabled) -> None:
+    for value in (0.002, 0.03, 0.03, 2.0):
+        metrics.observe("node_latency_seconds", value, graph="rental", node="tool_executor")
+    (series,) = _series(metrics.snapshot(), "node_latency_seconds")
+    assert series["count"] == 4
+    assert series["p50"] == 0.05
+    assert series["buckets"]["0.005"] == 1
+
+    text = metrics.render_prometheus()
+    assert 'shlomo_node_latency_seconds_bucket{graph="rental",node="tool_executor",le="0.05"} 3' in text
+    assert 'shlomo_node_latency_seconds_count{graph="rental",node="tool_executor"} 4' in text
+    assert "# TYPE shlomo_cache_hits gauge" in text
+
+
+def test_endpoint_listens_on_loopback_by_default(enabled) -> None:
+    server = metrics.start_http_server(0)
+    try:
+        host, port = server.server_address[:2]
+        assert host == "127.0.0.1"
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            assert "# TYPE" in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_conversation_is_instrumented(enabled) -> None:
+    benchmark.run_conversation(benchmark.SCENARIOS["rental"], 4, benchmark.StandInBackends())
+    snapshot = metrics.snapshot()
+
+    assert _series(snapshot, "node_latency_seconds", graph="rental", node="rental_assistant")[0]["count"] == 6
+    assert _series(snapshot, "tool_latency_seconds", tool="get_branches", status="ok")[0]["count"] == 1
+    assert {s["labels"]["endpoint"] for s in _series(snapshot, "upstream_response_bytes")} == {"branches", "availability"}
+    assert _series(snapshot, "upstream_latency_seconds", endpoint="branches", status="200")
+
+    # Every turn is recorded once, with its tool-call round trip included
+    turns = _series(snapshot, "turn_llm_calls", node="rental_assistant")[0]
+    assert turns["count"] == 4 and turns["sum"] == 6
+    prompt = [c for c in snapshot["counters"]["llm_tokens_total"] if c["labels"]["kind"] == "prompt"]
+    assert prompt[0]["value"] > 0
@@ -0,0 +1,25 @@
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from agent import registry
+
+
+class FakeChatModel(GenericFakeChatModel):
+    bind_calls: int = 0
+
+    def bind_tools(self, tools, **kwargs):
+        self.bind_calls += 1
+        return self
+
+
+def test_bound_runnables_are_built_once() -> None:
+    fake = FakeChatModel(messages=iter([AIMessage(content="a"), AIMessage(content="b")]))
+    registry.set_llm(fake)
+    try:
+        first = registry.get_bound_llm("test_node", [])
+        assert registry.get_bound_llm("test_node", []) is first
+        assert fake.bind_calls == 1
+        assert first.invoke("hi").content == "a"
+        assert "first_llm_call.test_node" in registry.startup_timings
+    finally:
+        registry.set_llm(None)
@@ -0,0 +1,29 @@
+from agent.rental_results import get_full_result, get_result_page, store_search_result
+
+PAYLOAD = {
+    "data": {
+        "groups": [
+            {"groupCode": code, "groupTypeHe": f"רכב {code}", "amountIncDiscountIncVat": price,
+             "statusHe": "זמין", "imageUrl": "https://example.com/car.png", "extras": [1, 2, 3]}
+            for code, price in [(1, 900), (2, 300), (3, None), (4, 450), (5, 120)]
+        ]
+    }
+}
+
+
+def test_projects_sorts_and_paginates() -> None:
+    page = store_search_result(PAYLOAD, page_size=2)
+    assert page["total"] == 5
+    assert [car["groupCode"] for car in page["cars"]] == [5, 2]
+    assert set(page["cars"][0]) == {"groupCode", "groupTypeHe", "amountIncDiscountIncVat", "statusHe"}
+    assert page["next_cursor"] == 2
+
+    last = get_result_page(page["result_id"], 4, page_size=2)
+    assert [car["groupCode"] for car in last["cars"]] == [3]
+    assert last["next_cursor"] is None
+
+    assert get_full_result(page["result_id"]) is PAYLOAD
+
+
+def test_unknown_result_id() -> None:
+    assert "error" in get_result_page("missing", 0)
@@ -0,0 +1,79 @@
+import time
+from datetime import date
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import rental_slots
+from agent.branches import branch_cache
+from agent.rental_slots import extract_rental_slots, rental_slots_complete, update_rental_slots
+
+TODAY = date(2025, 8, 1)
+
+
+def test_extracts_marked_pickup_and_return() -> None:
+    slots = extract_rental_slots(
+        "אני רוצה לאסוף רכב ב-28/08/2025 בשעה 10:00 ולהחזיר ב-30/08/2025 בשעה 12:00",
+        today=TODAY,
+    )
+    assert slots == {
+        "fromDate": "28/08/2025",
+        "fromTime": "10:00",
+        "toDate": "30/08/2025",
+        "toTime": "12:00",
+    }
+
+
+def test_hebrew_month_names_and_day_parts() -> None:
+    slots = extract_rental_slots("28 באוגוסט בשעה 8 בבוקר עד 2 בספטמבר 6 בערב", today=TODAY)
+    assert slots["fromDate"] == "28/08/2025"
+    assert slots["toDate"] == "02/09/2025"
+    assert slots["fromTime"] == "08:00"
+    assert slots["toTime"] == "18:00"
+
+
+def test_branch_ids_and_same_branch() -> None:
+    slots = extract_rental_slots("מ-28/08 עד 30/08, סניף 49 לאותו סניף", today=TODAY)
+    assert slots["pickupBranch"] == 49
+    assert slots["returnBranch"] == 49
+
+
+def test_incremental_update_only_parses_new_messages() -> None:
+    messages = [HumanMessage(content="איסוף מחר בשעה 10:00"), AIMessage(content="מתי להחזיר?")]
+    slots, processed = update_rental_slots({}, messages, today=TODAY)
+    assert slots == {"fromDate": "02/08/2025", "fromTime": "10:00"}
+    assert processed == 2
+
+    messages.append(HumanMessage(content="להחזיר ב-05/08/2025 בשעה 09:00, סניף 12 לאותו סניף"))
+    slots, processed = update_rental_slots(slots, messages, processed, today=TODAY)
+    assert processed == 3
+    assert slots["toDate"] == "05/08/2025"
+    assert slots["toTime"] == "09:00"
+    assert rental_slots_complete(slots)
+
+
+def test_bare_numbers_are_branch_ids_only_in_reply_to_a_branch_question() -> None:
+    assert "pickupBranch" not in extract_rental_slots("7", today=TODAY)
+    assert extract_rental_slots("7", today=TODAY, prompt="מאיזה סניף תרצו לאסוף?")["pickupBranch"] == 7
+
+    messages = [AIMessage(content="הנה הרכבים, איזו קבוצה?"), HumanMessage(content="12")]
+    slots, _ = update_rental_slots({}, messages, today=TODAY)
+    assert "pickupBranch" not in slots
+    messages += [AIMessage(content="ומאיזה סניף?"), HumanMessage(content="49")]
+    slots, _ = update_rental_slots(slots, messages, 2, today=TODAY)
+    assert slots["pickupBranch"] == 49
+
+
+def test_branch_names_use_one_pattern_per_snapshot() -> None:
+    branch_cache._store({"data": [
+        {"branchCode": 3, "branchName": "תל אביב", "branchNameEn": "Tel Aviv"},
+        {"branchCode": 4, "branchName": "תל אביב מרכז", "branchNameEn": "Tel Aviv Center"},
+        {"branchCode": 9, "branchName": "חיפה", "branchNameEn": "Haifa"},
+    ]}, fetched_at=time.time())
+    try:
+        slots = extract_rental_slots("איסוף בתל אביב מרכז והחזרה בחיפה", today=TODAY)
+        assert (slots["pickupBranch"], slots["returnBranch"]) == (4, 9)
+        pattern = rental_slots._branch_names()[0]
+        assert extract_rental_slots("pick up in Tel Aviv", today=TODAY)["pickupBranch"] == 3
+        assert rental_slots._branch_names()[0] is pattern
+    finally:
+        branch_cache.invalidate()
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import httpx
+import pytest
+
+from agent import http_client, resilience
+
+BASE_URL = "https://backend.test"
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(resilience, "RETRY_BACKOFF", 0.0)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    yield
+    http_client.close_clients()
+
+
+def _mock(handler) -> None:
+    http_client.set_client(BASE_URL, http_client.build_client(BASE_URL, transport=httpx.MockTransport(handler)))
+
+
+def test_idempotent_requests_are_retried() -> None:
+    statuses = iter([503, 200])
+    _mock(lambda request: httpx.Response(next(statuses), json={"ok": True}))
+
+    response = resilience.request(BASE_URL, "GET", "/cars", endpoint="test_retry")
+    assert response.status_code == 200
+    assert resilience.stats["test_retry"]["retries"] == 1
+
+
+def test_non_idempotent_requests_are_sent_once() -> None:
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(503)
+
+    _mock(handler)
+    assert resilience.request(BASE_URL, "POST", "/orders", endpoint="test_post").status_code == 503
+    assert len(calls) == 1
+
+
+def test_breaker_opens_and_fails_fast(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "RETRY_ATTEMPTS", 1)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError("down", request=request)
+
+    _mock(handler)
+    breaker = resilience.get_breaker(BASE_URL)
+    for _ in range(breaker.failures):
+        with pytest.raises(httpx.ConnectError):
+            resilience.request(BASE_URL, "GET", "/cars", endpoint="test_breaker")
+    assert breaker.state == "open"
+
+    with pytest.raises(resilience.CircuitOpenError):
+        resilience.request(BASE_URL, "GET", "/cars", endpoint="test_breaker")
+    assert len(calls) == breaker.failures
+
+    # After the cool-down a successful trial request closes it again
+    breaker._opened_at -= breaker.reset_after
+    _mock(lambda request: httpx.Response(200))
+    assert resilience.request(BASE_URL, "GET", "/cars", endpoint="test_breaker").status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_slow_request_is_hedged(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "HEDGE_DEFAULT_DELAY", 0.05)
+    first = threading.Event()
+
+    def handler(request):
+        if not first.is_set():
+            first.set()
+            time.sleep(1)
+            return httpx.Response(200, json={"attempt": 1})
+        return httpx.Response(200, json={"attempt": 2})
+
+    _mock(handler)
+    started = time.perf_counter()
+    response = resilience.request(BASE_URL, "GET", "/cars", endpoint="test_hedge")
+    assert response.json() == {"attempt": 2}
+    assert time.perf_counter() - started < 0.5
+    assert resilience.stats["test_hedge"]["hedge_wins"] == 1
+
+
+def test_every_attempt_takes_a_rate_limit_token(monkeypatch) -> None:
+    monkeypatch.setattr(resilience, "HEDGE_DEFAULT_DELAY", 0.05)
+    taken = []
+
+    class CountingLimiter(resilience.RateLimiter):
+        def acquire(self) -> None:
+            taken.append(1)
+
+    statuses = iter([503, 200, 200])
+
+    def handler(request):
+        status = next(statuses)
+        if status == 200 and len(taken) == 2:
+            time.sleep(0.3)
+        return httpx.Response(status)
+
+    _mock(handler)
+    # One retry after the 503, and the slow retry is hedged
+    response = resilience.request(BASE_URL, "GET", "/cars", endpoint="test_limited", limiter=CountingLimiter(0))
+    assert response.status_code == 200
+    assert len(taken) == 3
+
+
+def test_fan_out_submits_a_bounded_number_of_tasks() -> None:
+    pool = resilience.ThreadPoolExecutor(max_workers=8)
+    lock = threading.Lock()
+    outstanding, peak = [0], [0]
+    submit = pool.submit
+
+    def tracked_submit(fn, *args):
+        with lock:
+            outstanding[0] += 1
+            peak[0] = max(peak[0], outstanding[0])
+        future = submit(fn, *args)
+        future.add_done_callback(lambda _: _finish())
+        return future
+
+    def _finish():
+        with lock:
+            outstanding[0] -= 1
+
+    pool.submit = tracked_submit
+    try:
+        futures = resilience.fan_out(pool, lambda i: time.sleep(0.01) or i * i, range(6), limit=2)
+    finally:
+        pool.shutdown()
+    assert [future.result() for future in futures] == [0, 1, 4, 9, 16, 25]
+    # The pool has room for 8, but only 2 tasks of the batch ever hold it
+    assert peak[0] == 2
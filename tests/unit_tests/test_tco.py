@@ -0,0 +1,49 @@
+import numpy as np
+
+from agent.catalog_index import CatalogIndex
+from agent.tco import compare_offers, total_cost_of_ownership
+
+CATALOGS = {
+    "first_hand": [
+        {"id": "fh1", "model": "טויוטה קורולה", "category": "משפחתי", "price": 95000},
+        {"id": "fh2", "model": "X1", "manufacturer": "BMW", "category": "SUV", "price": 180000},
+    ],
+    "zero_km": [
+        {"id": "zk1", "model": "Picanto", "manufacturer": "קיה", "category": "קטנות", "price": 70000},
+        {"id": "zk2", "model": "Sportage", "manufacturer": "קיה", "category": "SUV", "price": 160000},
+    ],
+    "leasing": [
+        {"id": "ls1", "model": "Tucson", "manufacturer": "Hyundai", "category": "ג'יפ", "monthlyPayment": 2900},
+        {"id": "ls2", "model": "Niro", "manufacturer": "קיה", "category": "היברידי"},
+    ],
+}
+
+
+def test_tco_grid_shape_and_leasing_cost() -> None:
+    index = CatalogIndex(CATALOGS)
+    tco = total_cost_of_ownership(index.price, index.monthly, index.service, (12, 36))
+    assert tco.shape == (6, 2)
+    assert tco[4, 1] == 2900 * 36
+    # A bought car costs more the longer it is held
+    assert tco[0, 1] > tco[0, 0] > 0
+    assert np.isnan(tco[5]).all()
+
+
+def test_ranking_respects_budget_and_preferences() -> None:
+    index = CatalogIndex(CATALOGS)
+    result = compare_offers(index, 170000, preferred_category="SUV", payment_preference="cash")
+    ids = [car["id"] for car in result["recommendations"]]
+    assert "fh2" not in ids                     # over budget
+    assert "ls1" not in ids                     # cash excludes leasing
+    assert ids[0] == "zk1"
+    assert all(car["fits_budget"] for car in result["recommendations"])
+    assert set(result["recommendations"][0]["effective_monthly_cost"]) == {"12", "24", "36", "48"}
+
+
+def test_monthly_budget_includes_leasing() -> None:
+    index = CatalogIndex(CATALOGS)
+    result = compare_offers(index, 3000, preferred_manufacturer="hyundai")
+    ids = [car["id"] for car in result["recommendations"]]
+    assert "ls1" in ids
+    assert "ls2" not in ids                     # no price information at all
+    assert "monthly_vs_next_best" in result["savings_potential"]
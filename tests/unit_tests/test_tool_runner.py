@@ -0,0 +1,119 @@
+import threading
+import time
+
+from langchain_core.messages import AIMessageChunk
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.tools import tool
+
+from agent import tool_runner
+from agent.tool_runner import EarlyToolCallHandler, execute_tool_calls
+
+_barrier = threading.Barrier(3, timeout=2)
+
+
+@tool("slow_echo")
+def slow_echo(value: str) -> str:
+    """Echo the value once all three calls are running."""
+    _barrier.wait()
+    return value
+
+
+@tool("echo")
+def echo(value: str) -> str:
+    """Echo the value."""
+    return value
+
+
+@tool("boom")
+def boom() -> str:
+    """Always fail."""
+    raise RuntimeError("backend down")
+
+
+def test_calls_run_concurrently_and_keep_order() -> None:
+    calls = [
+        {"name": "slow_echo", "args": {"value": str(i)}, "id": f"call_{i}"}
+        for i in range(3)
+    ]
+    start = time.perf_counter()
+    results = execute_tool_calls(calls, [slow_echo], max_concurrency=3)
+    assert time.perf_counter() - start < 2
+    assert [m.content for m in results] == ["0", "1", "2"]
+    assert [m.tool_call_id for m in results] == ["call_0", "call_1", "call_2"]
+
+
+def test_failing_call_does_not_cancel_others() -> None:
+    calls = [
+        {"name": "boom", "args": {}, "id": "a"},
+        {"name": "missing", "args": {}, "id": "b"},
+        {"name": "echo", "args": {"value": "ok"}, "id": "c"},
+    ]
+    results = execute_tool_calls(calls, [boom, echo])
+    assert results[0].content == "Error: backend down"
+    assert results[1].content == "Unknown tool: missing"
+    assert results[2].content == "ok"
+
+
+def test_streamed_tool_call_starts_before_the_message_ends() -> None:
+    started = []
+
+    @tool("record")
+    def record(value: str) -> str:
+        """Record the call."""
+        started.append(value)
+        return value
+
+    def chunk(index, id=None, name=None, args=""):
+        message = AIMessageChunk(content="", tool_call_chunks=[{"index": index, "id": id, "name": name, "args": args}])
+        return ChatGenerationChunk(message=message)
+
+    handler = EarlyToolCallHandler([record])
+    handler.on_llm_new_token("", chunk=chunk(0, "call_a", "record", '{"val'))
+    handler.on_llm_new_token("", chunk=chunk(0, args='ue": "a"}'))
+    assert started == []
+    # The second call begins, so the first one is complete and starts right away
+    handler.on_llm_new_token("", chunk=chunk(1, "call_b", "record", '{"value": "b"}'))
+    for _ in range(100):
+        if started:
+            break
+        time.sleep(0.01)
+    assert started == ["a"]
+
+    handler.on_llm_end(None)
+    calls = [
+        {"name": "record", "args": {"value": "a"}, "id": "call_a"},
+        {"name": "record", "args": {"value": "b"}, "id": "call_b"},
+    ]
+    results = execute_tool_calls(calls, [record])
+    assert [m.content for m in results] == ["a", "b"]
+    assert sorted(started) == ["a", "b"]
+
+
+def test_early_calls_take_the_concurrency_limit(monkeypatch) -> None:
+    monkeypatch.setattr(tool_runner, "TOOL_CONCURRENCY", 1)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    @tool("tracked")
+    def tracked(value: str) -> str:
+        """Track how many calls run at once."""
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+        return value
+
+    handler = EarlyToolCallHandler([tracked])
+    for i in range(5):
+        message = AIMessageChunk(content="", tool_call_chunks=[
+            {"index": i, "id": f"call_{i}", "name": "tracked", "args": f'{{"value": "{i}"}}'}
+        ])
+        handler.on_llm_new_token("", chunk=ChatGenerationChunk(message=message))
+    handler.on_llm_end(None)
+
+    calls = [{"name": "tracked", "args": {"value": str(i)}, "id": f"call_{i}"} for i in range(5)]
+    results = execute_tool_calls(calls, [tracked])
+    assert [m.content for m in results] == ["0", "1", "2", "3", "4"]
+    assert peak[0] == 1